@@ -0,0 +1,159 @@
+"""
+Backfill multi-semaines via la file de travaux Postgres (table jobs).
+
+    python backfill.py enqueue URL_SEMAINE [URL_SEMAINE ...] [--file semaines.txt]
+    python backfill.py work [--processes 4] [--batch 10] [--follow]
+    python backfill.py status
+
+Un travail "week" découvre les films de la semaine et crée un travail "film"
+par film (jamais en double, même si le film sort sur plusieurs semaines).
+Les workers réclament les travaux avec FOR UPDATE SKIP LOCKED : on peut en
+lancer autant que voulu, sur une ou plusieurs machines pointant vers la même base.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+
+import flow
+from src import jobs
+from src.load import get_conn
+
+# Films traités par un même passage du pipeline (un travail "film" chacun)
+JOB_BATCH_SIZE = int(os.getenv("JOB_BATCH_SIZE", "10"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "5"))
+
+
+def run_week_job(conn, job: dict, fetcher, driver) -> dict:
+    films = flow.discover_week(conn, job["url"], fetcher, driver)
+    if not films:
+        raise RuntimeError("aucun film trouvé sur la page de la semaine")
+    created = jobs.enqueue(
+        conn,
+        "film",
+        [f["url"] for f in films],
+        payloads={f["url"]: {"titre": f.get("titre") or f.get("title"), "week_url": job["url"]} for f in films},
+    )
+    print(f"🗓️ {job['url']}: {len(films)} films, {created} nouveaux travaux")
+    return {"films": len(films), "film_jobs_created": created}
+
+
+def report_lost(job: dict):
+    print(f"   ⚠️ Travail {job['id']} ({job['url']}) repris par un autre worker : statut laissé au nouveau propriétaire")
+
+
+def run_film_jobs(conn, claimed: list[dict], worker: str, fetcher, driver, scrape_workers: int):
+    """
+    Un passage du pipeline pour tous les films réclamés ; seuls les films en
+    échec (extraction, ou critiques n'ayant pas atteint la base) sont remis en file.
+    """
+    films = [{"url": j["url"], "titre": (j["payload"] or {}).get("titre")} for j in claimed]
+    try:
+        result = flow.run_films(films, fetcher, driver, scrape_workers, label="backfill")
+    except Exception:
+        error = traceback.format_exc()
+        for job in claimed:
+            if not jobs.fail(conn, job, worker, error):
+                report_lost(job)
+        return
+    failed = set(result["failed_films"])
+    summary = {k: v for k, v in result.items() if k not in ("stages", "failed_films")}
+    for job in claimed:
+        if job["url"] in failed:
+            ok = jobs.fail(conn, job, worker, "critiques non chargées ou extraction en erreur")
+        else:
+            ok = jobs.complete(conn, job["id"], worker, {"batch_films": len(films), **summary})
+        if not ok:
+            report_lost(job)
+
+
+def worker_loop(batch_size: int = JOB_BATCH_SIZE, follow: bool = False, poll: float = JOB_POLL_INTERVAL):
+    """
+    Réclame et exécute des travaux jusqu'à ce que la file soit vide
+    (ou indéfiniment avec `follow`). Les travaux "week" passent en premier.
+    """
+    worker = jobs.worker_id()
+    conn = get_conn()
+    conn_heartbeat = get_conn()
+    fetcher, driver, scrape_workers = flow.make_scrapers()
+    print(f"👷 Worker {worker} démarré")
+    try:
+        with jobs.Heartbeat(conn_heartbeat, worker) as hb:
+            while True:
+                claimed = jobs.claim(conn, worker, limit=1, kind="week")
+                if not claimed:
+                    claimed = jobs.claim(conn, worker, limit=batch_size, kind="film")
+                if not claimed:
+                    if not follow and not jobs.has_open_jobs(conn):
+                        break
+                    time.sleep(poll)
+                    continue
+                hb.job_ids = {j["id"] for j in claimed}
+                if claimed[0]["kind"] == "week":
+                    job = claimed[0]
+                    try:
+                        ok = jobs.complete(conn, job["id"], worker, run_week_job(conn, job, fetcher, driver))
+                    except Exception:
+                        ok = jobs.fail(conn, job, worker, traceback.format_exc())
+                    if not ok:
+                        report_lost(job)
+                else:
+                    run_film_jobs(conn, claimed, worker, fetcher, driver, scrape_workers)
+                hb.job_ids = set()
+    finally:
+        flow.close_scrapers(fetcher, driver)
+        conn.close()
+        conn_heartbeat.close()
+    print(f"👷 Worker {worker} terminé")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_enqueue = sub.add_parser("enqueue", help="ajoute des semaines à la file")
+    p_enqueue.add_argument("urls", nargs="*")
+    p_enqueue.add_argument("--file", help="fichier d'URLs de semaines, une par ligne")
+    p_work = sub.add_parser("work", help="lance des workers")
+    p_work.add_argument("--processes", type=int, default=1)
+    p_work.add_argument("--batch", type=int, default=JOB_BATCH_SIZE)
+    p_work.add_argument("--follow", action="store_true", help="attend de nouveaux travaux au lieu de s'arrêter")
+    sub.add_parser("status", help="compteurs de la file")
+    args = parser.parse_args()
+
+    if args.command == "enqueue":
+        urls = list(args.urls)
+        if args.file:
+            with open(args.file, encoding="utf-8") as f:
+                urls += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+        if not urls:
+            parser.error("aucune URL de semaine")
+        conn = get_conn()
+        try:
+            print(f"✅ {jobs.enqueue(conn, 'week', urls)} semaines ajoutées ({len(urls)} demandées)")
+        finally:
+            conn.close()
+    elif args.command == "work":
+        if args.processes <= 1:
+            worker_loop(args.batch, args.follow)
+            return
+        procs = [
+            multiprocessing.Process(target=worker_loop, args=(args.batch, args.follow), name=f"worker-{i}")
+            for i in range(args.processes)
+        ]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+        sys.exit(max(p.exitcode or 0 for p in procs))
+    else:
+        conn = get_conn()
+        try:
+            print(jobs.counts(conn))
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Benchmark du parseur __NEXT_DATA__ sur la page de test res/resurrection.html.
+
+Compare le parseur d'origine (BeautifulSoup sur toute la page) au parseur
+src/next_data.py (recherche de texte + index Apollo) et vérifie que les deux
+retournent exactement les mêmes lignes.
+
+    python benchmarks/bench_next_data.py [--repeat 50]
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.next_data import parse_reviews  # noqa: E402
+
+FIXTURE = os.path.join(ROOT, "res", "resurrection.html")
+FILM_URL = "https://www.senscritique.com/film/resurrection/58872999"
+
+
+def legacy_parse(html: str, film_url: str, film_title: str | None = None) -> list[dict]:
+    """
+    Parseur d'origine (BeautifulSoup html.parser sur toute la page + scans linéaires
+    de l'état Apollo), conservé comme référence pour le benchmark.
+    """
+    soup_obj = BeautifulSoup(html, "html.parser")
+    script_tag = soup_obj.find("script", id="__NEXT_DATA__")
+    if not script_tag or not script_tag.string:
+        return []
+    try:
+        data = json.loads(script_tag.string)
+    except json.JSONDecodeError:
+        return []
+
+    apollo = (
+        data.get("props", {})
+            .get("pageProps", {})
+            .get("__APOLLO_STATE__", {})
+    )
+    if not isinstance(apollo, dict):
+        return []
+
+    # On récupère un bloc Product pour métadonnées éventuelles (note moyenne, image, dates).
+    product_node = None
+    for key, val in apollo.items():
+        if isinstance(val, dict) and key.startswith("Product:"):
+            product_node = val
+            break
+
+    # Cherche les références de critiques depuis le bloc Product (clé reviews({...})) ou n'importe quel node Reviews.
+    review_refs = []
+    if product_node:
+        for k, v in product_node.items():
+            if isinstance(v, dict) and v.get("__typename") == "Reviews" and "items" in v:
+                for item in v.get("items", []):
+                    ref = item.get("__ref") if isinstance(item, dict) else None
+                    if ref and ref.startswith("Review:"):
+                        review_refs.append(ref)
+    # fallback : scan global si non trouvé
+    if not review_refs:
+        for node in apollo.values():
+            if isinstance(node, dict) and node.get("__typename") == "Reviews" and "items" in node:
+                for item in node.get("items", []):
+                    ref = item.get("__ref") if isinstance(item, dict) else None
+                    if ref and ref.startswith("Review:"):
+                        review_refs.append(ref)
+    if not review_refs:
+        return []
+
+    film_rate = product_node.get("rating") if product_node else None
+    date_sortie = product_node.get("dateRelease") if product_node else None
+    image = None
+    if product_node:
+        for k, v in product_node.items():
+            # Exemple de clé: medias({"backdropSize":"1200"})
+            if isinstance(v, dict) and "picture" in v:
+                image = v.get("picture")
+                break
+
+    parsed = []
+    seen_hashes = set()
+    for ref in review_refs:
+        review_obj = apollo.get(ref, {})
+        if not isinstance(review_obj, dict):
+            continue
+        texte = review_obj.get("bodyShort") or review_obj.get("body") or ""
+        if not texte:
+            continue
+        auteur = None
+        author_ref = review_obj.get("author", {}).get("__ref")
+        if author_ref and isinstance(apollo.get(author_ref), dict):
+            user = apollo[author_ref]
+            auteur = user.get("name") or user.get("username")
+        note = review_obj.get("rating")
+        review_url = review_obj.get("url")
+        full_review_url = (
+            review_url if review_url and review_url.startswith("http")
+            else f"https://www.senscritique.com{review_url}" if review_url else film_url
+        )
+        hash_c = hashlib.sha1(((auteur or "") + "||" + texte).encode()).hexdigest()
+        if hash_c in seen_hashes:
+            continue
+        seen_hashes.add(hash_c)
+        parsed.append({
+            "titre": film_title,
+            "film_url": film_url,
+            "auteur": auteur,
+            "note": note,
+            "texte": texte,
+            "url": full_review_url,
+            "hash_critique": hash_c,
+            "likes": review_obj.get("likeCount"),
+            "comments": review_obj.get("commentCount"),
+            "rate": film_rate,
+            "date_sortie": date_sortie,
+            "image": image,
+            "bande_originale": None,
+            "groupe": None,
+            "annee": product_node.get("yearOfProduction") if product_node else None,
+            "duree": product_node.get("duration") if product_node else None,
+            "genres": [],
+            "producteurs": [],
+            "realisateurs": [],
+            "scenaristes": [],
+            "pays": [],
+        })
+    return parsed
+
+
+def bench(fn, html: str, repeat: int) -> float:
+    """
+    Meilleur temps (ms) sur `repeat` exécutions.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(html, FILM_URL, "Resurrection")
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    with open(FIXTURE, encoding="utf-8") as f:
+        html = f.read()
+
+    legacy_rows = legacy_parse(html, FILM_URL, "Resurrection")
+    fast_rows = parse_reviews(html, FILM_URL, "Resurrection")
+    if legacy_rows != fast_rows:
+        print("❌ Les deux parseurs ne retournent pas les mêmes lignes.")
+        sys.exit(1)
+
+    legacy_ms = bench(legacy_parse, html, args.repeat)
+    fast_ms = bench(parse_reviews, html, args.repeat)
+    print(f"Page: {len(html) / 1024:.0f} KB, {len(fast_rows)} critiques (lignes identiques)")
+    print(f"BeautifulSoup : {legacy_ms:8.2f} ms")
+    print(f"next_data     : {fast_ms:8.2f} ms")
+    print(f"Accélération  : x{legacy_ms / fast_ms:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+"""
+Benchmark hors ligne de chaque étage du pipeline, sans SensCritique, TEI, HF ni base de prod.
+
+  - week_parse / review_parse : parseurs rejoués sur des pages sauvegardées (res/*.html)
+  - week_http / film_reviews  : HttpFetcher + pagination contre le stub local (benchmarks/stub_server.py)
+  - embed / sentiment         : embed_batched et SentimentEngine contre le stub TEI / HF (latence réglable)
+  - prefilter / load / film_embeddings : écritures de src/load.py dans une base Postgres jetable
+
+Pour chaque étage : lignes/s, latence p50/p99 par appel, pic mémoire (tracemalloc) et
+latences des opérations internes (src/metrics.py). Le résultat est écrit en JSON
+(benchmarks/results/) et peut être comparé à un run précédent :
+
+    python benchmarks/bench_pipeline.py [--films 20] [--latency-ms 20] [--dsn postgresql://...]
+    python benchmarks/bench_pipeline.py --compare benchmarks/results/<run>.json [--tolerance 0.25]
+
+Sans --dsn (ni BENCH_DATABASE_URL), les étages Postgres sont ignorés. --dsn désigne un
+serveur dédié (make bench démarre le service postgres-bench) : une base bench_<pid> y est
+créée depuis sql/schema.sql puis supprimée en fin de run (rôle avec CREATEDB requis).
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Pas de cache d'inférence : chaque run mesure les vrais appels au stub
+os.environ["INFERENCE_CACHE_PATH"] = ""
+
+from psycopg import sql  # noqa: E402
+from psycopg.conninfo import make_conninfo  # noqa: E402
+
+from benchmarks import stub_server  # noqa: E402
+from src import metrics  # noqa: E402
+from src.extract import (  # noqa: E402
+    HttpFetcher,
+    film_review_page,
+    parse_weekly_releases,
+    remaining_review_pages,
+    weekly_releases_http,
+)
+from src.load import (  # noqa: E402
+    bulk_load,
+    dimension_pairs,
+    filter_new_reviews,
+    get_conn,
+    insert_dimensions,
+    refresh_film_embeddings,
+)
+from src.next_data import parse_reviews_page  # noqa: E402
+from src.sentiment import AsyncInferenceClient, SentimentEngine  # noqa: E402
+from src.transform import embed_batched  # noqa: E402
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+SCHEMA_FILE = os.path.join(ROOT, "sql", "schema.sql")
+# Métriques comparées entre deux runs : (clé, sens) ; +1 = plus grand est meilleur
+COMPARED = (("rows_per_s", +1), ("p99_ms", -1), ("peak_mem_mb", -1))
+
+
+def git_commit() -> str:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+class Bench:
+    """
+    Exécute les étages et collecte leurs mesures.
+    Chaque appel de `fn` est chronométré ; `rows_of(résultat)` donne le nombre de lignes traitées.
+    """
+
+    def __init__(self, trace_memory: bool = True):
+        self.trace_memory = trace_memory
+        self.stages: dict[str, dict] = {}
+        if trace_memory:
+            tracemalloc.start()
+
+    def run(self, name: str, items: list, fn, rows_of=len, workers: int = 1) -> list:
+        latencies = []
+
+        def call(item):
+            t0 = time.perf_counter()
+            result = fn(item)
+            latencies.append(time.perf_counter() - t0)
+            return result
+
+        since = metrics.REGISTRY.snapshot()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(call, items))
+        else:
+            results = [call(item) for item in items]
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] - base if self.trace_memory else None
+
+        rows = sum(rows_of(r) for r in results)
+        ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+        self.stages[name] = {
+            "rows": rows,
+            "calls": len(latencies),
+            "workers": workers,
+            "seconds": round(seconds, 4),
+            "rows_per_s": round(rows / seconds, 1) if seconds else None,
+            "p50_ms": round(float(np.percentile(ms, 50)), 3),
+            "p99_ms": round(float(np.percentile(ms, 99)), 3),
+            "max_ms": round(float(ms.max()), 3),
+            "peak_mem_mb": round(peak / 2**20, 2) if peak is not None else None,
+            "ops": metrics.REGISTRY.summary(since)["latency"],
+        }
+        s = self.stages[name]
+        mem = f"{s['peak_mem_mb']:8.2f} MB" if s["peak_mem_mb"] is not None else "       -"
+        print(f"   {name:<16} {rows:>7} lignes {s['rows_per_s'] or 0:>10.1f}/s "
+              f"p50 {s['p50_ms']:8.2f} ms  p99 {s['p99_ms']:8.2f} ms  pic {mem}")
+        return results
+
+
+def chunks(items: list, size: int) -> list[list]:
+    return [items[i:i + size] for i in range(0, len(items), max(1, size))]
+
+
+def throwaway_database(dsn: str, schema_file: str):
+    """
+    Base bench_<pid>_<rand> créée sur le serveur de `dsn` puis remplie depuis `schema_file`.
+    Le schéma (et ses DROP TABLE) ne s'exécute que dans cette base neuve : les autres
+    bases du serveur ne sont jamais touchées. Retourne (conn, nom de la base).
+    """
+    name = f"bench_{os.getpid()}_{uuid.uuid4().hex[:6]}"
+    with get_conn(dsn) as admin:
+        admin.execute(sql.SQL("CREATE DATABASE {}").format(sql.Identifier(name)))
+    try:
+        conn = get_conn(make_conninfo(dsn.replace("postgresql+psycopg://", "postgresql://", 1), dbname=name))
+        with open(schema_file, encoding="utf-8") as f:
+            conn.execute(f.read())
+    except Exception:
+        drop_database(None, dsn, name)
+        raise
+    return conn, name
+
+
+def drop_database(conn, dsn: str, name: str):
+    if conn is not None:
+        conn.close()
+    with get_conn(dsn) as admin:
+        admin.execute(sql.SQL("DROP DATABASE IF EXISTS {} WITH (FORCE)").format(sql.Identifier(name)))
+
+
+def run_benchmarks(args) -> dict:
+    config = stub_server.StubConfig(args.latency_ms, args.jitter_ms, args.per_item_ms, n_films=args.films, seed=args.seed)
+    server = stub_server.start(config)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    bench = Bench(trace_memory=not args.no_memory)
+    print(f"🧪 Stub sur {base_url} (latence {args.latency_ms} ms + {args.jitter_ms} ms, {args.per_item_ms} ms/texte)")
+    try:
+        # Parseurs seuls, sur les pages sauvegardées
+        pages = []
+        for path in sorted(glob.glob(args.pages)):
+            with open(path, encoding="utf-8") as f:
+                pages.append((os.path.basename(path), f.read()))
+        week_html = stub_server.week_page(base_url, args.films)
+        bench.run("week_parse", [week_html] * args.repeat, parse_weekly_releases)
+        bench.run(
+            "review_parse",
+            [html for _, html in pages] * args.repeat,
+            lambda html: parse_reviews_page(html, "https://www.senscritique.com/film/bench/1", "Bench")[0],
+        )
+
+        # Extraction HTTP (keep-alive, semaphore, pagination) contre le stub
+        fetcher = HttpFetcher(max_connections=args.workers, min_interval=0, retries=0)
+        try:
+            films = bench.run("week_http", [f"{base_url}/sorties?films={args.films}"],
+                              lambda url: weekly_releases_http(fetcher, url))[0]
+
+            def scrape(film: dict) -> list[dict]:
+                def fetch_page(page: int):
+                    return film_review_page(fetcher, film["url"], film["titre"], page)
+                rows, pagination = fetch_page(1)
+                return rows + remaining_review_pages(fetch_page, pagination, len(rows), max_pages=args.max_pages)
+
+            per_film = bench.run("film_reviews", films, scrape, workers=args.workers)
+        finally:
+            fetcher.close()
+        rows = [r for film_rows in per_film for r in film_rows]
+        texts = [r["texte"] for r in rows]
+
+        # Inférence contre le stub TEI / HF, par lots comme dans le pipeline
+        embs_chunks = bench.run(
+            "embed", chunks(texts, args.batch),
+            lambda batch: embed_batched(batch, base_url, concurrency=args.tei_concurrency),
+        )
+        embs = [e for chunk in embs_chunks for e in chunk]
+        if AsyncInferenceClient is None:
+            print("   sentiment        ignoré (huggingface_hub / aiohttp absent)")
+            labels = [None] * len(texts)
+        else:
+            engine = SentimentEngine(base_url, "bench", batch_size=args.sentiment_batch, concurrency=args.sentiment_concurrency)
+            try:
+                labels_chunks = bench.run("sentiment", chunks(texts, args.batch), engine.classify_many)
+                labels = [label for chunk in labels_chunks for label in chunk]
+            finally:
+                engine.close()
+
+        # Chargement dans un schéma Postgres jetable
+        if not args.dsn:
+            print("   prefilter/load   ignorés (--dsn ou BENCH_DATABASE_URL absent)")
+        else:
+            conn, database = throwaway_database(args.dsn, args.schema_file)
+            try:
+                triples = list(zip(rows, labels, embs))
+                bench.run("prefilter", chunks(rows, args.batch), lambda batch: filter_new_reviews(conn, batch)[0])
+
+                def load(batch: list[tuple]) -> list:
+                    batch_rows = [r for r, _, _ in batch]
+                    films_batch = [{"film": r["titre"], "url": r["film_url"], "rate": r.get("rate"),
+                                    "annee": r.get("annee"), "duree": r.get("duree")} for r in batch_rows]
+                    bulk_load(conn, films_batch, batch)
+                    insert_dimensions(conn, dimension_pairs(batch_rows))
+                    return batch
+
+                bench.run("load", chunks(triples, args.batch), load)
+                bench.run("film_embeddings", [[f["url"] for f in films]], lambda urls: [None] * refresh_film_embeddings(conn, urls))
+            finally:
+                drop_database(conn, args.dsn, database)
+    finally:
+        server.shutdown()
+
+    return {
+        "commit": git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {
+            k: getattr(args, k) for k in (
+                "films", "repeat", "batch", "workers", "max_pages", "latency_ms", "jitter_ms",
+                "per_item_ms", "tei_concurrency", "sentiment_batch", "sentiment_concurrency", "seed",
+            )
+        } | {"pages": [name for name, _ in pages], "postgres": bool(args.dsn), "trace_memory": not args.no_memory},
+        "stages": bench.stages,
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Compare deux runs étage par étage ; retourne les régressions au-delà de `tolerance`
+    (débit plus faible, p99 ou pic mémoire plus élevés).
+    """
+    if current["params"] != baseline["params"]:
+        print("⚠️ Paramètres différents entre les deux runs, comparaison indicative.")
+    regressions = []
+    print(f"\nComparaison avec {baseline.get('commit')} ({baseline.get('created_at')}) :")
+    for stage, cur in current["stages"].items():
+        base = baseline["stages"].get(stage)
+        if not base:
+            continue
+        cells = []
+        for key, direction in COMPARED:
+            new, old = cur.get(key), base.get(key)
+            if not new or not old:
+                continue
+            change = (new - old) / old
+            cells.append(f"{key} {change:+.0%}")
+            if -direction * change > tolerance:
+                regressions.append(f"{stage}.{key}: {old} -> {new} ({change:+.0%})")
+        print(f"   {stage:<16} " + "  ".join(cells))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--films", type=int, default=20, help="films listés par la page de sorties du stub")
+    parser.add_argument("--pages", default=os.path.join(ROOT, "res", "*.html"), help="pages sauvegardées (glob)")
+    parser.add_argument("--repeat", type=int, default=20, help="passages des parseurs sur chaque page")
+    parser.add_argument("--batch", type=int, default=int(os.getenv("PIPELINE_BATCH_SIZE", "256")))
+    parser.add_argument("--workers", type=int, default=4, help="films scrapés en parallèle")
+    parser.add_argument("--max-pages", type=int, default=0, help="pages de critiques par film (0 = pagination)")
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--jitter-ms", type=float, default=5)
+    parser.add_argument("--per-item-ms", type=float, default=0.5)
+    parser.add_argument("--tei-concurrency", type=int, default=4)
+    parser.add_argument("--sentiment-batch", type=int, default=20)
+    parser.add_argument("--sentiment-concurrency", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dsn", default=os.getenv("BENCH_DATABASE_URL"), help="serveur Postgres (avec pgvector) de benchmark, jamais la base de l'application")
+    parser.add_argument("--schema-file", default=SCHEMA_FILE)
+    parser.add_argument("--no-memory", action="store_true", help="sans tracemalloc (débit plus fidèle, pas de pic mémoire)")
+    parser.add_argument("--out", help="fichier JSON du résultat (défaut : benchmarks/results/<date>-<commit>.json)")
+    parser.add_argument("--compare", help="résultat JSON de référence")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="écart relatif toléré avant de signaler une régression")
+    args = parser.parse_args()
+
+    result = run_benchmarks(args)
+    out = args.out or os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{result['commit']}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print(f"💾 Résultat : {out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        if regressions:
+            print("❌ Régressions :")
+            for r in regressions:
+                print(f"   {r}")
+            sys.exit(1)
+        print("✅ Pas de régression")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Évalue le stockage quantifié des embeddings (halfvec / binaire) sur la base courante.
+
+Pour un échantillon de critiques, compare le top-k exact (parcours séquentiel sur
+embedding float32) au top-k de similar_reviews en passe grossière half/binary,
+avec et sans re-classement, et affiche le rappel@k et la taille moyenne par forme.
+Nécessite des lignes avec embedding ET les formes compactes remplies
+(sql/migrations/003_quantized_embeddings.sql).
+
+    python benchmarks/eval_quantization.py [--queries 100] [--k 10] [--rerank 4]
+"""
+import argparse
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.load import get_conn  # noqa: E402
+from src.search import similar_reviews  # noqa: E402
+
+INDEXES = (
+    "reviews_embedding_hnsw_idx",
+    "reviews_embedding_half_hnsw_idx",
+    "reviews_embedding_bin_hnsw_idx",
+)
+
+
+def exact_top_k(conn, review_id: int, k: int) -> list[int]:
+    with conn.transaction(), conn.cursor() as cur:
+        cur.execute("SET LOCAL enable_indexscan = off")
+        cur.execute("""
+            SELECT r.id
+            FROM reviews r, (SELECT embedding FROM reviews WHERE id = %(id)s) q
+            WHERE r.embedding IS NOT NULL AND r.id <> %(id)s
+            ORDER BY r.embedding <=> q.embedding
+            LIMIT %(k)s
+        """, {"id": review_id, "k": k})
+        return [r[0] for r in cur.fetchall()]
+
+
+def storage_sizes(conn) -> dict:
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT avg(pg_column_size(embedding)),
+                   avg(pg_column_size(embedding_half)),
+                   avg(pg_column_size(embedding_bin))
+            FROM reviews
+        """)
+        full, half, binary = cur.fetchone()
+        sizes = {
+            "bytes_per_row": {
+                "full": float(full or 0),
+                "half": float(half or 0),
+                "binary": float(binary or 0),
+            },
+            "index_bytes": {},
+        }
+        for name in INDEXES:
+            cur.execute("SELECT pg_relation_size(to_regclass(%s))", (name,))
+            sizes["index_bytes"][name] = cur.fetchone()[0]
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rerank", type=int, default=4)
+    parser.add_argument("--json", help="écrit aussi les résultats dans ce fichier")
+    args = parser.parse_args()
+
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT id FROM reviews
+                WHERE embedding IS NOT NULL AND embedding_half IS NOT NULL AND embedding_bin IS NOT NULL
+                ORDER BY random()
+                LIMIT %s
+            """, (args.queries,))
+            ids = [r[0] for r in cur.fetchall()]
+        if not ids:
+            print("⚠️ Aucune critique avec les trois formes d'embedding (appliquer la migration 003).")
+            sys.exit(1)
+
+        configs = [(coarse, rerank) for coarse in ("half", "binary") for rerank in (1, args.rerank)]
+        hits = {cfg: 0 for cfg in configs}
+        total = 0
+        for review_id in ids:
+            truth = set(exact_top_k(conn, review_id, args.k))
+            total += len(truth)
+            for coarse, rerank in configs:
+                found = similar_reviews(conn, review_id, k=args.k, coarse=coarse, rerank=rerank)
+                hits[(coarse, rerank)] += len(truth & {r["id"] for r in found})
+
+        sizes = storage_sizes(conn)
+    finally:
+        conn.close()
+
+    recall = {f"{coarse}/rerank={rerank}": hits[(coarse, rerank)] / total for coarse, rerank in configs}
+    full = sizes["bytes_per_row"]["full"] or 1
+    print(f"Requêtes: {len(ids)}, k={args.k}")
+    for name, value in recall.items():
+        print(f"  rappel@{args.k} {name:<20} {value:.3f}")
+    for form, size in sizes["bytes_per_row"].items():
+        ratio = full / size if size else 0
+        print(f"  {form:<7} {size:8.1f} octets/ligne  (x{ratio:.1f} plus petit que float32)")
+    for name, size in sizes["index_bytes"].items():
+        print(f"  {name:<34} {(size or 0) / 1024 / 1024:8.1f} MB")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"queries": len(ids), "k": args.k, "recall": recall, **sizes}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
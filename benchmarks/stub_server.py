@@ -0,0 +1,199 @@
+"""
+Serveur HTTP local qui remplace SensCritique, TEI et le LLM HF pour les benchmarks.
+
+    python benchmarks/stub_server.py [--port 8099] [--latency-ms 20] [--jitter-ms 5] [--per-item-ms 0.5]
+
+  - GET  /sorties?films=N                 -> page de sorties listant N films du stub
+  - GET  /film/<slug>/<id>/critiques[?page=N] -> page sauvegardée (res/resurrection.html),
+    critiques rendues uniques par film et par page (url + texte)
+  - POST /embed                            -> embeddings déterministes (façon TEI)
+  - POST .../chat/completions              -> labels 'numéro: label' (façon TGI / HF)
+
+La latence simulée vaut latency + jitter aléatoire + per_item par texte envoyé.
+Le flow peut aussi tourner contre ce serveur (TEI_URL, SENTIMENT_MODEL=http://...).
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_PAGE = os.path.join(ROOT, "res", "resurrection.html")
+EMBED_DIM = 384
+LABELS = ("positif", "negatif", "neutre")
+
+_FILM_PATH = re.compile(r"^/film/([^/]+)/(\d+)/critiques/?$")
+_NUMBERED = re.compile(r"^\s*(\d+)\s*\.")
+
+
+def fake_embedding(text: str, dim: int = EMBED_DIM) -> list[float]:
+    """
+    Vecteur unitaire déterministe dérivé du texte (même texte -> même vecteur).
+    """
+    seed = int.from_bytes(hashlib.sha1(text.encode("utf-8", "replace")).digest()[:8], "little")
+    v = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return (v / np.linalg.norm(v)).tolist()
+
+
+def fake_label(text: str) -> str:
+    return LABELS[hashlib.sha1(text.encode("utf-8", "replace")).digest()[0] % len(LABELS)]
+
+
+def week_page(base_url: str, n_films: int) -> str:
+    items = "\n".join(
+        f'<a class="c-product" href="{base_url}/film/bench-film-{i}/{100000 + i}">'
+        f'<h2 class="c-product__title">Bench film {i}</h2></a>'
+        for i in range(n_films)
+    )
+    return f"<html><body>{items}</body></html>"
+
+
+def review_page(template: str, film_id: str, page: int) -> str:
+    """
+    Page de critiques sauvegardée dont les critiques sont propres au film et à la page :
+    urls distinctes (pas de conflit au chargement) et textes distincts (pas de cache).
+    """
+    tag = f"{film_id}p{page}"
+    html = template.replace("/critique/", f"/critique/{tag}")
+    return html.replace('"bodyShort":"', f'"bodyShort":"[{tag}] ')
+
+
+class StubConfig:
+    def __init__(self, latency_ms: float = 20, jitter_ms: float = 5, per_item_ms: float = 0.5,
+                 page_path: str = DEFAULT_PAGE, n_films: int = 20, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.per_item_ms = per_item_ms
+        self.n_films = n_films
+        with open(page_path, encoding="utf-8") as f:
+            self.template = f.read()
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def sleep(self, items: int = 0):
+        with self._rng_lock:
+            jitter = self._rng.uniform(0, self.jitter_ms) if self.jitter_ms else 0.0
+        delay = (self.latency_ms + jitter + self.per_item_ms * items) / 1000
+        if delay > 0:
+            time.sleep(delay)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config: StubConfig
+
+    def _send(self, status: int, body: str | bytes, content_type: str = "application/json"):
+        data = body.encode() if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _json_body(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        base = f"http://{self.headers.get('Host')}"
+        if url.path in ("/health", "/info"):
+            self._send(200, "{}")
+            return
+        m = _FILM_PATH.match(url.path)
+        if m:
+            self.config.sleep()
+            page = int(query.get("page", ["1"])[0])
+            self._send(200, review_page(self.config.template, m.group(2), page), "text/html; charset=utf-8")
+            return
+        if url.path.startswith("/sorties"):
+            self.config.sleep()
+            n_films = int(query.get("films", [self.config.n_films])[0])
+            self._send(200, week_page(base, n_films), "text/html; charset=utf-8")
+            return
+        self._send(404, '{"error": "not found"}')
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        body = self._json_body()
+        if path == "/embed":
+            inputs = body.get("inputs") or []
+            if isinstance(inputs, str):
+                inputs = [inputs]
+            self.config.sleep(len(inputs))
+            self._send(200, json.dumps([fake_embedding(t) for t in inputs]))
+            return
+        if path.endswith("/chat/completions"):
+            messages = body.get("messages") or []
+            user = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+            lines = [line for line in user.splitlines() if _NUMBERED.match(line)]
+            self.config.sleep(max(1, len(lines)))
+            if len(lines) > 1:
+                content = "\n".join(f"{_NUMBERED.match(line).group(1)}: {fake_label(line)}" for line in lines)
+            else:
+                content = fake_label(user)
+            self._send(200, json.dumps({
+                "id": "stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model") or "stub",
+                "system_fingerprint": "stub",
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                    "logprobs": None,
+                }],
+                "usage": {"prompt_tokens": len(user) // 4, "completion_tokens": len(content) // 4,
+                          "total_tokens": (len(user) + len(content)) // 4},
+            }))
+            return
+        self._send(404, '{"error": "not found"}')
+
+    def log_message(self, *args):
+        pass
+
+
+def start(config: StubConfig, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """
+    Démarre le serveur dans un thread de fond ; l'URL de base est
+    f"http://{host}:{server.server_address[1]}". Arrêt : server.shutdown().
+    """
+    handler = type("StubHandler", (_Handler,), {"config": config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-http", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--jitter-ms", type=float, default=5)
+    parser.add_argument("--per-item-ms", type=float, default=0.5)
+    parser.add_argument("--page", default=DEFAULT_PAGE, help="page de critiques sauvegardée à servir")
+    parser.add_argument("--films", type=int, default=20, help="films listés par la page de sorties")
+    args = parser.parse_args()
+    config = StubConfig(args.latency_ms, args.jitter_ms, args.per_item_ms, args.page, args.films)
+    server = start(config, args.host, args.port)
+    print(f"🧪 Stub SensCritique/TEI/HF sur http://{args.host}:{server.server_address[1]}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,114 +1,380 @@
 import os
+import threading
+import time
 from src.load import (
     get_conn,
-    upsert_film,
-    insert_review,
-    insert_genres,
-    insert_producteurs,
-    insert_realisateurs,
-    insert_scenaristes,
-    insert_pays,
+    bulk_load,
+    dimension_pairs,
+    insert_dimensions,
+    filter_new_reviews,
+    refresh_film_embeddings,
+)
+from src.transform import (
+    embed_batched,
+    classify_sentiments_sourced,
+    TEI_BATCH_SIZE,
+    TEI_CONCURRENCY,
+)
+from src.cache import get_cache
+from src.extract import (
+    weekly_releases,
+    DriverPool,
+    HttpFetcher,
+    RateLimiter,
+    weekly_releases_http,
+    film_review_page,
+    remaining_review_pages,
+)
+from src.pipeline import Stage, run_pipeline
+from src.aggregates import refresh_aggregates
+from src.synthetic import FAKE_FILMS, FAKE_SEED, fake_films, fake_review_page
+from src import metrics
+from src.dedup import NearDuplicateIndex, mark_near_duplicates, register_signatures
+from src.crawl_state import (
+    CrawlTracker,
+    load_states,
+    is_due,
+    due_films,
+    cached_week,
+    save_week,
+    reviews_fingerprint,
 )
-from src.transform import sentiment_critique
-from src.extract import make_driver, weekly_releases, film_reviews
 from src.config import settings
 
+LOAD_BATCH_SIZE = int(os.getenv("LOAD_BATCH_SIZE", "1000"))
+# "http" (par défaut, Selenium en secours) ou "selenium" (navigateur pour chaque page)
+EXTRACT_MODE = os.getenv("EXTRACT_MODE", "http")
+SCRAPE_CONCURRENCY = int(os.getenv("SCRAPE_CONCURRENCY", "4"))
+SCRAPE_MIN_INTERVAL = float(os.getenv("SCRAPE_MIN_INTERVAL", "0.5"))
+# Pool Selenium : sessions simultanées sur la grille, recyclage après N pages
+SELENIUM_SESSIONS = int(os.getenv("SELENIUM_SESSIONS", "4"))
+SELENIUM_MAX_PAGES = int(os.getenv("SELENIUM_MAX_PAGES", "50"))
+# Pipeline en flux : taille des files entre étages et parallélisme par étage
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "256"))
+PREFILTER_BATCH_SIZE = int(os.getenv("PREFILTER_BATCH_SIZE", "500"))
+SENTIMENT_WORKERS = int(os.getenv("SENTIMENT_WORKERS", "2"))
+# Quasi-doublons (MinHash/LSH) : "mark" (chargés avec duplicate_of), "drop" (écartés avant inférence) ou "off"
+DEDUP_MODE = os.getenv("DEDUP_MODE", "mark")
+# Critiques envoyées d'un coup au moteur de sentiment (découpées ensuite en prompts)
+SENTIMENT_STAGE_BATCH = int(os.getenv("SENTIMENT_STAGE_BATCH", "80"))
+# Crawl incrémental (crawl_state) : films inchangés ou pas encore à revisiter ignorés ; 0 pour tout re-scraper
+CRAWL_INCREMENTAL = os.getenv("CRAWL_INCREMENTAL", "1") != "0"
+# Films déjà connus, hors semaine courante, revisités à chaque run quand leur échéance est passée
+CRAWL_REVISIT_LIMIT = int(os.getenv("CRAWL_REVISIT_LIMIT", "20"))
+# Pagination : arrêt dès qu'une vague de pages ne contient que des critiques déjà en base (0 = tout parcourir)
+REVIEWS_EARLY_STOP = os.getenv("REVIEWS_EARLY_STOP", "1") != "0"
+# Tests de charge : films et critiques synthétiques (src/synthetic.py, FAKE_*) au lieu de SensCritique
+USE_FAKE_EXTRACT = os.getenv("USE_FAKE_EXTRACT", "false").lower() in ("1", "true", "yes")
+
+
+def film_from_row(row: dict) -> dict:
+    """
+    Métadonnées film (colonnes de `films`) à partir d'une critique scrapée.
+    """
+    return {
+        "film": row.get("titre") or row.get("title"),
+        "url": row.get("film_url") or row.get("url"),
+        "rate": row.get("rate"),
+        "date_sortie": row.get("date_sortie"),
+        "image": row.get("image"),
+        "bande_originale": row.get("bande_originale"),
+        "groupe": row.get("groupe"),
+        "annee": row.get("annee"),
+        "duree": row.get("duree"),
+    }
+
+
+def make_scrapers():
+    """
+    Client HTTP (mode "http") et pool Selenium selon EXTRACT_MODE.
+    Retourne (fetcher ou None, pool de drivers, nombre de workers d'extraction).
+    """
+    remote = os.getenv("SELENIUM_REMOTE_URL") or "http://selenium:4444/wd/hub"
+    politesse = RateLimiter(SCRAPE_MIN_INTERVAL)
+    if EXTRACT_MODE == "selenium":
+        driver = DriverPool(remote, size=SELENIUM_SESSIONS, max_pages=SELENIUM_MAX_PAGES, rate_limiter=politesse)
+        print(f" Pool Selenium : {SELENIUM_SESSIONS} sessions sur {remote}")
+        return None, driver, SELENIUM_SESSIONS
+    # Mode HTTP : Selenium n'est démarré qu'en secours (JSON absent)
+    fetcher = HttpFetcher(max_connections=SCRAPE_CONCURRENCY, min_interval=SCRAPE_MIN_INTERVAL)
+    driver = DriverPool(remote, size=1, max_pages=SELENIUM_MAX_PAGES, rate_limiter=politesse)
+    print(f" Extraction HTTP ({SCRAPE_CONCURRENCY} requêtes simultanées), Selenium en secours")
+    return fetcher, driver, SCRAPE_CONCURRENCY
+
+
+def review_page(fetcher, driver, url: str, title: str | None, page: int) -> tuple[list[dict], dict | None]:
+    """
+    Une page de critiques d'un film : (critiques, pagination).
+    Avec USE_FAKE_EXTRACT, page synthétique (src/synthetic.py) sans réseau.
+    """
+    if USE_FAKE_EXTRACT:
+        return fake_review_page(url, title, page)
+    return film_review_page(fetcher, url, title, page, driver)
+
+
+def close_scrapers(fetcher, driver):
+    if driver:
+        driver.quit()
+    if fetcher:
+        fetcher.close()
+
+
+def discover_week(conn_state, week_url: str, fetcher, driver, use_cache: bool = CRAWL_INCREMENTAL) -> list[dict]:
+    """
+    Films d'une semaine : liste reprise de crawl_weeks si récente, sinon scrapée.
+    """
+    films = cached_week(conn_state, week_url) if use_cache else None
+    if films is not None:
+        print("♻️ Liste des films de la semaine reprise de crawl_weeks")
+        return films
+    if fetcher:
+        films = weekly_releases_http(fetcher, week_url, driver)
+    else:
+        films = driver.run(weekly_releases, week_url)
+    if films:
+        save_week(conn_state, week_url, films)
+    return films
+
+
+def print_latency(latency: dict):
+    """
+    Tableau des latences par opération (remplace les logs par ligne).
+    """
+    if not latency:
+        return
+    print(f"   {'opération':<28}{'n':>8}{'total s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for op, m in sorted(latency.items(), key=lambda kv: -kv[1]["total_s"]):
+        print(f"   {op:<28}{m['count']:>8}{m['total_s']:>10.2f}{m['p50_s'] * 1000:>10.1f}{m['p99_s'] * 1000:>10.1f}")
+
+
+def run_films(films: list[dict], fetcher, driver, scrape_workers: int, label: str | None = None) -> dict:
+    """
+    Pipeline en flux (files bornées entre étages) sur une liste de films :
+      1) Récupère les critiques de chaque film dû (crawl_state : les films
+         inchangés depuis la dernière visite s'arrêtent là)
+      2) Écarte les critiques déjà en base puis les quasi-doublons
+      3) Enrichit via TEI (embeddings par batch) + sentiment
+      4) Upsert films + insert reviews (vector) + dimensions, par batch,
+         puis centroïdes et agrégats de reporting des films touchés
+    TEI et Postgres travaillent pendant que le scraping continue.
+    Compteurs et latences du run (src/metrics.py) sont enregistrés dans pipeline_runs.
+    Retourne les compteurs du run, dont `failed_films` : films en erreur
+    d'extraction ou dont des critiques n'ont pas atteint la base.
+    """
+    started = time.time()
+    since = metrics.REGISTRY.snapshot()
+    # Connexions DB : une par étage qui écrit/lit en base
+    conn_filter = get_conn()
+    conn_load = get_conn()
+    conn_state = get_conn()
+    print("✅ Connexion DB OK")
+
+    totals = {
+        "deja_en_base": 0, "quasi_doublons": 0, "inserted": 0, "skipped": 0,
+        "films_inchanges": 0, "films_pas_dus": 0, "films_crees": 0,
+    }
+    totals_lock = threading.Lock()
+    films_touches: set[str] = set()
+    films_en_erreur: set[str] = set()
+    tracker = CrawlTracker(conn_state)
+    if CRAWL_INCREMENTAL:
+        tracker.states = load_states(conn_state, [f["url"] for f in films])
+    print(f"🎞️ Films détectés: {len(films)}")
+
+    def count(key: str, n: int = 1):
+        # Étages multi-workers (extraction) : incréments concurrents
+        with totals_lock:
+            totals[key] += n
+
+    def all_known(rows):
+        return not filter_new_reviews(conn_filter, rows)[0]
+
+    def extract_reviews(film):
+        title = film.get("titre") or film.get("title")
+        url = film["url"]
+        if CRAWL_INCREMENTAL and not is_due(tracker.states.get(url)):
+            count("films_pas_dus")
+            metrics.inc("films_total", result="not_due")
+            return []
+        try:
+            reviews, pagination = review_page(fetcher, driver, url, title, 1)
+            # Première page inchangée (même total annoncé) : pas besoin de lire la suite
+            fingerprint = reviews_fingerprint(reviews, (pagination or {}).get("total"))
+            if CRAWL_INCREMENTAL and tracker.unchanged(url, fingerprint):
+                tracker.check(film, reviews, fingerprint)
+                count("films_inchanges")
+                metrics.inc("films_total", result="unchanged")
+                return []
+            reviews += remaining_review_pages(
+                lambda page: review_page(fetcher, driver, url, title, page),
+                pagination,
+                len(reviews),
+                all_known=all_known if REVIEWS_EARLY_STOP else None,
+            )
+        except Exception:
+            films_en_erreur.add(url)
+            metrics.inc("films_total", result="error")
+            raise
+        if CRAWL_INCREMENTAL:
+            tracker.check(film, reviews, fingerprint)
+        metrics.inc("films_total", result="fetched")
+        metrics.inc("reviews_fetched_total", len(reviews))
+        return reviews
+
+    def prefilter(rows):
+        new_rows, skipped = filter_new_reviews(conn_filter, rows)
+        count("deja_en_base", skipped)
+        if skipped:
+            kept = {id(row) for row in new_rows}
+            tracker.settle(row for row in rows if id(row) not in kept)
+        return new_rows
+
+    run_index = NearDuplicateIndex()
+
+    def dedup(rows):
+        found = mark_near_duplicates(conn_filter, rows, run_index)
+        count("quasi_doublons", found)
+        if DEDUP_MODE == "drop":
+            tracker.settle(row for row in rows if row.get("duplicate_of"))
+            return [row for row in rows if not row.get("duplicate_of")]
+        return rows
+
+    def embed(rows):
+        embs = embed_batched([row["texte"] for row in rows], concurrency=1)
+        for row, emb in zip(rows, embs):
+            row["embedding"] = emb
+        return rows
+
+    def sentiment(rows):
+        labels, sources = classify_sentiments_sourced([row["texte"] for row in rows], [row.get("embedding") for row in rows])
+        for row, label, source in zip(rows, labels, sources):
+            row["sentiment"] = label
+            row["sentiment_source"] = source
+        return rows
+
+    def load(rows):
+        stats = bulk_load(
+            conn_load,
+            [film_from_row(row) for row in rows],
+            [(row, row.get("sentiment"), row.get("embedding")) for row in rows],
+        )
+        # Dimensions : une requête par table pour tout le batch
+        insert_dimensions(conn_load, dimension_pairs(rows))
+        register_signatures(conn_load, rows)
+        tracker.settle(rows)
+        films_touches.update(row.get("film_url") for row in rows)
+        count("inserted", stats["reviews_inserted"])
+        count("skipped", stats["reviews_skipped"])
+        count("films_crees", stats["films_inserted"])
+        return []
+
+    stages = [
+        Stage("extract", extract_reviews, workers=scrape_workers),
+        Stage("prefilter", prefilter, batch_size=PREFILTER_BATCH_SIZE),
+        *([Stage("dedup", dedup, batch_size=PREFILTER_BATCH_SIZE)] if DEDUP_MODE != "off" else []),
+        Stage("embed", embed, workers=TEI_CONCURRENCY, batch_size=TEI_BATCH_SIZE),
+        Stage("sentiment", sentiment, workers=SENTIMENT_WORKERS, batch_size=SENTIMENT_STAGE_BATCH),
+        Stage("load", load, batch_size=LOAD_BATCH_SIZE),
+    ]
+
+    stage_stats = {}
+    status = "error"
+    try:
+        stage_stats = run_pipeline(films, stages, queue_size=PIPELINE_QUEUE_SIZE)
+        print(f"\n📈 Étages: {stage_stats}")
+        # Centroïdes d'embeddings des films touchés (recherche de films similaires)
+        refreshed = refresh_film_embeddings(conn_load, films_touches)
+        print(f"🧭 Centroïdes films rafraîchis: {refreshed}")
+        # Agrégats de reporting (film_stats, dimension_stats, weekly_stats) des mêmes films
+        print(f"📊 Agrégats de reporting: {refresh_aggregates(conn_load, films_touches)}")
+        if CRAWL_INCREMENTAL:
+            print(
+                f"🕸️ Films ignorés: {totals['films_pas_dus']} pas encore à revisiter, "
+                f"{totals['films_inchanges']} inchangés ; {tracker.pending()} non soldés (repris au prochain run)"
+            )
+        print(f"⏭️ Critiques déjà en base ignorées avant inférence: {totals['deja_en_base']}")
+        print(f"👯 Quasi-doublons détectés ({DEDUP_MODE}): {totals['quasi_doublons']}")
+        print(f"📊 Résumé: {totals['inserted']} insertions, {totals['skipped'] + totals['deja_en_base']} ignorées.")
+        cache = get_cache()
+        if cache:
+            print(f"🗃️ Cache d'inférence: {cache.stats()}")
+        status = "ok" if not (films_en_erreur or tracker.pending()) else "partial"
+    finally:
+        failed = sorted(films_en_erreur | tracker.pending_urls())
+        run = metrics.REGISTRY.summary(since)
+        print("⏱️ Latences:")
+        print_latency(run["latency"])
+        for path in metrics.dump_profiles():
+            print(f"🔬 Profil: {path}")
+        try:
+            metrics.save_run(conn_state, label, started, {
+                "films": len(films),
+                "totals": totals,
+                "stages": stage_stats,
+                "failed_films": failed,
+                **run,
+            }, status)
+        except Exception as e:
+            print(f"   ⚠️ Rapport de run non enregistré: {e}")
+        conn_filter.close()
+        conn_load.close()
+        conn_state.close()
+    return {**totals, "stages": stage_stats, "failed_films": failed}
+
+
 # -------------------------
 # 4) Orchestrateur principal
 # -------------------------
 
-def run_weekly(limit_films:10):
+def run_weekly(limit_films: int | None = 10):
     """
-    Pipeline principal :
-      Récupère les films de la semaine (scraping)
-      Récupère les critiques de chaque film
-      3) Enrichit via sentiment + TEI
-      4) Upsert films + insert reviews (vector)
+    Pipeline principal : films de la semaine WEEK_URL (scraping, ou liste mise
+    en cache lors d'un run interrompu) + films connus à revisiter, puis run_films.
+    Avec USE_FAKE_EXTRACT, FAKE_FILMS films synthétiques remplacent la semaine.
     """
     print(" Démarrage du pipeline weekly...")
+    if USE_FAKE_EXTRACT:
+        return run_fake()
 
-    # URLs / drivers
     target_week = os.getenv("WEEK_URL")
     print(f"Target week URL: {target_week}")
     if not target_week:
         raise ValueError("week_url manquant")
-    remote = "http://selenium:4444/wd/hub"
-    print(f"Connexion Selenium Remote: {remote}")
-    driver = make_driver(remote)
-    print(f" Driver Selenium OK : {driver}")
-    # Connexion DB
-    conn = get_conn()
-    print("✅ Connexion DB OK")
-
+    server = metrics.start_server()
+    if server:
+        print(f"📡 Métriques Prometheus: http://localhost:{metrics.METRICS_PORT}/metrics")
+    fetcher, driver, scrape_workers = make_scrapers()
+    conn_state = get_conn()
     try:
-        # Récupération des films de la semaine
-        films = weekly_releases(driver, target_week)
+        with metrics.timed("discover"):
+            films = discover_week(conn_state, target_week, fetcher, driver)
         if limit_films:
             films = films[:limit_films]
-        print(f"🎞️ Films détectés: {len(films)}")
-        if not films:
-            print("⚠️ Aucun film détecté, arrêt.")
-            return
-
-        #Récupération des critiques
-        all_reviews: list[dict] = []
-        for film in films:
-            title = film.get("titre") or film.get("title")
-            film_url = film["url"]
-            print(f"\n▶ Scraping critiques pour: {title} ({film_url})")
-            try:
-                reviews = film_reviews(driver, film_url, film_title=title)
-                all_reviews.extend(reviews)
-                print(f"   📝 Critiques récupérées: {len(reviews)}")
-            except Exception as scrape_err:
-                print(f"   ❌ Impossible de récupérer les critiques: {scrape_err}")
-
-        print(f"\n📄 Nombre total de critiques à traiter: {len(all_reviews)}")
-
-        # 4) Boucle principale d'insertion
-        inserted = 0
-        skipped = 0
-        for row in all_reviews:
-            try:
-                print(f"\n▶ Traitement critique URL={row['url']}")
-                # Upsert film
-                film = {
-                    "film": row.get("titre") or row.get("title"),
-                    "url": row.get("film_url") or row.get("url"),
-                    "rate": row.get("rate"),
-                    "date_sortie": row.get("date_sortie"),
-                    "image": row.get("image"),
-                    "bande_originale": row.get("bande_originale"),
-                    "groupe": row.get("groupe"),
-                    "annee": row.get("annee"),
-                    "duree": row.get("duree"),
-                }
-                film_id = upsert_film(conn, film)
-                print(f"   🎬 film_id={film_id} ({film['film']})")
-                insert_genres(conn, film["film"], row.get("genres", []))
-                insert_producteurs(conn, film["film"], row.get("producteurs", []))
-                insert_realisateurs(conn, film["film"], row.get("realisateurs", []))
-                insert_scenaristes(conn, film["film"], row.get("scenaristes", []))
-                insert_pays(conn, film["film"], row.get("pays", []))
-                sentiment, emb = sentiment_critique(row["texte"])
-                print("   😊 Sentiment calculé")
-
-        
-                ok = insert_review(conn, film["film"], row, sentiment, emb)
-                if not ok:
-                    print("⚠️ Critique déjà en base (url).")
-                    skipped += 1
-                else:
-                    print("   ✅ Critique insérée.")
-                    inserted += 1
-            except Exception as e:
-                print(f"❌ ERREUR sur {row.get('url')}: {e}")
-
-        print(f"\n📊 Résumé: {inserted} insertions, {skipped} ignorées.")
+        if CRAWL_INCREMENTAL:
+            films = films + due_films(conn_state, CRAWL_REVISIT_LIMIT, exclude=[f["url"] for f in films])
+        run_films(films, fetcher, driver, scrape_workers, label=target_week)
         print("✅ Pipeline terminé.")
     finally:
-        driver.quit()
-        conn.close()
+        conn_state.close()
+        close_scrapers(fetcher, driver)
+        if server:
+            server.shutdown()
+
+
+def run_fake():
+    """
+    Test de charge : films synthétiques générés à la demande, critiques produites
+    page par page pendant l'extraction puis transform / load réels.
+    """
+    films = [{"titre": f["titre"], "url": f["url"]} for f in fake_films()]
+    print(f"🧪 Extraction synthétique : {len(films)} films (FAKE_SEED={FAKE_SEED})")
+    server = metrics.start_server()
+    try:
+        run_films(films, None, None, SCRAPE_CONCURRENCY, label=f"fake:{FAKE_SEED}:{FAKE_FILMS}")
+        print("✅ Pipeline terminé.")
+    finally:
+        if server:
+            server.shutdown()
 
 
 def count_facts(conn) -> int:
@@ -0,0 +1,433 @@
+"""
+Pipeline weekly exprimé en flow Prefect (même chaîne que flow.run_films).
+
+    python prefect_flow.py [URL_SEMAINE]     # WEEK_URL par défaut
+
+  - récupération des critiques : tâches mappées par film (première page, puis
+    pages suivantes mises en cache par url du film + empreinte de la première page) ;
+  - enrichissement (embeddings + sentiment) : tâches mappées par batch de critiques,
+    mises en cache par hash des critiques du batch ; un batch incomplet (embedding ou
+    sentiment manquant) échoue pour être rejoué au lieu d'être mis en cache ;
+  - chargement : enchaîné à l'enrichissement de chaque batch (batch_task), au fil de
+    l'eau comme le runner en flux de flow.py ;
+  - chargement, centroïdes et agrégats : tâches avec retries, idempotentes (ON CONFLICT).
+
+Chaque film / batch est une unité : seules celles en échec sont rejouées (retries),
+et un flow relancé reprend les résultats en cache des unités déjà terminées.
+FLOW_TASK_RUNNER=threads (par défaut) ou processes (prefect-dask), FLOW_MAX_WORKERS tâches simultanées.
+Limite de processes : les compteurs et latences de src/metrics mesurés dans les tâches
+restent dans les processus workers ; le rapport du run (save_run, /metrics) ne contient
+que ceux du processus du flow (films, préfiltrage) — durées par tâche dans l'UI Prefect.
+Avec PREFECT_API_URL (service prefect de docker-compose), runs et durées par tâche sont visibles dans l'UI.
+"""
+import atexit
+import hashlib
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from prefect import flow, task
+from prefect.futures import as_completed
+from prefect.task_runners import ThreadPoolTaskRunner
+
+import flow as pipeline
+from src import metrics
+from src.aggregates import refresh_aggregates
+from src.classifier import get_classifier
+from src.crawl_state import CrawlTracker, due_films, is_due, load_states, reviews_fingerprint
+from src.dedup import NearDuplicateIndex, mark_near_duplicates, register_signatures
+from src.extract import remaining_review_pages
+from src.load import bulk_load, dimension_pairs, filter_new_reviews, get_conn, insert_dimensions, refresh_film_embeddings
+from src.synthetic import FAKE_FILMS, FAKE_SEED, fake_films
+from src.sentiment import get_engine
+from src.transform import EMBED_MODEL_ID, classify_sentiments_sourced, embed_batched
+
+try:
+    from distributed import LocalCluster
+    from prefect_dask import DaskTaskRunner
+except ImportError:
+    DaskTaskRunner = None
+
+# "threads" (ThreadPoolTaskRunner) ou "processes" (DaskTaskRunner, un processus par worker)
+FLOW_TASK_RUNNER = os.getenv("FLOW_TASK_RUNNER", "threads")
+FLOW_MAX_WORKERS = int(os.getenv("FLOW_MAX_WORKERS", str(pipeline.SCRAPE_CONCURRENCY)))
+# Critiques (d'un même film) au plus par tâche d'enrichissement et de chargement
+FLOW_BATCH_SIZE = int(os.getenv("FLOW_BATCH_SIZE", "200"))
+FLOW_TASK_RETRIES = int(os.getenv("FLOW_TASK_RETRIES", "2"))
+FLOW_RETRY_DELAY = float(os.getenv("FLOW_RETRY_DELAY", "10"))
+# Durée de validité des résultats en cache (pages d'un film, batchs enrichis)
+FLOW_CACHE_HOURS = float(os.getenv("FLOW_CACHE_HOURS", "24"))
+
+_scrapers = None
+_scrapers_lock = threading.Lock()
+
+
+def scrapers():
+    """
+    Client HTTP et pool Selenium du processus, créés au premier usage et partagés
+    par les tâches (un jeu par worker avec FLOW_TASK_RUNNER=processes).
+    """
+    global _scrapers
+    with _scrapers_lock:
+        if _scrapers is None:
+            _scrapers = (None, None) if pipeline.USE_FAKE_EXTRACT else pipeline.make_scrapers()[:2]
+            atexit.register(close_scrapers)
+        return _scrapers
+
+
+def close_scrapers():
+    global _scrapers
+    with _scrapers_lock:
+        if _scrapers is not None:
+            pipeline.close_scrapers(*_scrapers)
+            _scrapers = None
+
+
+@contextmanager
+def task_runner():
+    """
+    Task runner choisi par FLOW_TASK_RUNNER. En mode processes, le cluster Dask est créé
+    ici et passé par adresse : le contexte du flow, réhydraté dans chaque worker, s'y
+    reconnecte au lieu de lancer un nouveau cluster par worker.
+    """
+    if FLOW_TASK_RUNNER == "threads":
+        yield ThreadPoolTaskRunner(max_workers=FLOW_MAX_WORKERS)
+        return
+    if FLOW_TASK_RUNNER != "processes":
+        raise ValueError(f"FLOW_TASK_RUNNER inconnu: {FLOW_TASK_RUNNER} (threads ou processes)")
+    if DaskTaskRunner is None:
+        raise RuntimeError("FLOW_TASK_RUNNER=processes nécessite prefect-dask (pip install -r requirements.txt)")
+    with LocalCluster(n_workers=FLOW_MAX_WORKERS, processes=True, threads_per_worker=1) as cluster:
+        yield DaskTaskRunner(address=cluster.scheduler_address)
+
+
+class DegradedBatch(Exception):
+    """
+    Batch enrichi incomplet (embedding ou sentiment manquant) : la tâche échoue pour
+    être rejouée et ne pas mettre en cache un résultat dégradé ; `outputs` garde le
+    meilleur résultat obtenu, chargé tel quel une fois les retries épuisés.
+    """
+
+    def __init__(self, outputs: dict[str, dict], missing_embeddings: int, missing_labels: int):
+        super().__init__(f"{missing_embeddings} embeddings et {missing_labels} sentiments manquants sur {len(outputs)} critiques")
+        self.outputs = outputs
+        self.missing = (missing_embeddings, missing_labels)
+
+    def __reduce__(self):
+        # Résultat d'échec persisté par Prefect : repickler avec les sorties
+        return DegradedBatch, (self.outputs, *self.missing)
+
+
+def film_pages_key(context, parameters) -> str:
+    """
+    Clé de cache des critiques d'un film : url + empreinte de la première page.
+    """
+    return f"film-reviews:{parameters['film']['url']}:{parameters['first']['fingerprint']}"
+
+
+def review_key(row: dict) -> str:
+    return row.get("hash_critique") or row.get("url") or ""
+
+
+def review_batch_key(context, parameters) -> str:
+    """
+    Clé de cache d'un batch enrichi : hash des critiques et modèles utilisés.
+    """
+    h = hashlib.sha1()
+    for r in sorted(review_key(row) for row in parameters["rows"]):
+        h.update(r.encode())
+        h.update(b"\0")
+    sentiment_model = os.getenv("SENTIMENT_MODEL") or os.getenv("GEN_MODEL") or ""
+    return f"review-batch:{EMBED_MODEL_ID}:{sentiment_model}:{h.hexdigest()}"
+
+
+@task(retries=FLOW_TASK_RETRIES, retry_delay_seconds=FLOW_RETRY_DELAY)
+def discover_task(week_url: str) -> list[dict]:
+    fetcher, driver = scrapers()
+    with get_conn() as conn:
+        return pipeline.discover_week(conn, week_url, fetcher, driver)
+
+
+@task(retries=FLOW_TASK_RETRIES, retry_delay_seconds=FLOW_RETRY_DELAY, task_run_name="first-page-{film[url]}")
+def first_page_task(film: dict) -> dict:
+    """
+    Première page de critiques et son empreinte (détection des films inchangés).
+    """
+    fetcher, driver = scrapers()
+    reviews, pagination = pipeline.review_page(fetcher, driver, film["url"], film.get("titre") or film.get("title"), 1)
+    return {
+        "reviews": reviews,
+        "pagination": pagination,
+        "fingerprint": reviews_fingerprint(reviews, (pagination or {}).get("total")),
+    }
+
+
+@task(
+    retries=FLOW_TASK_RETRIES,
+    retry_delay_seconds=FLOW_RETRY_DELAY,
+    cache_key_fn=film_pages_key,
+    cache_expiration=timedelta(hours=FLOW_CACHE_HOURS),
+    persist_result=True,
+    task_run_name="film-reviews-{film[url]}",
+)
+def film_reviews_task(film: dict, first: dict) -> list[dict]:
+    """
+    Toutes les critiques d'un film : première page + pages suivantes annoncées
+    (arrêt anticipé dès qu'une vague est déjà en base, comme flow.run_films).
+    """
+    fetcher, driver = scrapers()
+    url, title = film["url"], film.get("titre") or film.get("title")
+    with get_conn() as conn:
+        def all_known(rows):
+            return not filter_new_reviews(conn, rows)[0]
+
+        return first["reviews"] + remaining_review_pages(
+            lambda page: pipeline.review_page(fetcher, driver, url, title, page),
+            first["pagination"],
+            len(first["reviews"]),
+            all_known=all_known if pipeline.REVIEWS_EARLY_STOP else None,
+        )
+
+
+@task(
+    retries=FLOW_TASK_RETRIES,
+    retry_delay_seconds=FLOW_RETRY_DELAY,
+    cache_key_fn=review_batch_key,
+    cache_expiration=timedelta(hours=FLOW_CACHE_HOURS),
+    persist_result=True,
+)
+def enrich_task(rows: list[dict]) -> dict[str, dict]:
+    """
+    Embeddings (TEI) puis sentiment (et son origine) d'un batch de critiques, par review_key.
+    Seules ces sorties sont mises en cache : les champs du run (quasi-doublons...)
+    restent ceux des lignes courantes, fusionnés par batch_task.
+    Lève DegradedBatch si un embedding manque, ou un sentiment alors qu'un classifieur
+    local ou le LLM est configuré (sans eux, sentiment None est le résultat attendu).
+    """
+    texts = [row["texte"] for row in rows]
+    embs = embed_batched(texts, concurrency=1)
+    labels, sources = classify_sentiments_sourced(texts, embs)
+    outputs = {
+        review_key(row): {"embedding": emb, "sentiment": label, "sentiment_source": source}
+        for row, emb, label, source in zip(rows, embs, labels, sources)
+    }
+    missing_embeddings = sum(emb is None for emb in embs)
+    missing_labels = sum(label is None for label in labels) if get_classifier() or get_engine() else 0
+    if missing_embeddings or missing_labels:
+        raise DegradedBatch(outputs, missing_embeddings, missing_labels)
+    return outputs
+
+
+@task(retries=FLOW_TASK_RETRIES, retry_delay_seconds=FLOW_RETRY_DELAY)
+def load_task(rows: list[dict]) -> dict:
+    """
+    Upsert films + critiques + dimensions + signatures d'un batch (rejouable : ON CONFLICT).
+    """
+    with get_conn() as conn:
+        stats = bulk_load(
+            conn,
+            [pipeline.film_from_row(row) for row in rows],
+            [(row, row.get("sentiment"), row.get("embedding")) for row in rows],
+        )
+        insert_dimensions(conn, dimension_pairs(rows))
+        register_signatures(conn, rows)
+    return stats
+
+
+@task
+def batch_task(rows: list[dict]) -> dict:
+    """
+    Enrichissement puis chargement d'un batch, enchaînés dans le même worker : chaque
+    batch est chargé dès qu'il est enrichi, sans attendre les autres films.
+    Les sous-tâches gardent leurs retries et le cache de l'enrichissement.
+    """
+    try:
+        outputs = enrich_task(rows)
+    except DegradedBatch as e:
+        # Retries épuisés : chargé sans les valeurs manquantes (comme flow.run_films), non mis en cache
+        print(f"   ⚠️ Batch enrichi incomplet: {e}")
+        outputs = e.outputs
+    return load_task([{**row, **outputs.get(review_key(row), {})} for row in rows])
+
+
+@task(retries=FLOW_TASK_RETRIES, retry_delay_seconds=FLOW_RETRY_DELAY)
+def refresh_task(film_urls: list[str]) -> dict:
+    """
+    Centroïdes d'embeddings puis agrégats de reporting des films touchés.
+    """
+    with get_conn() as conn:
+        return {
+            "film_embeddings": refresh_film_embeddings(conn, film_urls),
+            "aggregates": refresh_aggregates(conn, film_urls),
+        }
+
+
+@flow(name="weekly-movies")
+def weekly_flow(week_url: str | None = None, limit_films: int | None = 10) -> dict:
+    """
+    Films de la semaine (+ films connus à revisiter) -> critiques -> enrichissement -> chargement.
+    Retourne les compteurs du run, dont `failed_films` (comme flow.run_films).
+    """
+    started = time.time()
+    since = metrics.REGISTRY.snapshot()
+    conn_state = get_conn()
+    conn_filter = get_conn()
+    totals = {
+        "deja_en_base": 0, "quasi_doublons": 0, "inserted": 0, "skipped": 0,
+        "films_inchanges": 0, "films_pas_dus": 0, "films_crees": 0,
+    }
+    films_touches: set[str] = set()
+    films_en_erreur: set[str] = set()
+    tracker = CrawlTracker(conn_state)
+    run_index = NearDuplicateIndex()
+    batches = {}
+    films = []
+    label = None
+    status = "error"
+
+    def submit_batches(rows):
+        """
+        Écarte les critiques déjà en base et les quasi-doublons, puis soumet enrichissement
+        et chargement par tranches de FLOW_BATCH_SIZE.
+        """
+        new_rows, skipped = filter_new_reviews(conn_filter, rows)
+        totals["deja_en_base"] += skipped
+        if skipped:
+            kept = {id(row) for row in new_rows}
+            tracker.settle(row for row in rows if id(row) not in kept)
+        if pipeline.DEDUP_MODE != "off" and new_rows:
+            totals["quasi_doublons"] += mark_near_duplicates(conn_filter, new_rows, run_index)
+            if pipeline.DEDUP_MODE == "drop":
+                tracker.settle(row for row in new_rows if row.get("duplicate_of"))
+                new_rows = [row for row in new_rows if not row.get("duplicate_of")]
+        for i in range(0, len(new_rows), FLOW_BATCH_SIZE):
+            batch = new_rows[i:i + FLOW_BATCH_SIZE]
+            fut = batch_task.submit(batch)
+            batches[fut.task_run_id] = (fut, batch)
+
+    try:
+        if pipeline.USE_FAKE_EXTRACT:
+            films = [{"titre": f["titre"], "url": f["url"]} for f in fake_films()]
+            label = f"prefect:fake:{FAKE_SEED}:{FAKE_FILMS}"
+            print(f"🧪 Extraction synthétique : {len(films)} films (FAKE_SEED={FAKE_SEED})")
+        else:
+            week_url = week_url or os.getenv("WEEK_URL")
+            if not week_url:
+                raise ValueError("week_url manquant")
+            label = f"prefect:{week_url}"
+            films = discover_task(week_url)
+            if limit_films:
+                films = films[:limit_films]
+            if pipeline.CRAWL_INCREMENTAL:
+                films = films + due_films(conn_state, pipeline.CRAWL_REVISIT_LIMIT, exclude=[f["url"] for f in films])
+        print(f"🎞️ Films détectés: {len(films)}")
+
+        if pipeline.CRAWL_INCREMENTAL:
+            tracker.states = load_states(conn_state, [f["url"] for f in films])
+        due = [f for f in films if not pipeline.CRAWL_INCREMENTAL or is_due(tracker.states.get(f["url"]))]
+        totals["films_pas_dus"] = len(films) - len(due)
+        metrics.inc("films_total", totals["films_pas_dus"], result="not_due")
+
+        # 1) Première page de chaque film : les films inchangés s'arrêtent là
+        firsts = first_page_task.map(due)
+        film_of = {fut.task_run_id: film for fut, film in zip(firsts, due)}
+        pages = []
+        for fut in as_completed(firsts):
+            film = film_of[fut.task_run_id]
+            first = fut.result(raise_on_failure=False)
+            if isinstance(first, BaseException):
+                films_en_erreur.add(film["url"])
+                metrics.inc("films_total", result="error")
+                continue
+            if pipeline.CRAWL_INCREMENTAL and tracker.unchanged(film["url"], first["fingerprint"]):
+                tracker.check(film, first["reviews"], first["fingerprint"])
+                totals["films_inchanges"] += 1
+                metrics.inc("films_total", result="unchanged")
+                continue
+            fut_pages = film_reviews_task.submit(film, first)
+            film_of[fut_pages.task_run_id] = (film, first["fingerprint"])
+            pages.append(fut_pages)
+
+        # 2) Critiques par film ; batchs découpés film par film pour des clés de cache stables
+        for fut in as_completed(pages):
+            film, fingerprint = film_of[fut.task_run_id]
+            reviews = fut.result(raise_on_failure=False)
+            if isinstance(reviews, BaseException):
+                films_en_erreur.add(film["url"])
+                metrics.inc("films_total", result="error")
+                continue
+            if pipeline.CRAWL_INCREMENTAL:
+                tracker.check(film, reviews, fingerprint)
+            metrics.inc("films_total", result="fetched")
+            metrics.inc("reviews_fetched_total", len(reviews))
+            if reviews:
+                submit_batches(reviews)
+
+        # 3) Bilan des batchs (déjà chargés au fil de l'eau par batch_task)
+        for fut in as_completed([fut for fut, _ in batches.values()]):
+            rows = batches[fut.task_run_id][1]
+            stats = fut.result(raise_on_failure=False)
+            if isinstance(stats, BaseException):
+                print(f"   ⚠️ Batch non chargé ({len(rows)} critiques): {stats}")
+                continue
+            tracker.settle(rows)
+            films_touches.update(row.get("film_url") for row in rows)
+            totals["inserted"] += stats["reviews_inserted"]
+            totals["skipped"] += stats["reviews_skipped"]
+            totals["films_crees"] += stats["films_inserted"]
+
+        refreshed = refresh_task(sorted(u for u in films_touches if u))
+        print(f"🧭 Centroïdes films rafraîchis: {refreshed['film_embeddings']}")
+        print(f"📊 Agrégats de reporting: {refreshed['aggregates']}")
+        if pipeline.CRAWL_INCREMENTAL:
+            print(
+                f"🕸️ Films ignorés: {totals['films_pas_dus']} pas encore à revisiter, "
+                f"{totals['films_inchanges']} inchangés ; {tracker.pending()} non soldés (repris au prochain run)"
+            )
+        print(f"⏭️ Critiques déjà en base ignorées avant inférence: {totals['deja_en_base']}")
+        print(f"👯 Quasi-doublons détectés ({pipeline.DEDUP_MODE}): {totals['quasi_doublons']}")
+        print(f"📊 Résumé: {totals['inserted']} insertions, {totals['skipped'] + totals['deja_en_base']} ignorées.")
+        status = "ok" if not (films_en_erreur or tracker.pending()) else "partial"
+    finally:
+        failed = sorted(films_en_erreur | tracker.pending_urls())
+        run = metrics.REGISTRY.summary(since)
+        print("⏱️ Latences:")
+        pipeline.print_latency(run["latency"])
+        try:
+            metrics.save_run(conn_state, label, started, {
+                "films": len(films),
+                "totals": totals,
+                "failed_films": failed,
+                **run,
+            }, status)
+        except Exception as e:
+            print(f"   ⚠️ Rapport de run non enregistré: {e}")
+        conn_filter.close()
+        conn_state.close()
+        close_scrapers()
+    return {**totals, "failed_films": failed}
+
+
+def run_weekly(week_url: str | None = None, limit_films: int | None = 10) -> dict:
+    """
+    Lance weekly_flow avec le task runner choisi par FLOW_TASK_RUNNER / FLOW_MAX_WORKERS.
+    """
+    print(f" Démarrage du flow Prefect ({FLOW_TASK_RUNNER}, {FLOW_MAX_WORKERS} tâches simultanées)...")
+    if FLOW_TASK_RUNNER == "processes":
+        print("   ⚠️ Métriques des tâches non remontées (processus workers) : voir l'UI Prefect pour les durées.")
+    server = metrics.start_server()
+    try:
+        with task_runner() as runner:
+            result = weekly_flow.with_options(task_runner=runner)(week_url, limit_films)
+        print("✅ Pipeline terminé.")
+        return result
+    finally:
+        if server:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    run_weekly(sys.argv[1] if len(sys.argv) > 1 else None, limit_films=10)
@@ -0,0 +1,21 @@
+#!/bin/sh
+# Applique, dans l'ordre lexical, les migrations sql/migrations/*.sql absentes de schema_migrations.
+# Connexion via les variables PGHOST / PGPORT / PGUSER / PGPASSWORD / PGDATABASE.
+#   sh sql/migrate.sh              applique les migrations en attente
+#   sh sql/migrate.sh --baseline   les marque comme appliquées sans les exécuter (base créée par schema.sql)
+set -eu
+DIR="$(dirname "$0")/migrations"
+PSQL="psql -X -q -v ON_ERROR_STOP=1"
+
+$PSQL -c "CREATE TABLE IF NOT EXISTS schema_migrations (filename TEXT PRIMARY KEY, applied_at TIMESTAMPTZ NOT NULL DEFAULT now())"
+for f in "$DIR"/*.sql; do
+    name="$(basename "$f")"
+    if [ -n "$($PSQL -tAc "SELECT 1 FROM schema_migrations WHERE filename = '$name'")" ]; then
+        continue
+    fi
+    if [ "${1:-}" != "--baseline" ]; then
+        echo "-> $name"
+        $PSQL -f "$f"
+    fi
+    $PSQL -c "INSERT INTO schema_migrations (filename) VALUES ('$name')"
+done
@@ -0,0 +1,6 @@
+-- Ajoute hash_critique (sha1 auteur||texte) aux critiques existantes pour le pré-filtre.
+-- Les lignes déjà chargées gardent hash_critique NULL (l'auteur n'est pas stocké) :
+-- elles restent filtrées par url.
+
+ALTER TABLE reviews ADD COLUMN IF NOT EXISTS hash_critique VARCHAR(40);
+CREATE INDEX IF NOT EXISTS reviews_hash_critique_idx ON reviews (hash_critique);
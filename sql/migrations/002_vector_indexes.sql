@@ -0,0 +1,22 @@
+-- Index ANN sur les embeddings de critiques + table des centroïdes par film.
+
+CREATE INDEX IF NOT EXISTS reviews_embedding_hnsw_idx ON reviews USING hnsw (embedding vector_cosine_ops);
+
+CREATE TABLE IF NOT EXISTS film_embeddings (
+    film_url TEXT PRIMARY KEY,
+    film VARCHAR(255),
+    embedding VECTOR(384),
+    review_count INTEGER,
+    updated_at TIMESTAMPTZ DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS film_embeddings_hnsw_idx ON film_embeddings USING hnsw (embedding vector_cosine_ops);
+
+-- Premier remplissage des centroïdes
+INSERT INTO film_embeddings (film_url, film, embedding, review_count, updated_at)
+SELECT f.url, f.film, AVG(r.embedding), COUNT(*), now()
+FROM films f
+JOIN reviews r ON r.film = f.film
+WHERE r.embedding IS NOT NULL AND f.url IS NOT NULL
+GROUP BY f.url, f.film
+ON CONFLICT (film_url) DO NOTHING;
@@ -0,0 +1,22 @@
+-- Formes compactes des embeddings (pgvector >= 0.7) :
+--   embedding_half : float16, ~2x plus petit que VECTOR(384)
+--   embedding_bin  : signature binaire (1 bit/dimension), ~32x plus petit, pour la passe grossière
+-- Remplit les lignes existantes à partir de embedding.
+
+ALTER TABLE reviews ADD COLUMN IF NOT EXISTS embedding_half HALFVEC(384);
+ALTER TABLE reviews ADD COLUMN IF NOT EXISTS embedding_bin BIT(384);
+
+UPDATE reviews
+SET embedding_half = embedding::halfvec,
+    embedding_bin = binary_quantize(embedding)::bit(384)
+WHERE embedding IS NOT NULL
+  AND (embedding_half IS NULL OR embedding_bin IS NULL);
+
+CREATE INDEX IF NOT EXISTS reviews_embedding_half_hnsw_idx ON reviews USING hnsw (embedding_half halfvec_cosine_ops);
+CREATE INDEX IF NOT EXISTS reviews_embedding_bin_hnsw_idx ON reviews USING hnsw (embedding_bin bit_hamming_ops);
+
+-- Pour ne garder que les formes compactes (EMBEDDING_STORAGE=half,binary), après vérification du rappel
+-- (python benchmarks/eval_quantization.py) :
+--   DROP INDEX IF EXISTS reviews_embedding_hnsw_idx;
+--   UPDATE reviews SET embedding = NULL;
+--   VACUUM FULL reviews;
@@ -0,0 +1,13 @@
+-- Quasi-doublons : colonne de marquage + index LSH des signatures MinHash.
+-- Pas de backfill : les signatures sont enregistrées au chargement des critiques (reviews ne garde pas
+-- l'auteur, nécessaire au périmètre film + auteur des buckets, voir migration 010 et README).
+
+ALTER TABLE reviews ADD COLUMN IF NOT EXISTS duplicate_of TEXT;
+
+CREATE TABLE IF NOT EXISTS review_minhash (
+    url TEXT PRIMARY KEY,
+    signature BIGINT[] NOT NULL,
+    buckets BIGINT[] NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS review_minhash_buckets_idx ON review_minhash USING gin (buckets);
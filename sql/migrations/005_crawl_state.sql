@@ -0,0 +1,21 @@
+-- État de crawl incrémental : films inchangés ignorés, reprise après crash, revisite décroissante.
+
+CREATE TABLE IF NOT EXISTS crawl_state (
+    film_url TEXT PRIMARY KEY,
+    film VARCHAR(255),
+    fingerprint VARCHAR(40),
+    review_count INTEGER,
+    last_review_id BIGINT,
+    unchanged_streak INTEGER NOT NULL DEFAULT 0,
+    last_scraped_at TIMESTAMPTZ,
+    last_changed_at TIMESTAMPTZ,
+    next_visit_at TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS crawl_state_next_visit_idx ON crawl_state (next_visit_at);
+
+CREATE TABLE IF NOT EXISTS crawl_weeks (
+    week_url TEXT PRIMARY KEY,
+    films JSONB NOT NULL,
+    discovered_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
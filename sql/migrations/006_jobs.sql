@@ -0,0 +1,24 @@
+-- File de travaux Postgres pour le backfill multi-semaines (python backfill.py).
+
+CREATE TABLE IF NOT EXISTS jobs (
+    id BIGSERIAL PRIMARY KEY,
+    kind TEXT NOT NULL,
+    url TEXT NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{}',
+    status TEXT NOT NULL DEFAULT 'pending',
+    priority INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 5,
+    run_after TIMESTAMPTZ NOT NULL DEFAULT now(),
+    locked_by TEXT,
+    started_at TIMESTAMPTZ,
+    heartbeat_at TIMESTAMPTZ,
+    finished_at TIMESTAMPTZ,
+    result JSONB,
+    error TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    CONSTRAINT jobs_unique UNIQUE (kind, url)
+);
+
+-- Réclamation : travaux prêts par priorité (index partiel, reste petit une fois la file vidée)
+CREATE INDEX IF NOT EXISTS jobs_claim_idx ON jobs (priority DESC, id) WHERE status IN ('pending', 'running');
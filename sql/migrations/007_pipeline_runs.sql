@@ -0,0 +1,13 @@
+-- Rapports de run (compteurs et latences par étage) écrits par flow.run_films.
+
+CREATE TABLE IF NOT EXISTS pipeline_runs (
+    id BIGSERIAL PRIMARY KEY,
+    label TEXT,
+    status TEXT NOT NULL,
+    started_at TIMESTAMPTZ NOT NULL,
+    finished_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    duration_s DOUBLE PRECISION,
+    summary JSONB NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS pipeline_runs_started_idx ON pipeline_runs (started_at DESC);
@@ -0,0 +1,62 @@
+-- Agrégats de reporting matérialisés + index de jointure ; remplissage initial : python -m src.aggregates rebuild
+
+-- Index de jointure sur le titre (reviews / dimensions -> films) et de regroupement par valeur
+CREATE INDEX IF NOT EXISTS reviews_film_idx ON reviews (film);
+CREATE INDEX IF NOT EXISTS films_film_idx ON films (film);
+CREATE INDEX IF NOT EXISTS genres_genre_idx ON genres (genre);
+CREATE INDEX IF NOT EXISTS realisateurs_realisateur_idx ON realisateurs (realisateur);
+CREATE INDEX IF NOT EXISTS pays_pays_idx ON pays (pays);
+
+-- Agrégats de reporting (src/aggregates.py), rafraîchis pour les films touchés par chaque run
+CREATE TABLE IF NOT EXISTS film_stats (
+    film_url TEXT PRIMARY KEY,
+    film VARCHAR(255),
+    rate FLOAT,
+    date_sortie DATE,
+    release_week DATE,
+    annee FLOAT,
+    review_count INTEGER NOT NULL,
+    classified_count INTEGER NOT NULL,
+    negative_count INTEGER NOT NULL,
+    likes_sum DOUBLE PRECISION NOT NULL,
+    comments_sum DOUBLE PRECISION NOT NULL,
+    negative_share DOUBLE PRECISION,
+    avg_likes DOUBLE PRECISION,
+    avg_comments DOUBLE PRECISION,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS film_stats_film_idx ON film_stats (film);
+CREATE INDEX IF NOT EXISTS film_stats_release_week_idx ON film_stats (release_week);
+
+-- Rollups par genre / réalisateur / pays (dimension = 'genre' | 'realisateur' | 'pays')
+CREATE TABLE IF NOT EXISTS dimension_stats (
+    dimension TEXT NOT NULL,
+    value VARCHAR(255) NOT NULL,
+    film_count INTEGER NOT NULL,
+    review_count BIGINT NOT NULL,
+    classified_count BIGINT NOT NULL,
+    negative_count BIGINT NOT NULL,
+    negative_share DOUBLE PRECISION,
+    avg_likes DOUBLE PRECISION,
+    avg_comments DOUBLE PRECISION,
+    avg_rate DOUBLE PRECISION,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (dimension, value)
+);
+
+CREATE INDEX IF NOT EXISTS dimension_stats_top_idx ON dimension_stats (dimension, review_count DESC);
+
+-- Tendances par semaine de sortie (lundi de la semaine de date_sortie)
+CREATE TABLE IF NOT EXISTS weekly_stats (
+    week DATE PRIMARY KEY,
+    film_count INTEGER NOT NULL,
+    review_count BIGINT NOT NULL,
+    classified_count BIGINT NOT NULL,
+    negative_count BIGINT NOT NULL,
+    negative_share DOUBLE PRECISION,
+    avg_likes DOUBLE PRECISION,
+    avg_comments DOUBLE PRECISION,
+    avg_rate DOUBLE PRECISION,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
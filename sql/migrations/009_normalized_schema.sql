@@ -0,0 +1,184 @@
+-- Schéma normalisé à clés entières, conversion en place des données existantes :
+--   - critiques reliées par reviews.film_id (au lieu du titre) ; title, redondant avec films.film, disparaît ;
+--   - valeurs de dimension stockées une fois (genres, producteurs, ... avec id) et reliées
+--     aux films par des tables de liaison film_genres, film_producteurs, ... ;
+--   - likes / comments en INTEGER, annee / duree en SMALLINT ;
+--   - film_embeddings (recalculé) et agrégats de reporting indexés par film_id.
+-- Les anciennes données ne connaissent que le titre : une critique est rattachée au film de ce
+-- titre dont le slug d'url correspond à celui de la critique (sinon au plus ancien) ; les
+-- valeurs de dimension sont reliées à tous les films portant ce titre.
+-- Ensuite : python -m src.aggregates rebuild, puis VACUUM FULL reviews pour récupérer la place.
+
+SELECT EXISTS (
+    SELECT 1 FROM information_schema.columns
+    WHERE table_schema = current_schema() AND table_name = 'reviews' AND column_name = 'film'
+) AS needs_normalization \gset
+
+\if :needs_normalization
+BEGIN;
+
+ALTER TABLE films
+    ALTER COLUMN annee TYPE SMALLINT USING round(annee)::smallint,
+    ALTER COLUMN duree TYPE SMALLINT USING round(duree)::smallint;
+
+ALTER TABLE reviews ADD COLUMN film_id INTEGER REFERENCES films(id) ON DELETE CASCADE;
+UPDATE reviews r SET film_id = (
+    SELECT f.id
+    FROM films f
+    WHERE f.film = r.film
+    ORDER BY COALESCE(r.url LIKE regexp_replace(f.url, '/[0-9]+/?$', '') || '/critique/%', false) DESC, f.id
+    LIMIT 1
+);
+ALTER TABLE reviews
+    ALTER COLUMN likes TYPE INTEGER USING round(likes)::integer,
+    ALTER COLUMN comments TYPE INTEGER USING round(comments)::integer,
+    DROP COLUMN film,
+    DROP COLUMN title;
+CREATE INDEX reviews_film_id_idx ON reviews (film_id);
+
+CREATE TEMP TABLE old_genres ON COMMIT DROP AS
+    SELECT DISTINCT film, btrim(genre) AS value FROM genres WHERE btrim(COALESCE(genre, '')) <> '';
+DROP TABLE genres;
+CREATE TABLE genres (
+    id SERIAL PRIMARY KEY,
+    genre VARCHAR(255) NOT NULL UNIQUE
+);
+INSERT INTO genres (genre) SELECT DISTINCT value FROM old_genres ORDER BY value;
+CREATE TABLE film_genres (
+    film_id INTEGER NOT NULL REFERENCES films(id) ON DELETE CASCADE,
+    genre_id INTEGER NOT NULL REFERENCES genres(id),
+    PRIMARY KEY (film_id, genre_id)
+);
+INSERT INTO film_genres (film_id, genre_id)
+    SELECT DISTINCT f.id, d.id FROM old_genres o JOIN films f ON f.film = o.film JOIN genres d ON d.genre = o.value;
+CREATE INDEX film_genres_genre_idx ON film_genres (genre_id);
+
+CREATE TEMP TABLE old_producteurs ON COMMIT DROP AS
+    SELECT DISTINCT film, btrim(producteur) AS value FROM producteurs WHERE btrim(COALESCE(producteur, '')) <> '';
+DROP TABLE producteurs;
+CREATE TABLE producteurs (
+    id SERIAL PRIMARY KEY,
+    producteur VARCHAR(255) NOT NULL UNIQUE
+);
+INSERT INTO producteurs (producteur) SELECT DISTINCT value FROM old_producteurs ORDER BY value;
+CREATE TABLE film_producteurs (
+    film_id INTEGER NOT NULL REFERENCES films(id) ON DELETE CASCADE,
+    producteur_id INTEGER NOT NULL REFERENCES producteurs(id),
+    PRIMARY KEY (film_id, producteur_id)
+);
+INSERT INTO film_producteurs (film_id, producteur_id)
+    SELECT DISTINCT f.id, d.id FROM old_producteurs o JOIN films f ON f.film = o.film JOIN producteurs d ON d.producteur = o.value;
+CREATE INDEX film_producteurs_producteur_idx ON film_producteurs (producteur_id);
+
+CREATE TEMP TABLE old_realisateurs ON COMMIT DROP AS
+    SELECT DISTINCT film, btrim(realisateur) AS value FROM realisateurs WHERE btrim(COALESCE(realisateur, '')) <> '';
+DROP TABLE realisateurs;
+CREATE TABLE realisateurs (
+    id SERIAL PRIMARY KEY,
+    realisateur VARCHAR(255) NOT NULL UNIQUE
+);
+INSERT INTO realisateurs (realisateur) SELECT DISTINCT value FROM old_realisateurs ORDER BY value;
+CREATE TABLE film_realisateurs (
+    film_id INTEGER NOT NULL REFERENCES films(id) ON DELETE CASCADE,
+    realisateur_id INTEGER NOT NULL REFERENCES realisateurs(id),
+    PRIMARY KEY (film_id, realisateur_id)
+);
+INSERT INTO film_realisateurs (film_id, realisateur_id)
+    SELECT DISTINCT f.id, d.id FROM old_realisateurs o JOIN films f ON f.film = o.film JOIN realisateurs d ON d.realisateur = o.value;
+CREATE INDEX film_realisateurs_realisateur_idx ON film_realisateurs (realisateur_id);
+
+CREATE TEMP TABLE old_scenaristes ON COMMIT DROP AS
+    SELECT DISTINCT film, btrim(scenariste) AS value FROM scenaristes WHERE btrim(COALESCE(scenariste, '')) <> '';
+DROP TABLE scenaristes;
+CREATE TABLE scenaristes (
+    id SERIAL PRIMARY KEY,
+    scenariste VARCHAR(255) NOT NULL UNIQUE
+);
+INSERT INTO scenaristes (scenariste) SELECT DISTINCT value FROM old_scenaristes ORDER BY value;
+CREATE TABLE film_scenaristes (
+    film_id INTEGER NOT NULL REFERENCES films(id) ON DELETE CASCADE,
+    scenariste_id INTEGER NOT NULL REFERENCES scenaristes(id),
+    PRIMARY KEY (film_id, scenariste_id)
+);
+INSERT INTO film_scenaristes (film_id, scenariste_id)
+    SELECT DISTINCT f.id, d.id FROM old_scenaristes o JOIN films f ON f.film = o.film JOIN scenaristes d ON d.scenariste = o.value;
+CREATE INDEX film_scenaristes_scenariste_idx ON film_scenaristes (scenariste_id);
+
+CREATE TEMP TABLE old_pays ON COMMIT DROP AS
+    SELECT DISTINCT film, btrim(pays) AS value FROM pays WHERE btrim(COALESCE(pays, '')) <> '';
+DROP TABLE pays;
+CREATE TABLE pays (
+    id SERIAL PRIMARY KEY,
+    pays VARCHAR(255) NOT NULL UNIQUE
+);
+INSERT INTO pays (pays) SELECT DISTINCT value FROM old_pays ORDER BY value;
+CREATE TABLE film_pays (
+    film_id INTEGER NOT NULL REFERENCES films(id) ON DELETE CASCADE,
+    pays_id INTEGER NOT NULL REFERENCES pays(id),
+    PRIMARY KEY (film_id, pays_id)
+);
+INSERT INTO film_pays (film_id, pays_id)
+    SELECT DISTINCT f.id, d.id FROM old_pays o JOIN films f ON f.film = o.film JOIN pays d ON d.pays = o.value;
+CREATE INDEX film_pays_pays_idx ON film_pays (pays_id);
+
+-- Centroïdes recalculés sur film_id (les anciens étaient joints par titre)
+TRUNCATE film_embeddings;
+ALTER TABLE film_embeddings
+    DROP CONSTRAINT film_embeddings_pkey,
+    DROP COLUMN film_url,
+    DROP COLUMN film,
+    ADD COLUMN film_id INTEGER PRIMARY KEY REFERENCES films(id) ON DELETE CASCADE;
+INSERT INTO film_embeddings (film_id, embedding, review_count, updated_at)
+    SELECT r.film_id, AVG(COALESCE(r.embedding, r.embedding_half::vector)), COUNT(*), now()
+    FROM reviews r
+    WHERE r.film_id IS NOT NULL AND COALESCE(r.embedding, r.embedding_half::vector) IS NOT NULL
+    GROUP BY r.film_id;
+
+-- Agrégats de reporting (migration 008) recréés sur film_id / value_id, à reconstruire
+DROP TABLE IF EXISTS film_stats;
+DROP TABLE IF EXISTS dimension_stats;
+DROP INDEX IF EXISTS films_film_idx;
+TRUNCATE weekly_stats;
+
+CREATE TABLE film_stats (
+    film_id INTEGER PRIMARY KEY REFERENCES films(id) ON DELETE CASCADE,
+    rate FLOAT,
+    date_sortie DATE,
+    release_week DATE,
+    annee SMALLINT,
+    review_count INTEGER NOT NULL,
+    classified_count INTEGER NOT NULL,
+    negative_count INTEGER NOT NULL,
+    likes_sum BIGINT NOT NULL,
+    comments_sum BIGINT NOT NULL,
+    negative_share DOUBLE PRECISION,
+    avg_likes DOUBLE PRECISION,
+    avg_comments DOUBLE PRECISION,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX film_stats_release_week_idx ON film_stats (release_week);
+
+-- Rollups par genre / réalisateur / pays (dimension = 'genre' | 'realisateur' | 'pays', value_id = id dans la table de référence)
+CREATE TABLE dimension_stats (
+    dimension TEXT NOT NULL,
+    value_id INTEGER NOT NULL,
+    value VARCHAR(255) NOT NULL,
+    film_count INTEGER NOT NULL,
+    review_count BIGINT NOT NULL,
+    classified_count BIGINT NOT NULL,
+    negative_count BIGINT NOT NULL,
+    negative_share DOUBLE PRECISION,
+    avg_likes DOUBLE PRECISION,
+    avg_comments DOUBLE PRECISION,
+    avg_rate DOUBLE PRECISION,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (dimension, value_id)
+);
+
+CREATE INDEX dimension_stats_top_idx ON dimension_stats (dimension, review_count DESC);
+
+COMMIT;
+\else
+\echo 'Schéma déjà normalisé (reviews.film_id), rien à faire.'
+\endif
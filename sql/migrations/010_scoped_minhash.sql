@@ -0,0 +1,3 @@
+-- Quasi-doublons : les buckets LSH incluent désormais le film et l'auteur de la critique.
+-- Les signatures antérieures (buckets sans périmètre) ne rencontrent plus aucune critique : on les retire.
+TRUNCATE review_minhash;
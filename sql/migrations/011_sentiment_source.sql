@@ -0,0 +1,9 @@
+-- Origine du label de sentiment : 'llm' (modèle HF), 'local' (classifieur src/classifier.py)
+-- ou 'manual' (annotation à la main). Le classifieur ne s'entraîne que sur 'llm' / 'manual'
+-- pour ne pas réapprendre ses propres prédictions.
+ALTER TABLE reviews ADD COLUMN IF NOT EXISTS sentiment_source TEXT
+    CHECK (sentiment_source IN ('llm', 'local', 'manual'));
+
+-- Les labels antérieurs restent d'origine inconnue (NULL) : exclus de l'entraînement.
+-- Si aucun classifieur local n'avait été déployé, ils viennent tous du LLM :
+--   UPDATE reviews SET sentiment_source = 'llm' WHERE is_negative IS NOT NULL AND sentiment_source IS NULL;
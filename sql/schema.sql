@@ -4,7 +4,21 @@
 CREATE EXTENSION IF NOT EXISTS vector;
 
 -- Drop existing tables in dependency-safe order
+DROP TABLE IF EXISTS weekly_stats CASCADE;
+DROP TABLE IF EXISTS dimension_stats CASCADE;
+DROP TABLE IF EXISTS film_stats CASCADE;
+DROP TABLE IF EXISTS pipeline_runs CASCADE;
+DROP TABLE IF EXISTS jobs CASCADE;
+DROP TABLE IF EXISTS crawl_weeks CASCADE;
+DROP TABLE IF EXISTS crawl_state CASCADE;
+DROP TABLE IF EXISTS review_minhash CASCADE;
+DROP TABLE IF EXISTS film_embeddings CASCADE;
 DROP TABLE IF EXISTS reviews CASCADE;
+DROP TABLE IF EXISTS film_pays CASCADE;
+DROP TABLE IF EXISTS film_scenaristes CASCADE;
+DROP TABLE IF EXISTS film_realisateurs CASCADE;
+DROP TABLE IF EXISTS film_producteurs CASCADE;
+DROP TABLE IF EXISTS film_genres CASCADE;
 DROP TABLE IF EXISTS pays CASCADE;
 DROP TABLE IF EXISTS scenaristes CASCADE;
 DROP TABLE IF EXISTS realisateurs CASCADE;
@@ -21,53 +35,230 @@ CREATE TABLE films (
     image TEXT,
     bande_originale VARCHAR(255),
     groupe VARCHAR(255),
-    annee FLOAT,
-    duree FLOAT
+    annee SMALLINT,
+    duree SMALLINT
 );
 
+-- Dimensions : chaque valeur une seule fois (table de référence), reliée aux films par une table de liaison
 CREATE TABLE genres (
     id SERIAL PRIMARY KEY,
-    film VARCHAR(255),
-    genre VARCHAR(255),
-    CONSTRAINT genres_unique UNIQUE(film, genre)
+    genre VARCHAR(255) NOT NULL UNIQUE
 );
 
 CREATE TABLE producteurs (
     id SERIAL PRIMARY KEY,
-    film VARCHAR(255),
-    producteur VARCHAR(255),
-    CONSTRAINT producteurs_unique UNIQUE(film, producteur)
+    producteur VARCHAR(255) NOT NULL UNIQUE
 );
 
 CREATE TABLE realisateurs (
     id SERIAL PRIMARY KEY,
-    film VARCHAR(255),
-    realisateur VARCHAR(255),
-    CONSTRAINT realisateurs_unique UNIQUE(film, realisateur)
+    realisateur VARCHAR(255) NOT NULL UNIQUE
 );
 
 CREATE TABLE scenaristes (
     id SERIAL PRIMARY KEY,
-    film VARCHAR(255),
-    scenariste VARCHAR(255),
-    CONSTRAINT scenaristes_unique UNIQUE(film, scenariste)
+    scenariste VARCHAR(255) NOT NULL UNIQUE
 );
 
 CREATE TABLE pays (
     id SERIAL PRIMARY KEY,
-    film VARCHAR(255),
-    pays VARCHAR(255),
-    CONSTRAINT pays_unique UNIQUE(film, pays)
+    pays VARCHAR(255) NOT NULL UNIQUE
+);
+
+CREATE TABLE film_genres (
+    film_id INTEGER NOT NULL REFERENCES films(id) ON DELETE CASCADE,
+    genre_id INTEGER NOT NULL REFERENCES genres(id),
+    PRIMARY KEY (film_id, genre_id)
+);
+
+CREATE TABLE film_producteurs (
+    film_id INTEGER NOT NULL REFERENCES films(id) ON DELETE CASCADE,
+    producteur_id INTEGER NOT NULL REFERENCES producteurs(id),
+    PRIMARY KEY (film_id, producteur_id)
+);
+
+CREATE TABLE film_realisateurs (
+    film_id INTEGER NOT NULL REFERENCES films(id) ON DELETE CASCADE,
+    realisateur_id INTEGER NOT NULL REFERENCES realisateurs(id),
+    PRIMARY KEY (film_id, realisateur_id)
+);
+
+CREATE TABLE film_scenaristes (
+    film_id INTEGER NOT NULL REFERENCES films(id) ON DELETE CASCADE,
+    scenariste_id INTEGER NOT NULL REFERENCES scenaristes(id),
+    PRIMARY KEY (film_id, scenariste_id)
+);
+
+CREATE TABLE film_pays (
+    film_id INTEGER NOT NULL REFERENCES films(id) ON DELETE CASCADE,
+    pays_id INTEGER NOT NULL REFERENCES pays(id),
+    PRIMARY KEY (film_id, pays_id)
 );
 
+-- Films d'une valeur (rollups par genre / réalisateur / pays)
+CREATE INDEX film_genres_genre_idx ON film_genres (genre_id);
+CREATE INDEX film_producteurs_producteur_idx ON film_producteurs (producteur_id);
+CREATE INDEX film_realisateurs_realisateur_idx ON film_realisateurs (realisateur_id);
+CREATE INDEX film_scenaristes_scenariste_idx ON film_scenaristes (scenariste_id);
+CREATE INDEX film_pays_pays_idx ON film_pays (pays_id);
+
 CREATE TABLE reviews (
     id SERIAL PRIMARY KEY,
-    film VARCHAR(255),
+    film_id INTEGER REFERENCES films(id) ON DELETE CASCADE,
     is_negative BOOLEAN,
-    title VARCHAR(255),
-    likes FLOAT,
-    comments FLOAT,
+    -- origine du label : 'llm', 'local' (classifieur) ou 'manual' ; l'entraînement exclut 'local'
+    sentiment_source TEXT CHECK (sentiment_source IN ('llm', 'local', 'manual')),
+    likes INTEGER,
+    comments INTEGER,
     content TEXT,
     url TEXT UNIQUE,
-    embedding VECTOR(384)
+    hash_critique VARCHAR(40),
+    -- url de la critique dont celle-ci est un quasi-doublon (DEDUP_MODE=mark)
+    duplicate_of TEXT,
+    embedding VECTOR(384),
+    -- formes compactes optionnelles (EMBEDDING_STORAGE=half / binary)
+    embedding_half HALFVEC(384),
+    embedding_bin BIT(384)
+);
+
+-- Critiques d'un film (centroïdes, agrégats)
+CREATE INDEX reviews_film_id_idx ON reviews (film_id);
+
+-- Pré-filtre des critiques déjà chargées (url ou hash auteur+texte)
+CREATE INDEX reviews_hash_critique_idx ON reviews (hash_critique);
+
+-- Recherche de similarité : index ANN (HNSW, distance cosinus)
+CREATE INDEX reviews_embedding_hnsw_idx ON reviews USING hnsw (embedding vector_cosine_ops);
+CREATE INDEX reviews_embedding_half_hnsw_idx ON reviews USING hnsw (embedding_half halfvec_cosine_ops);
+CREATE INDEX reviews_embedding_bin_hnsw_idx ON reviews USING hnsw (embedding_bin bit_hamming_ops);
+
+-- Centroïde des embeddings de critiques par film, rafraîchi après chaque chargement
+CREATE TABLE film_embeddings (
+    film_id INTEGER PRIMARY KEY REFERENCES films(id) ON DELETE CASCADE,
+    embedding VECTOR(384),
+    review_count INTEGER,
+    updated_at TIMESTAMPTZ DEFAULT now()
+);
+
+CREATE INDEX film_embeddings_hnsw_idx ON film_embeddings USING hnsw (embedding vector_cosine_ops);
+
+-- Signatures MinHash des critiques chargées, pour la détection de quasi-doublons (src/dedup.py)
+CREATE TABLE review_minhash (
+    url TEXT PRIMARY KEY,
+    signature BIGINT[] NOT NULL,
+    buckets BIGINT[] NOT NULL
+);
+
+CREATE INDEX review_minhash_buckets_idx ON review_minhash USING gin (buckets);
+
+-- État de crawl incrémental (src/crawl_state.py) : dernière visite et empreinte par film
+CREATE TABLE crawl_state (
+    film_url TEXT PRIMARY KEY,
+    film VARCHAR(255),
+    fingerprint VARCHAR(40),
+    review_count INTEGER,
+    last_review_id BIGINT,
+    unchanged_streak INTEGER NOT NULL DEFAULT 0,
+    last_scraped_at TIMESTAMPTZ,
+    last_changed_at TIMESTAMPTZ,
+    next_visit_at TIMESTAMPTZ
+);
+
+CREATE INDEX crawl_state_next_visit_idx ON crawl_state (next_visit_at);
+
+-- Films découverts par semaine (reprise sans re-découverte)
+CREATE TABLE crawl_weeks (
+    week_url TEXT PRIMARY KEY,
+    films JSONB NOT NULL,
+    discovered_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- File de travaux du backfill multi-semaines (src/jobs.py, backfill.py)
+CREATE TABLE jobs (
+    id BIGSERIAL PRIMARY KEY,
+    kind TEXT NOT NULL,
+    url TEXT NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{}',
+    status TEXT NOT NULL DEFAULT 'pending',
+    priority INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 5,
+    run_after TIMESTAMPTZ NOT NULL DEFAULT now(),
+    locked_by TEXT,
+    started_at TIMESTAMPTZ,
+    heartbeat_at TIMESTAMPTZ,
+    finished_at TIMESTAMPTZ,
+    result JSONB,
+    error TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    CONSTRAINT jobs_unique UNIQUE (kind, url)
+);
+
+-- Réclamation : travaux prêts par priorité (index partiel, reste petit une fois la file vidée)
+CREATE INDEX jobs_claim_idx ON jobs (priority DESC, id) WHERE status IN ('pending', 'running');
+
+-- Rapport JSON de chaque run (compteurs, latences p50/p99 par opération, étages) : src/metrics.py
+CREATE TABLE pipeline_runs (
+    id BIGSERIAL PRIMARY KEY,
+    label TEXT,
+    status TEXT NOT NULL,
+    started_at TIMESTAMPTZ NOT NULL,
+    finished_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    duration_s DOUBLE PRECISION,
+    summary JSONB NOT NULL
+);
+
+CREATE INDEX pipeline_runs_started_idx ON pipeline_runs (started_at DESC);
+
+-- Agrégats de reporting (src/aggregates.py), rafraîchis pour les films touchés par chaque run
+CREATE TABLE film_stats (
+    film_id INTEGER PRIMARY KEY REFERENCES films(id) ON DELETE CASCADE,
+    rate FLOAT,
+    date_sortie DATE,
+    release_week DATE,
+    annee SMALLINT,
+    review_count INTEGER NOT NULL,
+    classified_count INTEGER NOT NULL,
+    negative_count INTEGER NOT NULL,
+    likes_sum BIGINT NOT NULL,
+    comments_sum BIGINT NOT NULL,
+    negative_share DOUBLE PRECISION,
+    avg_likes DOUBLE PRECISION,
+    avg_comments DOUBLE PRECISION,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX film_stats_release_week_idx ON film_stats (release_week);
+
+-- Rollups par genre / réalisateur / pays (dimension = 'genre' | 'realisateur' | 'pays', value_id = id dans la table de référence)
+CREATE TABLE dimension_stats (
+    dimension TEXT NOT NULL,
+    value_id INTEGER NOT NULL,
+    value VARCHAR(255) NOT NULL,
+    film_count INTEGER NOT NULL,
+    review_count BIGINT NOT NULL,
+    classified_count BIGINT NOT NULL,
+    negative_count BIGINT NOT NULL,
+    negative_share DOUBLE PRECISION,
+    avg_likes DOUBLE PRECISION,
+    avg_comments DOUBLE PRECISION,
+    avg_rate DOUBLE PRECISION,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (dimension, value_id)
+);
+
+CREATE INDEX dimension_stats_top_idx ON dimension_stats (dimension, review_count DESC);
+
+-- Tendances par semaine de sortie (lundi de la semaine de date_sortie)
+CREATE TABLE weekly_stats (
+    week DATE PRIMARY KEY,
+    film_count INTEGER NOT NULL,
+    review_count BIGINT NOT NULL,
+    classified_count BIGINT NOT NULL,
+    negative_count BIGINT NOT NULL,
+    negative_share DOUBLE PRECISION,
+    avg_likes DOUBLE PRECISION,
+    avg_comments DOUBLE PRECISION,
+    avg_rate DOUBLE PRECISION,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
 );
@@ -0,0 +1,155 @@
+"""
+Agrégats de reporting matérialisés (tables film_stats, dimension_stats, weekly_stats).
+
+Le rapport PowerBI lit ces lignes pré-agrégées au lieu de parcourir `reviews`.
+Le pipeline ne recalcule que les films touchés par le run, puis les genres /
+réalisateurs / pays et les semaines de sortie de ces films, à partir de
+film_stats (quelques lignes par film) : le coût ne dépend pas du volume total.
+
+    python -m src.aggregates rebuild   # reconstruction complète (après la migration 008)
+"""
+import sys
+from typing import Iterable
+
+from src.load import DIMENSIONS
+from src.metrics import timed
+
+# Dimensions agrégées (clés de load.DIMENSIONS) -> valeur de dimension_stats.dimension
+ROLLUPS = {"genres": "genre", "realisateurs": "realisateur", "pays": "pays"}
+
+# Les quasi-doublons marqués (duplicate_of) ne comptent pas dans les statistiques.
+_FILM_STATS = """
+    INSERT INTO film_stats (
+        film_id, rate, date_sortie, release_week, annee,
+        review_count, classified_count, negative_count, likes_sum, comments_sum,
+        negative_share, avg_likes, avg_comments, updated_at
+    )
+    SELECT f.id, f.rate, f.date_sortie, date_trunc('week', f.date_sortie::timestamp)::date, f.annee,
+           COUNT(r.id), COUNT(r.is_negative), COUNT(*) FILTER (WHERE r.is_negative),
+           COALESCE(SUM(r.likes), 0), COALESCE(SUM(r.comments), 0),
+           COUNT(*) FILTER (WHERE r.is_negative)::float / NULLIF(COUNT(r.is_negative), 0),
+           AVG(r.likes), AVG(r.comments), now()
+    FROM films f
+    LEFT JOIN reviews r ON r.film_id = f.id AND r.duplicate_of IS NULL
+    WHERE {where}
+    GROUP BY f.id
+    ON CONFLICT (film_id) DO UPDATE SET
+        rate = EXCLUDED.rate,
+        date_sortie = EXCLUDED.date_sortie,
+        release_week = EXCLUDED.release_week,
+        annee = EXCLUDED.annee,
+        review_count = EXCLUDED.review_count,
+        classified_count = EXCLUDED.classified_count,
+        negative_count = EXCLUDED.negative_count,
+        likes_sum = EXCLUDED.likes_sum,
+        comments_sum = EXCLUDED.comments_sum,
+        negative_share = EXCLUDED.negative_share,
+        avg_likes = EXCLUDED.avg_likes,
+        avg_comments = EXCLUDED.avg_comments,
+        updated_at = EXCLUDED.updated_at
+"""
+
+# Colonnes communes aux rollups, calculées à partir de film_stats (alias s)
+_ROLLUP_COLUMNS = "film_count, review_count, classified_count, negative_count, negative_share, avg_likes, avg_comments, avg_rate, updated_at"
+_ROLLUP_SELECT = """
+    COUNT(*), SUM(s.review_count), SUM(s.classified_count), SUM(s.negative_count),
+    SUM(s.negative_count)::float / NULLIF(SUM(s.classified_count), 0),
+    SUM(s.likes_sum) / NULLIF(SUM(s.review_count), 0),
+    SUM(s.comments_sum) / NULLIF(SUM(s.review_count), 0),
+    AVG(s.rate), now()
+"""
+_ROLLUP_UPDATE = ", ".join(f"{c} = EXCLUDED.{c}" for c in _ROLLUP_COLUMNS.split(", "))
+
+_DIMENSION_STATS = """
+    INSERT INTO dimension_stats (dimension, value_id, value, {columns})
+    SELECT %(dimension)s, d.id, d.{column}, {select}
+    FROM {table} d
+    JOIN {bridge} b ON b.{fk} = d.id
+    JOIN film_stats s ON s.film_id = b.film_id
+    WHERE {where}
+    GROUP BY d.id, d.{column}
+    ON CONFLICT (dimension, value_id) DO UPDATE SET value = EXCLUDED.value, {update}
+"""
+
+_WEEKLY_STATS = """
+    INSERT INTO weekly_stats (week, {columns})
+    SELECT s.release_week, {select}
+    FROM film_stats s
+    WHERE s.release_week IS NOT NULL AND {where}
+    GROUP BY s.release_week
+    ON CONFLICT (week) DO UPDATE SET {update}
+"""
+
+
+def _release_weeks(cur, urls: list[str]) -> set:
+    cur.execute("""
+        SELECT DISTINCT s.release_week
+        FROM film_stats s JOIN films f ON f.id = s.film_id
+        WHERE f.url = ANY(%s) AND s.release_week IS NOT NULL
+    """, (urls,))
+    return {r[0] for r in cur.fetchall()}
+
+
+def refresh_aggregates(conn, film_urls: Iterable[str] | None) -> dict:
+    """
+    Met à jour les agrégats pour les films `film_urls` (None : reconstruction complète).
+    Une transaction : le rapport voit l'état avant ou après, jamais un mélange.
+    Retourne le nombre de lignes écrites par table.
+    """
+    full = film_urls is None
+    urls = [] if full else sorted({u for u in film_urls if u})
+    stats = {"film_stats": 0, "dimension_stats": 0, "weekly_stats": 0}
+    if not full and not urls:
+        return stats
+    columns = {"columns": _ROLLUP_COLUMNS, "select": _ROLLUP_SELECT, "update": _ROLLUP_UPDATE}
+    with timed("db_write", target="aggregates"), conn.transaction(), conn.cursor() as cur:
+        if full:
+            cur.execute("TRUNCATE film_stats, dimension_stats, weekly_stats")
+        # Semaines de sortie avant mise à jour (une date de sortie corrigée quitte son ancienne semaine)
+        weeks = set() if full else _release_weeks(cur, urls)
+
+        cur.execute(_FILM_STATS.format(where="TRUE" if full else "f.url = ANY(%(urls)s)"), {"urls": urls})
+        stats["film_stats"] = cur.rowcount
+
+        for key, dimension in ROLLUPS.items():
+            table, column, bridge, fk = DIMENSIONS[key]
+            where = "TRUE" if full else f"""d.id IN (
+                SELECT t.{fk} FROM {bridge} t JOIN films f ON f.id = t.film_id WHERE f.url = ANY(%(urls)s)
+            )"""
+            cur.execute(
+                _DIMENSION_STATS.format(table=table, column=column, bridge=bridge, fk=fk, where=where, **columns),
+                {"dimension": dimension, "urls": urls},
+            )
+            stats["dimension_stats"] += cur.rowcount
+
+        if not full:
+            weeks |= _release_weeks(cur, urls)
+            if not weeks:
+                return stats
+        cur.execute(
+            _WEEKLY_STATS.format(where="TRUE" if full else "s.release_week = ANY(%(weeks)s)", **columns),
+            {"weeks": sorted(weeks)},
+        )
+        stats["weekly_stats"] = cur.rowcount
+        if weeks:
+            # Semaines vidées (tous leurs films ont changé de date de sortie)
+            cur.execute("""
+                DELETE FROM weekly_stats w
+                WHERE w.week = ANY(%s) AND NOT EXISTS (SELECT 1 FROM film_stats s WHERE s.release_week = w.week)
+            """, (sorted(weeks),))
+    return stats
+
+
+if __name__ == "__main__":
+    # python -m src.aggregates rebuild
+    if sys.argv[1:] != ["rebuild"]:
+        print("usage: python -m src.aggregates rebuild")
+        sys.exit(1)
+    from src.load import get_conn
+
+    conn = get_conn()
+    try:
+        stats = refresh_aggregates(conn, None)
+    finally:
+        conn.close()
+    print(f"✅ Agrégats reconstruits: {stats}")
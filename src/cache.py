@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+
+
+def text_hash(texte: str) -> str:
+    """
+    Empreinte sha1 d'un texte (même algorithme que hash_critique dans extract).
+    """
+    return hashlib.sha1((texte or "").encode()).hexdigest()
+
+
+class InferenceCache:
+    """
+    Cache persistant (SQLite) des résultats d'inférence, adressé par contenu :
+    clé = (type de résultat, modèle, sha1 du texte).
+    Éviction LRU quand le nombre d'entrées dépasse max_entries.
+    """
+
+    def __init__(self, path: str, max_entries: int = 200_000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._tick = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS inference_cache (
+                kind TEXT NOT NULL,
+                model TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                value TEXT NOT NULL,
+                last_used INTEGER NOT NULL,
+                PRIMARY KEY (kind, model, hash)
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS inference_cache_lru ON inference_cache (last_used)")
+        row = self._db.execute("SELECT COALESCE(MAX(last_used), 0) FROM inference_cache").fetchone()
+        self._tick = row[0]
+        self._db.commit()
+
+    def get_many(self, kind: str, model: str, hashes: list[str]) -> dict:
+        """
+        Retourne {hash: valeur} pour les hashes présents et rafraîchit leur rang LRU.
+        """
+        found = {}
+        if not hashes:
+            return found
+        with self._lock:
+            uniq = list(dict.fromkeys(hashes))
+            for i in range(0, len(uniq), 500):
+                chunk = uniq[i:i + 500]
+                marks = ",".join("?" * len(chunk))
+                for h, value in self._db.execute(
+                    f"SELECT hash, value FROM inference_cache WHERE kind = ? AND model = ? AND hash IN ({marks})",
+                    (kind, model, *chunk),
+                ):
+                    found[h] = json.loads(value)
+            if found:
+                self._tick += 1
+                self._db.executemany(
+                    "UPDATE inference_cache SET last_used = ? WHERE kind = ? AND model = ? AND hash = ?",
+                    [(self._tick, kind, model, h) for h in found],
+                )
+                self._db.commit()
+            self.hits += sum(1 for h in hashes if h in found)
+            self.misses += sum(1 for h in hashes if h not in found)
+        return found
+
+    def get(self, kind: str, model: str, h: str):
+        return self.get_many(kind, model, [h]).get(h)
+
+    def put_many(self, kind: str, model: str, items: dict):
+        """
+        Enregistre {hash: valeur} (valeurs None ignorées) puis applique l'éviction LRU.
+        """
+        items = {h: v for h, v in items.items() if v is not None}
+        if not items:
+            return
+        with self._lock:
+            self._tick += 1
+            self._db.executemany(
+                "INSERT OR REPLACE INTO inference_cache (kind, model, hash, value, last_used) VALUES (?, ?, ?, ?, ?)",
+                [(kind, model, h, json.dumps(v), self._tick) for h, v in items.items()],
+            )
+            self._evict()
+            self._db.commit()
+
+    def put(self, kind: str, model: str, h: str, value):
+        self.put_many(kind, model, {h: value})
+
+    def _evict(self):
+        count = self._db.execute("SELECT COUNT(*) FROM inference_cache").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM inference_cache WHERE rowid IN "
+                "(SELECT rowid FROM inference_cache ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_cache: InferenceCache | None = None
+
+
+def get_cache() -> InferenceCache | None:
+    """
+    Cache partagé configuré par INFERENCE_CACHE_PATH / INFERENCE_CACHE_MAX.
+    INFERENCE_CACHE_PATH vide désactive le cache.
+    """
+    global _cache
+    path = os.getenv("INFERENCE_CACHE_PATH", ".cache/inference.sqlite")
+    if not path:
+        return None
+    if _cache is None or _cache.path != path:
+        _cache = InferenceCache(path, int(os.getenv("INFERENCE_CACHE_MAX", "200000")))
+    return _cache
@@ -0,0 +1,209 @@
+import glob
+import json
+import os
+import re
+import sys
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Dossier des artefacts versionnés (sentiment_linear_v<N>.npz)
+MODELS_DIR = os.getenv("SENTIMENT_CLASSIFIER_DIR", "models")
+MIN_CONFIDENCE = float(os.getenv("SENTIMENT_MIN_CONFIDENCE", "0.8"))
+ARTIFACT_PREFIX = "sentiment_linear_v"
+
+
+def parse_vector(value) -> np.ndarray:
+    """
+    Vecteur pgvector lu en texte ('[x,y,...]') ou déjà en liste.
+    """
+    if isinstance(value, str):
+        return np.array(value.strip("[]").split(","), dtype=np.float32)
+    return np.asarray(value, dtype=np.float32)
+
+
+def _sigmoid(z: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30)))
+
+
+class LinearSentimentClassifier:
+    """
+    Régression logistique sur les embeddings MiniLM (384-d) : P(critique négative).
+    Entraînée sur les labels is_negative du LLM ou manuels ; prédiction vectorisée
+    sur toute la matrice d'embeddings d'un batch.
+
+    Modèle binaire : il ne prédit jamais 'neutre' (les critiques neutres sont en base
+    avec is_negative NULL, donc absentes de l'entraînement). Une critique neutre tombe
+    près de la frontière (P ~ 0.5), sous la bande de confiance : classify_sentiments
+    l'envoie au LLM, seul à produire 'neutre'.
+    """
+
+    def __init__(self, weights: np.ndarray, bias: float, version: int = 0, meta: dict | None = None):
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = float(bias)
+        self.version = version
+        self.meta = meta or {}
+
+    @classmethod
+    def fit(cls, X: np.ndarray, y: np.ndarray, l2: float = 1e-3, lr: float = 0.5, epochs: int = 500):
+        """
+        Descente de gradient pleine (batch) avec pondération des classes.
+        """
+        X = np.asarray(X, dtype=np.float32)
+        y = np.asarray(y, dtype=np.float32)
+        n, d = X.shape
+        pos = max(y.sum(), 1.0)
+        neg = max(n - y.sum(), 1.0)
+        sample_w = np.where(y == 1, n / (2 * pos), n / (2 * neg)).astype(np.float32)
+        w = np.zeros(d, dtype=np.float32)
+        b = 0.0
+        for _ in range(epochs):
+            p = _sigmoid(X @ w + b)
+            err = (p - y) * sample_w
+            w -= lr * ((X.T @ err) / n + l2 * w)
+            b -= lr * float(err.mean())
+        return cls(w, b)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """
+        P(négatif) pour chaque ligne de X.
+        """
+        return _sigmoid(np.asarray(X, dtype=np.float32) @ self.weights + self.bias)
+
+    def predict(self, X: np.ndarray, min_confidence: float = MIN_CONFIDENCE) -> tuple[list[str], np.ndarray]:
+        """
+        Labels 'negatif'/'positif' et masque des prédictions sûres (confiance >= min_confidence).
+        Les prédictions hors bande (dont les critiques probablement neutres) sont à
+        confier au LLM ; leur label binaire n'est qu'un repli.
+        """
+        p = self.predict_proba(X)
+        labels = ["negatif" if pi >= 0.5 else "positif" for pi in p]
+        confident = np.maximum(p, 1 - p) >= min_confidence
+        return labels, confident
+
+    def save(self, models_dir: str = MODELS_DIR) -> str:
+        """
+        Enregistre l'artefact sous la prochaine version libre ; retourne son chemin.
+        """
+        os.makedirs(models_dir, exist_ok=True)
+        self.version = (latest_version(models_dir) or 0) + 1
+        path = os.path.join(models_dir, f"{ARTIFACT_PREFIX}{self.version}.npz")
+        np.savez(
+            path,
+            weights=self.weights,
+            bias=np.float32(self.bias),
+            version=np.int32(self.version),
+            meta=np.array(json.dumps(self.meta)),
+        )
+        return path
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as data:
+            return cls(
+                data["weights"],
+                float(data["bias"]),
+                int(data["version"]),
+                json.loads(str(data["meta"])),
+            )
+
+
+def latest_version(models_dir: str = MODELS_DIR) -> int | None:
+    versions = []
+    for path in glob.glob(os.path.join(models_dir, f"{ARTIFACT_PREFIX}*.npz")):
+        m = re.search(rf"{ARTIFACT_PREFIX}(\d+)\.npz$", path)
+        if m:
+            versions.append(int(m.group(1)))
+    return max(versions) if versions else None
+
+
+_classifier: LinearSentimentClassifier | None = None
+_loaded = False
+
+
+def get_classifier(models_dir: str = MODELS_DIR) -> LinearSentimentClassifier | None:
+    """
+    Dernière version de l'artefact (chargée une fois), ou None si aucun modèle entraîné.
+    """
+    global _classifier, _loaded
+    if not _loaded:
+        _loaded = True
+        version = latest_version(models_dir)
+        if version is not None:
+            _classifier = LinearSentimentClassifier.load(
+                os.path.join(models_dir, f"{ARTIFACT_PREFIX}{version}.npz")
+            )
+    return _classifier
+
+
+def load_training_data(conn) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Embeddings et labels is_negative des critiques classées par le LLM ou à la main
+    (sentiment_source 'llm' / 'manual') : les prédictions du classifieur lui-même
+    ('local') et les labels d'origine inconnue (avant la migration 011) sont exclus.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT COALESCE(embedding, embedding_half::vector)::text, is_negative
+            FROM reviews
+            WHERE (embedding IS NOT NULL OR embedding_half IS NOT NULL) AND is_negative IS NOT NULL
+              AND sentiment_source IN ('llm', 'manual')
+        """)
+        rows = cur.fetchall()
+    if not rows:
+        return np.empty((0, 0), dtype=np.float32), np.empty(0, dtype=np.float32)
+    X = np.stack([parse_vector(e) for e, _ in rows])
+    y = np.array([1.0 if neg else 0.0 for _, neg in rows], dtype=np.float32)
+    return X, y
+
+
+def train_from_db(conn, holdout: float = 0.2, seed: int = 0, models_dir: str = MODELS_DIR) -> tuple[str, dict]:
+    """
+    Entraîne sur les critiques labellisées, évalue sur un holdout, puis réentraîne
+    sur tout le jeu et enregistre l'artefact. Retourne (chemin, métriques).
+    """
+    X, y = load_training_data(conn)
+    if len(y) < 20 or y.min() == y.max():
+        raise ValueError(f"Pas assez de critiques labellisées par le LLM ou à la main (n={len(y)}) ou une seule classe.")
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(y))
+    n_test = max(1, int(len(y) * holdout))
+    test, train = order[:n_test], order[n_test:]
+
+    clf = LinearSentimentClassifier.fit(X[train], y[train])
+    p = clf.predict_proba(X[test])
+    _, confident = clf.predict(X[test])
+    pred = (p >= 0.5).astype(np.float32)
+    metrics = {
+        "n_train": int(len(train)),
+        "n_test": int(n_test),
+        "accuracy": float((pred == y[test]).mean()),
+        "coverage": float(confident.mean()),
+        "accuracy_confident": float((pred[confident] == y[test][confident]).mean()) if confident.any() else None,
+        "min_confidence": MIN_CONFIDENCE,
+    }
+
+    final = LinearSentimentClassifier.fit(X, y)
+    final.meta = {
+        **metrics,
+        "n_samples": int(len(y)),
+        "embedding_model": os.getenv("EMBED_MODEL_ID", "sentence-transformers/all-MiniLM-L6-v2"),
+        "trained_at": datetime.now(timezone.utc).isoformat(),
+    }
+    return final.save(models_dir), metrics
+
+
+if __name__ == "__main__":
+    # python -m src.classifier train
+    if sys.argv[1:] != ["train"]:
+        print("usage: python -m src.classifier train")
+        sys.exit(1)
+    from src.load import get_conn
+
+    conn = get_conn()
+    try:
+        path, metrics = train_from_db(conn)
+    finally:
+        conn.close()
+    print(f"✅ Modèle enregistré: {path}")
+    print(f"📊 {metrics}")
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Iterable
+
+from psycopg.rows import dict_row
+
+# Revisite décroissante : un film inchangé est revu après BASE * 2^streak heures (plafonné)
+REVISIT_BASE_HOURS = float(os.getenv("CRAWL_REVISIT_BASE_HOURS", "24"))
+REVISIT_MAX_DAYS = float(os.getenv("CRAWL_REVISIT_MAX_DAYS", "60"))
+# Liste de films d'une semaine réutilisée pendant ce délai (reprise après crash sans re-découverte)
+WEEK_TTL_HOURS = float(os.getenv("CRAWL_WEEK_TTL_HOURS", "24"))
+
+_REVIEW_ID = re.compile(r"/critique/(\d+)")
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def review_id(url: str | None) -> int | None:
+    m = _REVIEW_ID.search(url or "")
+    return int(m.group(1)) if m else None
+
+
+def reviews_fingerprint(rows: Iterable[dict], total: int | None = None) -> str:
+    """
+    Empreinte du contenu utile de la première page /critiques : critiques (url,
+    hash, likes, commentaires), nombre total annoncé par la pagination et
+    métadonnées film. Le reste du __NEXT_DATA__ (buildId, état de session...)
+    change à chaque déploiement du site et est ignoré.
+    """
+    rows = list(rows)
+    items = sorted(
+        (r.get("url") or "", r.get("hash_critique") or "", r.get("likes"), r.get("comments"), r.get("note"))
+        for r in rows
+    )
+    film = {}
+    for r in rows:
+        film = {k: r.get(k) for k in ("rate", "date_sortie", "image", "annee", "duree")}
+        break
+    payload = json.dumps({"items": items, "total": total, "film": film}, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def next_visit(unchanged_streak: int, now: datetime | None = None) -> datetime:
+    hours = min(REVISIT_BASE_HOURS * (2 ** unchanged_streak), REVISIT_MAX_DAYS * 24)
+    return (now or _now()) + timedelta(hours=hours)
+
+
+def load_states(conn, film_urls: Iterable[str]) -> dict[str, dict]:
+    """
+    État de crawl des films demandés, en une requête : {film_url: ligne crawl_state}.
+    """
+    urls = sorted({u for u in film_urls if u})
+    if not urls:
+        return {}
+    with conn.cursor(row_factory=dict_row) as cur:
+        cur.execute("SELECT * FROM crawl_state WHERE film_url = ANY(%s)", (urls,))
+        return {r["film_url"]: r for r in cur.fetchall()}
+
+
+def is_due(state: dict | None, now: datetime | None = None) -> bool:
+    return state is None or state["next_visit_at"] is None or state["next_visit_at"] <= (now or _now())
+
+
+def due_films(conn, limit: int, exclude: Iterable[str] = ()) -> list[dict]:
+    """
+    Films déjà connus dont la revisite est échue (les plus en retard d'abord).
+    """
+    if limit <= 0:
+        return []
+    with conn.cursor(row_factory=dict_row) as cur:
+        cur.execute("""
+            SELECT film_url AS url, film AS titre
+            FROM crawl_state
+            WHERE next_visit_at <= now() AND NOT (film_url = ANY(%s))
+            ORDER BY next_visit_at
+            LIMIT %s
+        """, (sorted(set(exclude)), limit))
+        return cur.fetchall()
+
+
+def cached_week(conn, week_url: str, ttl_hours: float = WEEK_TTL_HOURS) -> list[dict] | None:
+    """
+    Films d'une semaine découverts il y a moins de `ttl_hours`, sinon None.
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT films FROM crawl_weeks WHERE week_url = %s AND discovered_at > now() - make_interval(secs => %s)",
+            (week_url, ttl_hours * 3600),
+        )
+        row = cur.fetchone()
+    return row[0] if row else None
+
+
+def save_week(conn, week_url: str, films: list[dict]):
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO crawl_weeks (week_url, films, discovered_at)
+            VALUES (%s, %s::jsonb, now())
+            ON CONFLICT (week_url) DO UPDATE SET films = EXCLUDED.films, discovered_at = EXCLUDED.discovered_at
+        """, (week_url, json.dumps(films)))
+
+
+class CrawlTracker:
+    """
+    Point de reprise par film : l'état (empreinte, nombre de critiques, prochaine
+    visite) n'est écrit dans crawl_state qu'une fois toutes les critiques du film
+    sorties du pipeline (chargées, déjà en base ou écartées). Après un crash, les
+    films non soldés sont donc simplement re-scrapés au run suivant.
+    Thread-safe : appelé depuis les différents étages.
+    """
+
+    def __init__(self, conn, states: dict[str, dict] | None = None):
+        self.conn = conn
+        self.states = states or {}
+        self._pending: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def unchanged(self, film_url: str, fingerprint: str) -> bool:
+        previous = self.states.get(film_url)
+        return previous is not None and previous["fingerprint"] == fingerprint
+
+    def check(self, film: dict, rows: list[dict], fingerprint: str | None = None) -> bool:
+        """
+        Enregistre la visite d'un film. Retourne False si la page n'a pas changé
+        depuis la dernière visite (les critiques ne sont alors pas retraitées).
+        `fingerprint` : empreinte de la première page, si `rows` couvre plusieurs pages.
+        """
+        url = film["url"]
+        fingerprint = fingerprint or reviews_fingerprint(rows)
+        previous = self.states.get(url)
+        ids = [i for i in (review_id(r.get("url")) for r in rows) if i is not None]
+        changed = previous is None or previous["fingerprint"] != fingerprint
+        streak = 0 if changed else (previous["unchanged_streak"] or 0) + 1
+        state = {
+            "film_url": url,
+            "film": film.get("titre") or film.get("title"),
+            "fingerprint": fingerprint,
+            "review_count": len({r.get("url") for r in rows}),
+            "last_review_id": max(ids) if ids else None,
+            "unchanged_streak": streak,
+            "changed": changed,
+        }
+        if not changed or not rows:
+            self._save(state)
+            return changed
+        with self._lock:
+            self._pending[url] = {"state": state, "remaining": len(rows)}
+        return True
+
+    def settle(self, rows: Iterable[dict]):
+        """
+        Décompte des critiques sorties du pipeline ; écrit l'état des films soldés.
+        """
+        counts: dict[str, int] = {}
+        for r in rows:
+            counts[r.get("film_url")] = counts.get(r.get("film_url"), 0) + 1
+        done = []
+        with self._lock:
+            for url, n in counts.items():
+                entry = self._pending.get(url)
+                if entry is None:
+                    continue
+                entry["remaining"] -= n
+                if entry["remaining"] <= 0:
+                    done.append(self._pending.pop(url)["state"])
+        for state in done:
+            self._save(state)
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def pending_urls(self) -> set[str]:
+        with self._lock:
+            return set(self._pending)
+
+    def _save(self, state: dict):
+        now = _now()
+        params = {**state, "next_visit_at": next_visit(state["unchanged_streak"], now), "now": now}
+        with self._lock, self.conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO crawl_state (
+                    film_url, film, fingerprint, review_count, last_review_id,
+                    unchanged_streak, last_scraped_at, last_changed_at, next_visit_at
+                )
+                VALUES (
+                    %(film_url)s, %(film)s, %(fingerprint)s, %(review_count)s, %(last_review_id)s,
+                    %(unchanged_streak)s, %(now)s, %(now)s, %(next_visit_at)s
+                )
+                ON CONFLICT (film_url) DO UPDATE SET
+                    film = COALESCE(EXCLUDED.film, crawl_state.film),
+                    fingerprint = EXCLUDED.fingerprint,
+                    review_count = EXCLUDED.review_count,
+                    last_review_id = GREATEST(EXCLUDED.last_review_id, crawl_state.last_review_id),
+                    unchanged_streak = EXCLUDED.unchanged_streak,
+                    last_scraped_at = EXCLUDED.last_scraped_at,
+                    last_changed_at = CASE WHEN %(changed)s THEN EXCLUDED.last_changed_at
+                                           ELSE crawl_state.last_changed_at END,
+                    next_visit_at = EXCLUDED.next_visit_at
+            """, params)
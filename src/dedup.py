@@ -0,0 +1,205 @@
+import hashlib
+import os
+import re
+import unicodedata
+import zlib
+
+import numpy as np
+
+from src.metrics import timed
+
+# MinHash : NUM_PERM permutations, découpées en BANDS bandes pour le LSH.
+# Avec 16 bandes de 4 lignes, deux textes de Jaccard 0.8 partagent une bande
+# dans ~99.9% des cas, à 0.5 dans ~65% (confirmés ensuite par le seuil).
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE = 3  # n-grammes de mots
+THRESHOLD = 0.8  # Jaccard estimé minimal pour déclarer un quasi-doublon
+# Critiques trop courtes (moins de N shingles, ~N+2 mots) : jamais candidates, deux avis brefs
+# de lecteurs différents ("Excellent film !") se ressemblent sans être des reprises
+MIN_SHINGLES = int(os.getenv("DEDUP_MIN_SHINGLES", "8"))
+_MERSENNE = (1 << 61) - 1
+
+_rng = np.random.default_rng(20240101)  # graine fixe : signatures stables entre runs
+_A = _rng.integers(1, 1 << 31, size=NUM_PERM, dtype=np.int64)
+_B = _rng.integers(0, 1 << 31, size=NUM_PERM, dtype=np.int64)
+
+
+def normalize(texte: str) -> str:
+    """
+    Minuscules, accents retirés, ponctuation -> espaces, espaces compactés.
+    """
+    texte = unicodedata.normalize("NFKD", (texte or "").lower())
+    texte = "".join(c for c in texte if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^\w]+", " ", texte).split())
+
+
+def shingles(texte: str, n: int = SHINGLE) -> set[str]:
+    words = normalize(texte).split()
+    if len(words) <= n:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+
+def minhash(texte: str, sh: set[str] | None = None) -> np.ndarray:
+    """
+    Signature MinHash (NUM_PERM entiers) des shingles du texte normalisé.
+    """
+    sh = shingles(texte) if sh is None else sh
+    if not sh:
+        return np.full(NUM_PERM, _MERSENNE, dtype=np.int64)
+    x = np.fromiter((zlib.crc32(s.encode()) for s in sh), dtype=np.int64, count=len(sh))
+    # (a * x + b) mod p pour chaque permutation, puis minimum sur les shingles
+    return ((np.outer(x, _A) + _B) % _MERSENNE).min(axis=0)
+
+
+def dedup_scope(row: dict) -> str | None:
+    """
+    Périmètre de comparaison : même film et même auteur (une reprise retouchée par
+    son auteur). None si l'un des deux manque : la critique n'est jamais candidate.
+    """
+    if not row.get("film_url") or not row.get("auteur"):
+        return None
+    return f"{row['film_url']}\0{row['auteur']}"
+
+
+def lsh_buckets(signature: np.ndarray, scope: str) -> list[int]:
+    """
+    Une clé BIGINT par bande ; le périmètre et le numéro de bande sont inclus dans
+    le hash, donc seules les critiques du même film et du même auteur se rencontrent.
+    Texte vide : aucun bucket (jamais considéré comme doublon).
+    """
+    if (signature == _MERSENNE).all():
+        return []
+    prefix = scope.encode("utf-8", "replace") + b"\0"
+    buckets = []
+    for b in range(BANDS):
+        band = signature[b * ROWS:(b + 1) * ROWS].tobytes()
+        digest = hashlib.blake2b(prefix + bytes([b]) + band, digest_size=8).digest()
+        buckets.append(int.from_bytes(digest, "big", signed=True))
+    return buckets
+
+
+def signature(row: dict) -> tuple[np.ndarray, list[int]]:
+    """
+    (minhash, buckets LSH) d'une critique. Pas de buckets, donc jamais doublon ni
+    référence, pour les textes de moins de MIN_SHINGLES shingles ou sans auteur / film.
+    """
+    sh = shingles(row.get("texte") or "")
+    sig = minhash(row.get("texte") or "", sh)
+    scope = dedup_scope(row)
+    if scope is None or len(sh) < MIN_SHINGLES:
+        return sig, []
+    return sig, lsh_buckets(sig, scope)
+
+
+def similarity(sig_a, sig_b) -> float:
+    """
+    Jaccard estimé : part des composantes MinHash égales.
+    """
+    return float(np.mean(np.asarray(sig_a) == np.asarray(sig_b)))
+
+
+class NearDuplicateIndex:
+    """
+    Index LSH en mémoire (bucket -> critiques) pour les critiques vues pendant le run.
+    """
+
+    def __init__(self, threshold: float = THRESHOLD):
+        self.threshold = threshold
+        self._buckets: dict[int, list[str]] = {}
+        self._signatures: dict[str, np.ndarray] = {}
+
+    def add(self, url: str, signature: np.ndarray, buckets: list[int]):
+        self._signatures[url] = signature
+        for bucket in buckets:
+            self._buckets.setdefault(bucket, []).append(url)
+
+    def query(self, signature: np.ndarray, buckets: list[int]) -> str | None:
+        seen = set()
+        for bucket in buckets:
+            for url in self._buckets.get(bucket, ()):
+                if url in seen:
+                    continue
+                seen.add(url)
+                if similarity(signature, self._signatures[url]) >= self.threshold:
+                    return url
+        return None
+
+
+def find_known_duplicates(conn, rows: list[dict], threshold: float = THRESHOLD) -> dict[str, str]:
+    """
+    Cherche, en une requête, les critiques déjà chargées proches de celles du batch
+    (chevauchement de buckets LSH dans review_minhash, puis seuil de Jaccard estimé).
+    Retourne {url de la critique du batch: url de la critique déjà en base}.
+    """
+    all_buckets = sorted({b for r in rows for b in r["lsh_buckets"]})
+    if not all_buckets:
+        return {}
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT url, signature, buckets FROM review_minhash WHERE buckets && %s::bigint[]",
+            (all_buckets,),
+        )
+        known = NearDuplicateIndex(threshold)
+        for url, signature, buckets in cur.fetchall():
+            known.add(url, np.array(signature, dtype=np.int64), buckets)
+    found = {}
+    for r in rows:
+        match = known.query(r["minhash"], r["lsh_buckets"])
+        if match and match != r["url"]:
+            found[r["url"]] = match
+    return found
+
+
+def mark_near_duplicates(
+    conn,
+    rows: list[dict],
+    run_index: NearDuplicateIndex,
+    threshold: float = THRESHOLD,
+) -> int:
+    """
+    Calcule signature + buckets de chaque critique et renseigne row["duplicate_of"]
+    si elle est proche d'une critique du même film et du même auteur, déjà en base
+    ou déjà vue pendant le run.
+    Retourne le nombre de quasi-doublons trouvés.
+    """
+    for r in rows:
+        r["minhash"], r["lsh_buckets"] = signature(r)
+    known = find_known_duplicates(conn, rows, threshold) if conn is not None else {}
+    count = 0
+    for r in rows:
+        if not r["lsh_buckets"]:
+            continue
+        match = known.get(r["url"]) or run_index.query(r["minhash"], r["lsh_buckets"])
+        if match:
+            r["duplicate_of"] = match
+            count += 1
+        else:
+            run_index.add(r["url"], r["minhash"], r["lsh_buckets"])
+    return count
+
+
+def register_signatures(conn, rows: list[dict]) -> int:
+    """
+    Ajoute à review_minhash les signatures des critiques chargées (hors doublons et
+    critiques sans buckets, qui ne peuvent servir de référence).
+    """
+    params = [
+        (r["url"], r["minhash"].tolist(), r["lsh_buckets"])
+        for r in rows
+        if r.get("minhash") is not None and r.get("lsh_buckets") and not r.get("duplicate_of")
+    ]
+    if not params:
+        return 0
+    with timed("db_write", target="signatures"), conn.cursor() as cur:
+        cur.executemany(
+            """
+            INSERT INTO review_minhash (url, signature, buckets)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (url) DO NOTHING
+            """,
+            params,
+        )
+    return len(params)
@@ -1,22 +1,48 @@
 from selenium import webdriver
+from selenium.common.exceptions import TimeoutException, WebDriverException
 from selenium.webdriver.chrome.options import Options
-import time, hashlib, json
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+import time, hashlib
 from bs4 import BeautifulSoup
+import os
+import queue
 import re
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from src import next_data
+from src.metrics import inc, timed
+
+BASE_URL = next_data.BASE_URL
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
+# Attente max (s) du contenu utile d'une page chargée par Selenium
+PAGE_TIMEOUT = float(os.getenv("SELENIUM_PAGE_TIMEOUT", "10"))
+WEEK_READY_CSS = "a[href*='/film/']"
+REVIEWS_READY_CSS = "script#__NEXT_DATA__, [data-testid='review-card'], .e-critique, .p-critic, article"
+# Pagination des critiques : paramètre de page, pages chargées en parallèle par film, plafond (0 = toutes)
+REVIEWS_PAGE_PARAM = os.getenv("REVIEWS_PAGE_PARAM", "page")
+REVIEW_PAGE_CONCURRENCY = int(os.getenv("REVIEW_PAGE_CONCURRENCY", "2"))
+REVIEW_MAX_PAGES = int(os.getenv("REVIEW_MAX_PAGES", "0"))
 
 def make_driver(remote_url:str):
     opts = Options()
     opts.add_argument("--headless=new")
     opts.add_argument("--disable-gpu")
     opts.add_argument("--no-sandbox")
-    opts.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64)")
+    opts.add_argument(f"user-agent={USER_AGENT}")
     return webdriver.Remote(command_executor=remote_url, options=opts)
 
-def weekly_releases(driver, week_url:str) -> list[dict]:
-    driver.get(week_url)
-    time.sleep(2.5)  # throttle
-    soup = BeautifulSoup(driver.page_source, "html.parser")
+def parse_weekly_releases(html: str) -> list[dict]:
+    """
+    Liste des films (titre, url) d'une page de sorties de la semaine.
+    """
+    soup = BeautifulSoup(html, "html.parser")
     films = []
     # Sélecteurs élargis : certaines pages listent les films via d'autres classes.
     anchors = soup.select(
@@ -28,7 +54,7 @@ def weekly_releases(driver, week_url:str) -> list[dict]:
         url = a.get("href")
         if titre and url and "/film/" in url:
             if not url.startswith("http"):
-                url = f"https://www.senscritique.com{url}"
+                url = f"{BASE_URL}{url}"
             films.append({"titre": titre, "url": url})
     # dedupe while preserving order
     seen = set()
@@ -40,137 +66,31 @@ def weekly_releases(driver, week_url:str) -> list[dict]:
         deduped.append(film)
     return deduped
 
-def film_reviews(driver, film_url:str, film_title: str | None = None) -> list[dict]:
-    driver.get(film_url + "/critiques")
-    time.sleep(2.5)
-    html_source = driver.page_source
-    soup = BeautifulSoup(html_source, "html.parser")
-    rows = []
-
-    def parse_next_data_reviews(soup_obj):
-        """
-        SensCritique est en Next.js : les critiques sont dans le JSON __NEXT_DATA__/__APOLLO_STATE__.
-        On extrait directement ces données pour éviter de dépendre des classes CSS dynamiques.
-        """
-        script_tag = soup_obj.find("script", id="__NEXT_DATA__")
-        if not script_tag or not script_tag.string:
-            return []
-        try:
-            data = json.loads(script_tag.string)
-        except json.JSONDecodeError:
-            return []
-
-        apollo = (
-            data.get("props", {})
-                .get("pageProps", {})
-                .get("__APOLLO_STATE__", {})
+def wait_for_page(driver, css: str, timeout: float | None = None) -> bool:
+    """
+    Attend qu'au moins un élément `css` soit présent (au lieu d'un sleep fixe).
+    Retourne False au timeout : on parse alors ce que la page contient.
+    """
+    try:
+        WebDriverWait(driver, timeout or PAGE_TIMEOUT).until(
+            lambda d: d.find_elements(By.CSS_SELECTOR, css)
         )
-        if not isinstance(apollo, dict):
-            return []
-
-        # On récupère un bloc Product pour métadonnées éventuelles (note moyenne, image, dates).
-        product_node = None
-        for key, val in apollo.items():
-            if isinstance(val, dict) and key.startswith("Product:"):
-                product_node = val
-                break
+        return True
+    except TimeoutException:
+        return False
 
-        # Cherche les références de critiques depuis le bloc Product (clé reviews({...})) ou n'importe quel node Reviews.
-        review_refs = []
-        if product_node:
-            for k, v in product_node.items():
-                if isinstance(v, dict) and v.get("__typename") == "Reviews" and "items" in v:
-                    for item in v.get("items", []):
-                        ref = item.get("__ref") if isinstance(item, dict) else None
-                        if ref and ref.startswith("Review:"):
-                            review_refs.append(ref)
-        # fallback : scan global si non trouvé
-        if not review_refs:
-            for node in apollo.values():
-                if isinstance(node, dict) and node.get("__typename") == "Reviews" and "items" in node:
-                    for item in node.get("items", []):
-                        ref = item.get("__ref") if isinstance(item, dict) else None
-                        if ref and ref.startswith("Review:"):
-                            review_refs.append(ref)
-        if not review_refs:
-            return []
-
-        film_rate = product_node.get("rating") if product_node else None
-        date_sortie = product_node.get("dateRelease") if product_node else None
-        image = None
-        if product_node:
-            for k, v in product_node.items():
-                # Exemple de clé: medias({"backdropSize":"1200"})
-                if isinstance(v, dict) and "picture" in v:
-                    image = v.get("picture")
-                    break
-
-        parsed = []
-        seen_hashes = set()
-        for ref in review_refs:
-            review_obj = apollo.get(ref, {})
-            if not isinstance(review_obj, dict):
-                continue
-            texte = review_obj.get("bodyShort") or review_obj.get("body") or ""
-            if not texte:
-                continue
-            auteur = None
-            author_ref = review_obj.get("author", {}).get("__ref")
-            if author_ref and isinstance(apollo.get(author_ref), dict):
-                user = apollo[author_ref]
-                auteur = user.get("name") or user.get("username")
-            note = review_obj.get("rating")
-            review_url = review_obj.get("url")
-            full_review_url = (
-                review_url if review_url and review_url.startswith("http")
-                else f"https://www.senscritique.com{review_url}" if review_url else film_url
-            )
-            hash_c = hashlib.sha1(((auteur or "") + "||" + texte).encode()).hexdigest()
-            if hash_c in seen_hashes:
-                continue
-            seen_hashes.add(hash_c)
-            parsed.append({
-                "titre": film_title,
-                "film_url": film_url,
-                "auteur": auteur,
-                "note": note,
-                "texte": texte,
-                "url": full_review_url,
-                "hash_critique": hash_c,
-                "likes": review_obj.get("likeCount"),
-                "comments": review_obj.get("commentCount"),
-                "rate": film_rate,
-                "date_sortie": date_sortie,
-                "image": image,
-                "bande_originale": None,
-                "groupe": None,
-                "annee": product_node.get("yearOfProduction") if product_node else None,
-                "duree": product_node.get("duration") if product_node else None,
-                "genres": [],
-                "producteurs": [],
-                "realisateurs": [],
-                "scenaristes": [],
-                "pays": [],
-            })
-        return parsed
-
-    # Essaye d'abord via le JSON Next.js, puis fallback sur le scraping classique.
-    rows = parse_next_data_reviews(soup)
-    if not rows:
-        # Fallback réseau direct (au cas où Cloudflare/lazy load empêche page_source de contenir le JSON)
-        try:
-            resp = requests.get(film_url + "/critiques", headers={"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"}, timeout=15)
-            if resp.ok:
-                soup_fallback = BeautifulSoup(resp.text, "html.parser")
-                rows = parse_next_data_reviews(soup_fallback)
-        except Exception:
-            pass
-
-    if rows:
-        return rows
+def weekly_releases(driver, week_url:str) -> list[dict]:
+    driver.get(week_url)
+    wait_for_page(driver, WEEK_READY_CSS)
+    return parse_weekly_releases(driver.page_source)
 
+def parse_review_cards(soup_obj, film_url: str, film_title: str | None = None) -> list[dict]:
+    """
+    Fallback HTML : critiques lues depuis les cartes de la page (classes CSS).
+    """
+    rows = []
     # Sélecteurs élargis pour s'adapter aux variantes de pages critiques.
-    for item in soup.select(".e-critique, .p-critic, article, [data-testid='review-card'], .rviw"):
+    for item in soup_obj.select(".e-critique, .p-critic, article, [data-testid='review-card'], .rviw"):
         texte_el = item.select_one(".content, .c-review__body, .rviw, [data-testid='review-body']")
         texte = texte_el.get_text(" ", strip=True) if texte_el else None
         if not texte: 
@@ -185,7 +105,7 @@ def film_reviews(driver, film_url:str, film_title: str | None = None) -> list[di
         full_review_url = (
             review_url
             if review_url and review_url.startswith("http")
-            else f"https://www.senscritique.com{review_url}" if review_url else film_url
+            else f"{BASE_URL}{review_url}" if review_url else film_url
         )
         rows.append({
             "titre": film_title,
@@ -213,6 +133,239 @@ def film_reviews(driver, film_url:str, film_title: str | None = None) -> list[di
         })
     return rows
 
+def reviews_page_url(film_url: str, page: int = 1) -> str:
+    url = film_url + "/critiques"
+    return url if page <= 1 else f"{url}?{REVIEWS_PAGE_PARAM}={page}"
+
+def page_source(driver, url: str) -> str:
+    """
+    HTML d'une page /critiques rendue par Selenium.
+    """
+    driver.get(url)
+    wait_for_page(driver, REVIEWS_READY_CSS)
+    return driver.page_source
+
+
+# -------------------------
+# Extraction HTTP (Selenium en secours)
+# -------------------------
+
+class RateLimiter:
+    """
+    Espacement minimal entre deux requêtes vers un même hôte (thread-safe).
+    """
+
+    def __init__(self, min_interval: float = 0.5):
+        self.min_interval = min_interval
+        self._next_slot: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url: str):
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class HttpFetcher:
+    """
+    Client HTTP mutualisé : session keep-alive, nombre de requêtes simultanées borné,
+    limitation de débit par hôte et retry avec backoff exponentiel (429/5xx).
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 4,
+        min_interval: float = 0.5,
+        retries: int = 3,
+        backoff: float = 1.0,
+        timeout: float = 15,
+    ):
+        self.timeout = timeout
+        self.rate_limiter = RateLimiter(min_interval)
+        self._slots = threading.BoundedSemaphore(max_connections)
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=("GET",),
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=max_connections, max_retries=retry)
+        self.session = requests.Session()
+        self.session.headers.update({"User-Agent": USER_AGENT})
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get(self, url: str) -> str | None:
+        """
+        Retourne le HTML de la page, ou None si la requête échoue.
+        """
+        self.rate_limiter.wait(url)
+        with self._slots:
+            try:
+                with timed("page_fetch"):
+                    resp = self.session.get(url, timeout=self.timeout)
+            except requests.RequestException as e:
+                inc("pages_fetched_total", status="error")
+                print(f"   ⚠️ GET {url} impossible: {e}")
+                return None
+        inc("pages_fetched_total", status=str(resp.status_code))
+        return resp.text if resp.ok else None
+
+    def close(self):
+        self.session.close()
+
+
+class DriverPool:
+    """
+    Pool de sessions Selenium Remote (N sessions sur la grille).
+    Les sessions sont créées à la demande, recyclées après `max_pages` pages
+    ou dès qu'une erreur WebDriver survient ; un RateLimiter partagé espace
+    les chargements de page vers un même hôte.
+    """
+
+    def __init__(
+        self,
+        remote_url: str,
+        size: int = 1,
+        max_pages: int = 50,
+        rate_limiter: RateLimiter | None = None,
+    ):
+        self.remote_url = remote_url
+        self.size = size
+        self.max_pages = max_pages
+        self.rate_limiter = rate_limiter or RateLimiter(0.0)
+        self._slots: queue.Queue = queue.Queue()
+        for _ in range(size):
+            self._slots.put({"driver": None, "pages": 0})
+        self._all: list[dict] = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _close(slot: dict):
+        if slot["driver"] is not None:
+            try:
+                slot["driver"].quit()
+            except Exception:
+                pass
+        slot["driver"] = None
+        slot["pages"] = 0
+
+    @contextmanager
+    def acquire(self):
+        slot = self._slots.get()
+        try:
+            if slot["driver"] is None:
+                print(f"Connexion Selenium Remote: {self.remote_url}")
+                slot["driver"] = make_driver(self.remote_url)
+                with self._lock:
+                    if slot not in self._all:
+                        self._all.append(slot)
+            try:
+                yield slot["driver"]
+            except WebDriverException:
+                # session plantée : on la jette, la prochaine sera recréée
+                self._close(slot)
+                raise
+            slot["pages"] += 1
+            if slot["pages"] >= self.max_pages:
+                self._close(slot)
+        finally:
+            self._slots.put(slot)
+
+    def run(self, fn, url: str, *args, **kwargs):
+        """
+        Exécute fn(driver, url, ...) sur une session libre du pool.
+        """
+        self.rate_limiter.wait(url)
+        with self.acquire() as driver, timed("selenium_page"):
+            return fn(driver, url, *args, **kwargs)
+
+    def quit(self):
+        with self._lock:
+            for slot in self._all:
+                self._close(slot)
+
+
+def weekly_releases_http(fetcher: HttpFetcher, week_url: str, driver: DriverPool | None = None) -> list[dict]:
+    """
+    Films de la semaine via HTTP ; passe par Selenium si la page n'en liste aucun.
+    """
+    html = fetcher.get(week_url)
+    films = parse_weekly_releases(html) if html else []
+    if not films and driver is not None:
+        films = driver.run(weekly_releases, week_url)
+    return films
+
+
+def film_review_page(
+    fetcher: HttpFetcher | None,
+    film_url: str,
+    film_title: str | None = None,
+    page: int = 1,
+    driver: DriverPool | None = None,
+) -> tuple[list[dict], dict | None]:
+    """
+    Une page de critiques d'un film et la pagination du bloc Reviews
+    ({"limit", "offset", "total"}, None si inconnue). HTTP d'abord (JSON
+    __NEXT_DATA__) ; seulement si le JSON est absent (page de challenge, rendu
+    partiel), on bascule sur le driver Selenium, puis sur les cartes HTML.
+    Un JSON sans critiques (film sorti cette semaine) est une réponse : ([], pagination).
+    """
+    url = reviews_page_url(film_url, page)
+    html = fetcher.get(url) if fetcher else None
+    parsed = next_data.reviews_page(html, film_url, film_title) if html else None
+    if parsed is not None:
+        return parsed
+    if driver is not None:
+        html = driver.run(page_source, url)
+        parsed = next_data.reviews_page(html, film_url, film_title)
+        if parsed is not None:
+            return parsed
+    if html:
+        return parse_review_cards(BeautifulSoup(html, "html.parser"), film_url, film_title), None
+    return [], None
+
+
+def remaining_review_pages(
+    fetch_page,
+    pagination: dict | None,
+    first_page_count: int,
+    all_known=None,
+    concurrency: int = REVIEW_PAGE_CONCURRENCY,
+    max_pages: int = REVIEW_MAX_PAGES,
+) -> list[dict]:
+    """
+    Critiques des pages 2..N annoncées par la pagination de la première page.
+    `fetch_page(page) -> (rows, pagination)` ; les pages sont chargées par vagues
+    de `concurrency` (plafond par film, en plus des limites globales du fetcher).
+    Si `all_known(rows)` indique qu'une vague entière est déjà en base, on arrête :
+    la suite a déjà été chargée lors d'un run précédent.
+    """
+    if not pagination or not pagination.get("total"):
+        return []
+    per_page = pagination.get("limit") or first_page_count
+    if not per_page:
+        return []
+    n_pages = -(-pagination["total"] // per_page)
+    if max_pages:
+        n_pages = min(n_pages, max_pages)
+    rows = []
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        for start in range(2, n_pages + 1, max(1, concurrency)):
+            wave = range(start, min(start + concurrency, n_pages + 1))
+            wave_rows = [r for page_rows, _ in pool.map(fetch_page, wave) for r in page_rows]
+            if not wave_rows:
+                break
+            rows.extend(wave_rows)
+            if all_known is not None and all_known(wave_rows):
+                break
+    return rows
+
 
 def fake_scrape_reviews() -> list[dict]:
     """
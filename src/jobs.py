@@ -0,0 +1,191 @@
+import json
+import os
+import socket
+import threading
+from typing import Iterable
+
+from psycopg.rows import dict_row
+
+# File de travaux Postgres (table jobs) : réclamation FOR UPDATE SKIP LOCKED,
+# heartbeat des travaux en cours, retry avec backoff exponentiel.
+MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+RETRY_BACKOFF = float(os.getenv("JOB_RETRY_BACKOFF", "60"))  # secondes, doublé à chaque échec
+HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", "30"))
+# Un travail "running" sans heartbeat depuis ce délai est considéré abandonné (worker mort)
+STALE_AFTER = float(os.getenv("JOB_STALE_AFTER", "300"))
+
+PRIORITY = {"week": 10, "film": 0}
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue(conn, kind: str, urls: Iterable[str], payloads: dict[str, dict] | None = None) -> int:
+    """
+    Ajoute des travaux (kind, url) en une requête ; une url déjà en file n'est
+    jamais dupliquée. `payloads` : données optionnelles par url (titre du film...).
+    Retourne le nombre de travaux réellement créés.
+    """
+    urls = sorted({u for u in urls if u})
+    if not urls:
+        return 0
+    payloads = payloads or {}
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO jobs (kind, url, payload, priority, max_attempts)
+            SELECT %(kind)s, u, p::jsonb, %(priority)s, %(max_attempts)s
+            FROM unnest(%(urls)s::text[], %(payloads)s::text[]) AS t(u, p)
+            ON CONFLICT (kind, url) DO NOTHING
+        """, {
+            "kind": kind,
+            "urls": urls,
+            "payloads": [json.dumps(payloads.get(u) or {}) for u in urls],
+            "priority": PRIORITY.get(kind, 0),
+            "max_attempts": MAX_ATTEMPTS,
+        })
+        return cur.rowcount
+
+
+def expire_abandoned(conn) -> int:
+    """
+    Marque 'failed' les travaux abandonnés (heartbeat expiré) qui ont épuisé leurs
+    tentatives : un travail qui tue son worker (OOM, Selenium bloqué) n'est pas
+    réclamé indéfiniment. Retourne le nombre de travaux passés en échec.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE jobs SET
+                status = 'failed',
+                error = 'worker perdu (heartbeat expiré) à la tentative ' || attempts || '/' || max_attempts,
+                locked_by = NULL,
+                finished_at = now()
+            WHERE id IN (
+                SELECT id FROM jobs
+                WHERE status = 'running' AND heartbeat_at < now() - make_interval(secs => %(stale)s)
+                  AND attempts >= max_attempts
+                FOR UPDATE SKIP LOCKED
+            )
+        """, {"stale": STALE_AFTER})
+        return cur.rowcount
+
+
+def claim(conn, worker: str, limit: int = 1, kind: str | None = None) -> list[dict]:
+    """
+    Réclame jusqu'à `limit` travaux prêts (ou abandonnés par un worker mort et
+    pas encore à max_attempts), sans attendre les lignes verrouillées par les autres workers.
+    """
+    expire_abandoned(conn)
+    with conn.cursor(row_factory=dict_row) as cur:
+        cur.execute("""
+            WITH picked AS (
+                SELECT id FROM jobs
+                WHERE ((status = 'pending' AND run_after <= now())
+                       OR (status = 'running' AND heartbeat_at < now() - make_interval(secs => %(stale)s)
+                           AND attempts < max_attempts))
+                  AND (%(kind)s::text IS NULL OR kind = %(kind)s)
+                ORDER BY priority DESC, id
+                LIMIT %(limit)s
+                FOR UPDATE SKIP LOCKED
+            )
+            UPDATE jobs j SET
+                status = 'running',
+                attempts = j.attempts + 1,
+                locked_by = %(worker)s,
+                started_at = now(),
+                heartbeat_at = now()
+            FROM picked
+            WHERE j.id = picked.id
+            RETURNING j.id, j.kind, j.url, j.payload, j.attempts, j.max_attempts
+        """, {"stale": STALE_AFTER, "kind": kind, "limit": limit, "worker": worker})
+        return cur.fetchall()
+
+
+def heartbeat(conn, job_ids: Iterable[int], worker: str):
+    with conn.cursor() as cur:
+        cur.execute(
+            "UPDATE jobs SET heartbeat_at = now() WHERE id = ANY(%s) AND locked_by = %s AND status = 'running'",
+            (list(job_ids), worker),
+        )
+
+
+def complete(conn, job_id: int, worker: str, result: dict | None = None) -> bool:
+    """
+    Marque le travail terminé s'il est toujours en cours pour ce worker.
+    False si un autre worker l'a repris entre-temps (heartbeat expiré) : rien n'est écrit.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE jobs SET status = 'done', result = %s::jsonb, error = NULL,
+                            finished_at = now(), locked_by = NULL
+            WHERE id = %s AND locked_by = %s AND status = 'running'
+        """, (json.dumps(result or {}, default=str), job_id, worker))
+        return cur.rowcount > 0
+
+
+def fail(conn, job: dict, worker: str, error: str, backoff: float = RETRY_BACKOFF) -> bool:
+    """
+    Remet le travail en file après backoff * 2^(tentatives-1) secondes,
+    ou le marque 'failed' une fois max_attempts atteint.
+    Comme complete : sans effet (False) si le travail n'est plus en cours pour ce worker.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE jobs SET
+                status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'pending' END,
+                run_after = now() + make_interval(secs => %(backoff)s * power(2, greatest(attempts - 1, 0))),
+                error = %(error)s,
+                locked_by = NULL,
+                finished_at = CASE WHEN attempts >= max_attempts THEN now() END
+            WHERE id = %(id)s AND locked_by = %(worker)s AND status = 'running'
+        """, {"id": job["id"], "worker": worker, "error": error[:2000], "backoff": backoff})
+        return cur.rowcount > 0
+
+
+def counts(conn) -> dict[str, dict[str, int]]:
+    """
+    Nombre de travaux par type et par statut.
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT kind, status, count(*) FROM jobs GROUP BY kind, status")
+        out: dict[str, dict[str, int]] = {}
+        for kind, status, n in cur.fetchall():
+            out.setdefault(kind, {})[status] = n
+        return out
+
+
+def has_open_jobs(conn) -> bool:
+    with conn.cursor() as cur:
+        cur.execute("SELECT EXISTS (SELECT 1 FROM jobs WHERE status IN ('pending', 'running'))")
+        return cur.fetchone()[0]
+
+
+class Heartbeat:
+    """
+    Thread de fond qui rafraîchit heartbeat_at des travaux en cours du worker,
+    sur sa propre connexion (le travail lui-même peut durer plusieurs minutes).
+    """
+
+    def __init__(self, conn, worker: str, interval: float = HEARTBEAT_INTERVAL):
+        self.conn = conn
+        self.worker = worker
+        self.interval = interval
+        self.job_ids: set[int] = set()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="job-heartbeat", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if self.job_ids:
+                try:
+                    heartbeat(self.conn, list(self.job_ids), self.worker)
+                except Exception as e:
+                    print(f"   ⚠️ Heartbeat impossible: {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
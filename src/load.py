@@ -3,6 +3,8 @@ import psycopg
 from psycopg.rows import dict_row
 from typing import Iterable
 
+from src.metrics import inc, timed
+
 def get_conn(dsn: str | None = None):
     """
     Ouvre une connexion PostgreSQL avec autocommit.
@@ -35,64 +37,352 @@ def upsert_film(conn, film: dict):
         """, film)
         return cur.fetchone()["id"]
 
-def _insert_dim_list(conn, table: str, column: str, film_title: str, values: Iterable[str]):
+# clé dans les lignes scrapées -> (table de référence, colonne valeur, table de liaison, clé étrangère)
+DIMENSIONS = {
+    "genres": ("genres", "genre", "film_genres", "genre_id"),
+    "producteurs": ("producteurs", "producteur", "film_producteurs", "producteur_id"),
+    "realisateurs": ("realisateurs", "realisateur", "film_realisateurs", "realisateur_id"),
+    "scenaristes": ("scenaristes", "scenariste", "film_scenaristes", "scenariste_id"),
+    "pays": ("pays", "pays", "film_pays", "pays_id"),
+}
+
+def _clean_pairs(pairs: Iterable[tuple[str, str]]) -> list[tuple[str, str]]:
     """
-    Insère en masse des lignes (film, value) dans une table dimension simple.
+    Nettoie et déduplique les couples (url du film, valeur) en mémoire.
     """
-    # Nettoie et déduplique la liste pour éviter les insertions multiples du même couple film/valeur.
-    vals = [v.strip() for v in values if v and v.strip()]
-    unique_vals = sorted(set(vals))
-    if not unique_vals:
-        return
-    with conn.cursor() as cur:
-        for v in unique_vals:
-            cur.execute(
-                f"""
-                INSERT INTO {table} (film, {column})
-                SELECT %s, %s
-                WHERE NOT EXISTS (
-                    SELECT 1 FROM {table} WHERE film = %s AND {column} = %s
-                )
-                """,
-                (film_title, v, film_title, v),
-            )
+    seen = set()
+    for film_url, v in pairs:
+        v = v.strip() if v else None
+        if film_url and v:
+            seen.add((film_url, v))
+    return sorted(seen)
 
-def insert_genres(conn, film_title: str, genres: Iterable[str]):
-    _insert_dim_list(conn, "genres", "genre", film_title, genres)
+def _insert_dim_pairs(cur, key: str, pairs: Iterable[tuple[str, str]]) -> int:
+    """
+    Écrit les couples (url du film, valeur) d'une dimension : nouvelles valeurs dans
+    la table de référence, puis liens (film_id, id de valeur) dans la table de liaison.
+    Deux requêtes (unnest + ON CONFLICT) quel que soit le nombre de couples ;
+    les films doivent déjà exister dans `films`.
+    """
+    table, column, bridge, fk = DIMENSIONS[key]
+    clean = _clean_pairs(pairs)
+    if not clean:
+        return 0
+    urls, values = zip(*clean)
+    cur.execute(
+        f"""
+        INSERT INTO {table} ({column})
+        SELECT DISTINCT v FROM unnest(%s::varchar[]) AS v
+        ORDER BY v
+        ON CONFLICT ({column}) DO NOTHING
+        """,
+        (list(values),),
+    )
+    cur.execute(
+        f"""
+        INSERT INTO {bridge} (film_id, {fk})
+        SELECT f.id, d.id
+        FROM unnest(%s::text[], %s::varchar[]) AS p(url, value)
+        JOIN films f ON f.url = p.url
+        JOIN {table} d ON d.{column} = p.value
+        ON CONFLICT DO NOTHING
+        """,
+        (list(urls), list(values)),
+    )
+    return cur.rowcount
 
-def insert_producteurs(conn, film_title: str, producteurs: Iterable[str]):
-    _insert_dim_list(conn, "producteurs", "producteur", film_title, producteurs)
+def dimension_pairs(rows: Iterable[dict]) -> dict[str, set[tuple[str, str]]]:
+    """
+    Regroupe les couples (url du film, valeur) des cinq dimensions pour un batch de lignes,
+    dédupliqués par film (plusieurs critiques d'un même film portent les mêmes listes).
+    """
+    pairs = {key: set() for key in DIMENSIONS}
+    for row in rows:
+        film_url = row.get("film_url") or row.get("url")
+        if not film_url:
+            continue
+        for key in DIMENSIONS:
+            for v in row.get(key) or []:
+                pairs[key].add((film_url, v))
+    return pairs
 
-def insert_realisateurs(conn, film_title: str, realisateurs: Iterable[str]):
-    _insert_dim_list(conn, "realisateurs", "realisateur", film_title, realisateurs)
+def insert_dimensions(conn, pairs: dict[str, Iterable[tuple[str, str]]]) -> dict[str, int]:
+    """
+    Écrit les cinq dimensions pour un batch : deux requêtes par dimension, une transaction.
+    `pairs` associe une clé de DIMENSIONS (ex. "genres") à ses couples (url du film, valeur).
+    Retourne le nombre de liens film/valeur créés par dimension.
+    """
+    inserted = {}
+    with timed("db_write", target="dimensions"), conn.transaction(), conn.cursor() as cur:
+        for key in DIMENSIONS:
+            inserted[key] = _insert_dim_pairs(cur, key, pairs.get(key, ()))
+    return inserted
 
-def insert_scenaristes(conn, film_title: str, scenaristes: Iterable[str]):
-    _insert_dim_list(conn, "scenaristes", "scenariste", film_title, scenaristes)
+def _insert_dim_list(conn, key: str, film_url: str, values: Iterable[str]):
+    """
+    Relie un film (par url) à une liste de valeurs d'une dimension.
+    """
+    with conn.transaction(), conn.cursor() as cur:
+        _insert_dim_pairs(cur, key, ((film_url, v) for v in values))
 
-def insert_pays(conn, film_title: str, pays: Iterable[str]):
-    _insert_dim_list(conn, "pays", "pays", film_title, pays)
+def insert_genres(conn, film_url: str, genres: Iterable[str]):
+    _insert_dim_list(conn, "genres", film_url, genres)
 
-def insert_review(conn, film_title: str, row, sentiment: str | None, emb):
+def insert_producteurs(conn, film_url: str, producteurs: Iterable[str]):
+    _insert_dim_list(conn, "producteurs", film_url, producteurs)
+
+def insert_realisateurs(conn, film_url: str, realisateurs: Iterable[str]):
+    _insert_dim_list(conn, "realisateurs", film_url, realisateurs)
+
+def insert_scenaristes(conn, film_url: str, scenaristes: Iterable[str]):
+    _insert_dim_list(conn, "scenaristes", film_url, scenaristes)
+
+def insert_pays(conn, film_url: str, pays: Iterable[str]):
+    _insert_dim_list(conn, "pays", film_url, pays)
+
+def _as_int(value) -> int | None:
+    """
+    Compteur scrapé (likes, commentaires ; parfois flottant) vers un entier.
+    """
+    return None if value is None else int(round(float(value)))
+
+def _is_negative(sentiment: str | None) -> bool | None:
     sentiment = (sentiment or "").lower()
-    is_negative = None
     if "neg" in sentiment:
-        is_negative = True
-    elif "pos" in sentiment:
-        is_negative = False
+        return True
+    if "pos" in sentiment:
+        return False
+    return None
+
+# Stockage des embeddings (EMBEDDING_STORAGE, liste séparée par des virgules) :
+#   full   -> embedding      VECTOR(384)  float32, ~1.5KB
+#   half   -> embedding_half HALFVEC(384) float16, ~0.8KB
+#   binary -> embedding_bin  BIT(384)     signature binaire, 48 octets (passe grossière uniquement)
+EMBEDDING_STORAGE = tuple(
+    s.strip() for s in os.getenv("EMBEDDING_STORAGE", "full").split(",") if s.strip()
+)
+_STORAGE_EXPR = {
+    "full": ("embedding", "{v}::vector"),
+    "half": ("embedding_half", "{v}::vector::halfvec"),
+    "binary": ("embedding_bin", "binary_quantize({v}::vector)::bit(384)"),
+}
+
+def embedding_columns(value_expr: str, storage: Iterable[str] = EMBEDDING_STORAGE) -> tuple[list[str], list[str]]:
+    """
+    Colonnes d'embedding à écrire et expressions SQL correspondantes, à partir
+    d'une expression source au format texte pgvector.
+    """
+    unknown = set(storage) - set(_STORAGE_EXPR)
+    if unknown:
+        raise ValueError(f"EMBEDDING_STORAGE inconnu: {sorted(unknown)}")
+    if set(storage) <= {"binary"}:
+        raise ValueError("EMBEDDING_STORAGE doit inclure 'full' ou 'half' (binary sert au tri grossier)")
+    cols, exprs = [], []
+    for key in ("full", "half", "binary"):
+        if key in storage:
+            col, expr = _STORAGE_EXPR[key]
+            cols.append(col)
+            exprs.append(expr.format(v=value_expr))
+    return cols, exprs
+
+def insert_review(conn, film_url: str, row, sentiment: str | None, emb):
+    """
+    Insère une critique rattachée au film `film_url` (déjà présent dans `films`).
+    L'origine du label est lue dans row["sentiment_source"] ('llm', 'local', 'manual').
+    """
+    is_negative = _is_negative(sentiment)
+    emb_cols, emb_exprs = embedding_columns("%(embedding)s")
 
     with conn.cursor() as cur:
-        cur.execute("""
-        INSERT INTO reviews (film, is_negative, title, likes, comments, content, url, embedding)
-        VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
+        cur.execute(f"""
+        INSERT INTO reviews (film_id, is_negative, sentiment_source, likes, comments, content, url, hash_critique, duplicate_of, {", ".join(emb_cols)})
+        SELECT (SELECT id FROM films WHERE url = %(film_url)s), %(is_negative)s, %(sentiment_source)s, %(likes)s, %(comments)s,
+               %(content)s, %(url)s, %(hash_critique)s, %(duplicate_of)s, {", ".join(emb_exprs)}
         ON CONFLICT (url) DO NOTHING
-        """, (
-            film_title,
-            is_negative,
-            row.get("titre") or row.get("title"),
-            row.get("likes"),
-            row.get("comments"),
+        """, {
+            "film_url": film_url,
+            "is_negative": is_negative,
+            "sentiment_source": row.get("sentiment_source") if sentiment else None,
+            "likes": _as_int(row.get("likes")),
+            "comments": _as_int(row.get("comments")),
+            "content": row["texte"],
+            "url": row["url"],
+            "hash_critique": row.get("hash_critique"),
+            "duplicate_of": row.get("duplicate_of"),
+            "embedding": vector_literal(emb),
+        })
+        return cur.rowcount == 1
+
+def filter_new_reviews(conn, rows: list[dict], batch_size: int = 1000) -> tuple[list[dict], int]:
+    """
+    Écarte les critiques déjà en base (même url ou même hash_critique) avant toute inférence.
+    Une requête par batch ; retourne (critiques nouvelles, nombre ignoré).
+    """
+    new_rows = []
+    skipped = 0
+    for i in range(0, len(rows), batch_size):
+        batch = rows[i:i + batch_size]
+        urls = [r["url"] for r in batch if r.get("url")]
+        hashes = [r["hash_critique"] for r in batch if r.get("hash_critique")]
+        with timed("db_read", target="prefilter"), conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT url, hash_critique FROM reviews
+                WHERE url = ANY(%s) OR hash_critique = ANY(%s)
+                """,
+                (urls, hashes),
+            )
+            known_urls = set()
+            known_hashes = set()
+            for url, hash_c in cur.fetchall():
+                known_urls.add(url)
+                if hash_c:
+                    known_hashes.add(hash_c)
+        for r in batch:
+            if r.get("url") in known_urls or (r.get("hash_critique") and r["hash_critique"] in known_hashes):
+                skipped += 1
+            else:
+                new_rows.append(r)
+    return new_rows, skipped
+
+FILM_COLUMNS = ("film", "url", "rate", "date_sortie", "image", "bande_originale", "groupe", "annee", "duree")
+REVIEW_COLUMNS = ("film_url", "is_negative", "sentiment_source", "likes", "comments", "content", "url", "hash_critique", "duplicate_of", "embedding")
+
+def vector_literal(emb) -> str | None:
+    """
+    Format texte pgvector ('[x,y,...]') pour le COPY.
+    """
+    if emb is None:
+        return None
+    return "[" + ",".join(repr(float(x)) for x in emb) + "]"
+
+def _merge_films(films: Iterable[dict]) -> list[dict]:
+    """
+    Fusionne les films du batch par url (une seule ligne par url pour l'ON CONFLICT),
+    en gardant la première valeur non nulle de chaque champ.
+    """
+    merged: dict[str, dict] = {}
+    for f in films:
+        url = f.get("url")
+        if not url:
+            continue
+        cur = merged.setdefault(url, {c: None for c in FILM_COLUMNS})
+        for c in FILM_COLUMNS:
+            if cur[c] is None and f.get(c) is not None:
+                cur[c] = f[c]
+    return list(merged.values())
+
+def bulk_load(conn, films: Iterable[dict], reviews: Iterable[tuple]) -> dict:
+    """
+    Charge un batch de films et de critiques en une transaction :
+    COPY vers des tables temporaires puis un seul INSERT ... ON CONFLICT par table.
+    `reviews` contient des tuples (row, sentiment, emb) comme pour insert_review
+    (origine du label dans row["sentiment_source"]).
+    Retourne les compteurs films insérés/mis à jour et critiques insérées/ignorées.
+    """
+    film_rows = _merge_films(films)
+    review_rows = []
+    seen_urls = set()
+    total_reviews = 0
+    for row, sentiment, emb in reviews:
+        total_reviews += 1
+        if row["url"] in seen_urls:
+            continue
+        seen_urls.add(row["url"])
+        review_rows.append((
+            row.get("film_url"),
+            _is_negative(sentiment),
+            row.get("sentiment_source") if sentiment else None,
+            _as_int(row.get("likes")),
+            _as_int(row.get("comments")),
             row["texte"],
             row["url"],
-            emb
+            row.get("hash_critique"),
+            row.get("duplicate_of"),
+            vector_literal(emb),
         ))
-        return cur.rowcount == 1
+    stats = {
+        "films_inserted": 0,
+        "films_updated": 0,
+        "reviews_inserted": 0,
+        "reviews_skipped": total_reviews,
+    }
+    if not film_rows and not review_rows:
+        return stats
+
+    with timed("db_write", target="reviews"), conn.transaction(), conn.cursor() as cur:
+        if film_rows:
+            cur.execute("""
+                CREATE TEMP TABLE stage_films (
+                    film TEXT, url TEXT, rate FLOAT, date_sortie DATE, image TEXT,
+                    bande_originale TEXT, groupe TEXT, annee FLOAT, duree FLOAT
+                ) ON COMMIT DROP
+            """)
+            with cur.copy(f"COPY stage_films ({', '.join(FILM_COLUMNS)}) FROM STDIN") as copy:
+                for f in film_rows:
+                    copy.write_row(tuple(f[c] for c in FILM_COLUMNS))
+            cur.execute("""
+                INSERT INTO films (film, url, rate, date_sortie, image, bande_originale, groupe, annee, duree)
+                SELECT film, url, rate, date_sortie, image, bande_originale, groupe, round(annee), round(duree)
+                FROM stage_films
+                ON CONFLICT (url) DO UPDATE SET
+                    film = EXCLUDED.film,
+                    rate = COALESCE(EXCLUDED.rate, films.rate),
+                    date_sortie = COALESCE(EXCLUDED.date_sortie, films.date_sortie),
+                    image = COALESCE(EXCLUDED.image, films.image),
+                    bande_originale = COALESCE(EXCLUDED.bande_originale, films.bande_originale),
+                    groupe = COALESCE(EXCLUDED.groupe, films.groupe),
+                    annee = COALESCE(EXCLUDED.annee, films.annee),
+                    duree = COALESCE(EXCLUDED.duree, films.duree)
+                RETURNING (xmax = 0) AS inserted
+            """)
+            flags = [r[0] for r in cur.fetchall()]
+            stats["films_inserted"] = sum(1 for f in flags if f)
+            stats["films_updated"] = len(flags) - stats["films_inserted"]
+
+        if review_rows:
+            cur.execute("""
+                CREATE TEMP TABLE stage_reviews (
+                    film_url TEXT, is_negative BOOLEAN, sentiment_source TEXT, likes INTEGER, comments INTEGER,
+                    content TEXT, url TEXT, hash_critique TEXT, duplicate_of TEXT, embedding TEXT
+                ) ON COMMIT DROP
+            """)
+            with cur.copy(f"COPY stage_reviews ({', '.join(REVIEW_COLUMNS)}) FROM STDIN") as copy:
+                for r in review_rows:
+                    copy.write_row(r)
+            emb_cols, emb_exprs = embedding_columns("embedding")
+            cur.execute(f"""
+                INSERT INTO reviews (film_id, is_negative, sentiment_source, likes, comments, content, url, hash_critique, duplicate_of, {", ".join(emb_cols)})
+                SELECT f.id, s.is_negative, s.sentiment_source, s.likes, s.comments, s.content, s.url, s.hash_critique, s.duplicate_of,
+                       {", ".join(emb_exprs)}
+                FROM stage_reviews s
+                LEFT JOIN films f ON f.url = s.film_url
+                ON CONFLICT (url) DO NOTHING
+            """)
+            stats["reviews_inserted"] = cur.rowcount
+            stats["reviews_skipped"] = total_reviews - cur.rowcount
+    inc("reviews_loaded_total", stats["reviews_inserted"], result="inserted")
+    inc("reviews_loaded_total", stats["reviews_skipped"], result="skipped")
+    return stats
+
+def refresh_film_embeddings(conn, film_urls: Iterable[str]) -> int:
+    """
+    Recalcule le centroïde des embeddings de critiques des films touchés par le run.
+    """
+    urls = sorted({u for u in film_urls if u})
+    if not urls:
+        return 0
+    with timed("db_write", target="film_embeddings"), conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO film_embeddings (film_id, embedding, review_count, updated_at)
+            SELECT f.id, AVG(COALESCE(r.embedding, r.embedding_half::vector)), COUNT(*), now()
+            FROM films f
+            JOIN reviews r ON r.film_id = f.id
+            WHERE f.url = ANY(%s) AND COALESCE(r.embedding, r.embedding_half::vector) IS NOT NULL
+            GROUP BY f.id
+            ON CONFLICT (film_id) DO UPDATE SET
+                embedding = EXCLUDED.embedding,
+                review_count = EXCLUDED.review_count,
+                updated_at = EXCLUDED.updated_at
+        """, (urls,))
+        return cur.rowcount
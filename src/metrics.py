@@ -0,0 +1,264 @@
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Endpoint Prometheus (texte) pendant le run ; 0 = désactivé
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+# cProfile par opération : liste séparée par des virgules ("tei_batch,db_write"), "*" pour toutes
+PROFILE_OPS = {s.strip() for s in os.getenv("PROFILE_OPS", "").split(",") if s.strip()}
+PROFILE_DIR = os.getenv("PROFILE_DIR", ".cache/profiles")
+# Trace : une ligne JSON par opération chronométrée (op, début, durée, thread)
+TRACE_FILE = os.getenv("METRICS_TRACE_FILE")
+
+# Bornes (s) des histogrammes de latence
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float("inf"))
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+
+
+def _label_text(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+def _quantile(buckets: list[int], count: int, q: float) -> float | None:
+    """
+    Quantile estimé par interpolation linéaire dans les buckets de l'histogramme.
+    """
+    if not count:
+        return None
+    rank = q * count
+    seen = 0
+    lower = 0.0
+    for bound, n in zip(BUCKETS, buckets):
+        if n and seen + n >= rank:
+            if bound == float("inf"):
+                return lower
+            return lower + (bound - lower) * (rank - seen) / n
+        seen += n
+        lower = bound if bound != float("inf") else lower
+    return lower
+
+
+class Registry:
+    """
+    Compteurs et histogrammes de latence étiquetés, thread-safe.
+    Les valeurs sont cumulées sur la vie du process (sémantique Prometheus) ;
+    snapshot() + summary(since=...) donnent les chiffres d'un seul run.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: dict[tuple, float] = {}
+        # clé -> [compte par bucket (non cumulé), somme, compte, max]
+        self.histograms: dict[tuple, list] = {}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            h = self.histograms.get(key)
+            if h is None:
+                h = self.histograms[key] = [[0] * len(BUCKETS), 0.0, 0, 0.0]
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    h[0][i] += 1
+                    break
+            h[1] += seconds
+            h[2] += 1
+            h[3] = max(h[3], seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "histograms": {k: [list(h[0]), h[1], h[2], h[3]] for k, h in self.histograms.items()},
+            }
+
+    def render(self) -> str:
+        """
+        Format texte d'exposition Prometheus.
+        """
+        snap = self.snapshot()
+        lines = []
+        typed = set()
+        for (name, labels), value in sorted(snap["counters"].items()):
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{_label_text(labels)} {value}")
+        for (name, labels), (buckets, total, count, _) in sorted(snap["histograms"].items()):
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            cumulative = 0
+            for bound, n in zip(BUCKETS, buckets):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{_label_text(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_label_text(labels)} {total}")
+            lines.append(f"{name}_count{_label_text(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self, since: dict | None = None) -> dict:
+        """
+        Résumé JSON : compteurs et latences (compte, total, moyenne, p50, p99, max)
+        depuis le snapshot `since` (ou depuis le démarrage du process).
+        """
+        snap = self.snapshot()
+        before_c = (since or {}).get("counters", {})
+        before_h = (since or {}).get("histograms", {})
+        counters = {}
+        for key, value in snap["counters"].items():
+            delta = value - before_c.get(key, 0)
+            if delta:
+                counters[key[0] + _label_text(key[1])] = delta
+        latency = {}
+        for key, (buckets, total, count, peak) in snap["histograms"].items():
+            prev = before_h.get(key)
+            if prev:
+                buckets = [a - b for a, b in zip(buckets, prev[0])]
+                total, count = total - prev[1], count - prev[2]
+            if not count:
+                continue
+            # l'interpolation dans un bucket peut dépasser le max réellement observé
+            p50, p99 = (min(_quantile(buckets, count, q), peak) for q in (0.5, 0.99))
+            latency["/".join(v for _, v in key[1]) or key[0]] = {
+                "count": count,
+                "total_s": round(total, 4),
+                "mean_s": round(total / count, 4),
+                "p50_s": round(p50, 4),
+                "p99_s": round(p99, 4),
+                "max_s": round(peak, 4),
+            }
+        return {"counters": counters, "latency": latency}
+
+
+REGISTRY = Registry()
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+
+_profiles: dict[str, list[cProfile.Profile]] = {}
+_profiles_lock = threading.Lock()
+_local = threading.local()
+_trace_lock = threading.Lock()
+
+
+def _profiling(op: str) -> bool:
+    # un seul profileur actif par thread (pas de profils imbriqués)
+    return bool(PROFILE_OPS) and ("*" in PROFILE_OPS or op in PROFILE_OPS) and not getattr(_local, "profiling", False)
+
+
+def _trace(op: str, start: float, seconds: float, labels: dict):
+    line = json.dumps({
+        "op": op,
+        "start": start,
+        "seconds": round(seconds, 6),
+        "thread": threading.current_thread().name,
+        **labels,
+    }, default=str)
+    with _trace_lock, open(TRACE_FILE, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+
+@contextmanager
+def timed(op: str, **labels):
+    """
+    Chronomètre un bloc : histogramme pipeline_op_seconds{op=...}, compteur
+    d'erreurs pipeline_op_errors_total, et cProfile / trace si activés.
+    """
+    profiler = None
+    if _profiling(op):
+        profiler = cProfile.Profile()
+        _local.profiling = True
+        profiler.enable()
+    wall = time.time()
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        inc("pipeline_op_errors_total", op=op, **labels)
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        if profiler is not None:
+            profiler.disable()
+            _local.profiling = False
+            with _profiles_lock:
+                _profiles.setdefault(op, []).append(profiler)
+        observe("pipeline_op_seconds", seconds, op=op, **labels)
+        if TRACE_FILE:
+            _trace(op, wall, seconds, labels)
+
+
+def dump_profiles(directory: str = PROFILE_DIR) -> list[str]:
+    """
+    Agrège les profils collectés par opération dans <directory>/<op>.prof
+    (lisibles avec `python -m pstats` ou snakeviz).
+    """
+    with _profiles_lock:
+        collected = {op: profs for op, profs in _profiles.items() if profs}
+        _profiles.clear()
+    paths = []
+    if collected:
+        os.makedirs(directory, exist_ok=True)
+    for op, profs in collected.items():
+        path = os.path.join(directory, f"{op}.prof")
+        stats = pstats.Stats(profs[0])
+        for prof in profs[1:]:
+            stats.add(prof)
+        stats.dump_stats(path)
+        paths.append(path)
+    return paths
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server(port: int = METRICS_PORT) -> ThreadingHTTPServer | None:
+    """
+    Sert /metrics (format Prometheus) dans un thread de fond ; None si port = 0.
+    """
+    if not port:
+        return None
+    server = ThreadingHTTPServer(("0.0.0.0", port), _Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def save_run(conn, label: str | None, started_at: float, summary: dict, status: str = "ok") -> int:
+    """
+    Persiste le résumé JSON d'un run dans pipeline_runs ; retourne son id.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO pipeline_runs (label, status, started_at, finished_at, duration_s, summary)
+            VALUES (%s, %s, to_timestamp(%s), now(), %s, %s::jsonb)
+            RETURNING id
+        """, (label, status, started_at, round(time.time() - started_at, 3), json.dumps(summary, default=str)))
+        return cur.fetchone()[0]
@@ -0,0 +1,119 @@
+import queue
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Iterable
+
+from src.metrics import inc, timed
+
+# Marqueur de fin de flux propagé d'un étage au suivant
+_DONE = object()
+
+
+@dataclass
+class Stage:
+    """
+    Étage du pipeline.
+      fn         : reçoit un élément (ou une liste si batch_size > 0) et
+                   retourne un itérable d'éléments pour l'étage suivant.
+      workers    : nombre de threads qui consomment la file d'entrée.
+      batch_size : > 0 pour regrouper les éléments avant d'appeler fn.
+      max_wait   : délai (s) après lequel un batch incomplet est envoyé quand même.
+    """
+    name: str
+    fn: Callable[..., Iterable]
+    workers: int = 1
+    batch_size: int = 0
+    max_wait: float = 2.0
+    processed: int = 0
+    emitted: int = 0
+    errors: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def stats(self) -> dict:
+        return {"processed": self.processed, "emitted": self.emitted, "errors": self.errors}
+
+
+def _run_fn(stage: Stage, item, out: queue.Queue | None):
+    size = len(item) if stage.batch_size else 1
+    try:
+        with timed(f"stage_{stage.name}"):
+            results = list(stage.fn(item) or ())
+        n = 0
+        for res in results:
+            n += 1
+            if out is not None:
+                out.put(res)  # bloquant si la file aval est pleine : backpressure
+    except Exception as e:
+        with stage._lock:
+            stage.errors += size
+        inc("pipeline_stage_items_total", size, stage=stage.name, result="error")
+        print(f"❌ [{stage.name}] {e}")
+        return
+    with stage._lock:
+        stage.processed += size
+        stage.emitted += n
+    inc("pipeline_stage_items_total", size, stage=stage.name, result="processed")
+    inc("pipeline_stage_items_total", n, stage=stage.name, result="emitted")
+
+
+def _worker(stage: Stage, inp: queue.Queue, out: queue.Queue | None):
+    if not stage.batch_size:
+        while True:
+            item = inp.get()
+            if item is _DONE:
+                inp.put(_DONE)  # réveille les autres workers de l'étage
+                return
+            _run_fn(stage, item, out)
+
+    batch = []
+    while True:
+        try:
+            item = inp.get(timeout=stage.max_wait)
+        except queue.Empty:
+            if batch:
+                _run_fn(stage, batch, out)
+                batch = []
+            continue
+        if item is _DONE:
+            inp.put(_DONE)
+            if batch:
+                _run_fn(stage, batch, out)
+            return
+        batch.append(item)
+        if len(batch) >= stage.batch_size:
+            _run_fn(stage, batch, out)
+            batch = []
+
+
+def run_pipeline(source: Iterable, stages: list[Stage], queue_size: int = 256) -> dict:
+    """
+    Exécute les étages en flux : chaque étage lit une file bornée alimentée par
+    l'étage précédent, si bien que tous les étages travaillent en même temps et
+    que la mémoire est bornée par la taille des files, pas par le volume total.
+    Les sorties du dernier étage sont ignorées. Retourne les compteurs par étage.
+    """
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+    threads_per_stage = []
+    for i, stage in enumerate(stages):
+        out = queues[i + 1] if i + 1 < len(stages) else None
+        threads = [
+            threading.Thread(target=_worker, args=(stage, queues[i], out), name=f"{stage.name}-{w}", daemon=True)
+            for w in range(max(1, stage.workers))
+        ]
+        for t in threads:
+            t.start()
+        threads_per_stage.append(threads)
+
+    try:
+        for item in source:
+            queues[0].put(item)
+    finally:
+        queues[0].put(_DONE)
+        # Ferme les étages dans l'ordre : un étage est terminé quand tous ses workers le sont.
+        for i, threads in enumerate(threads_per_stage):
+            for t in threads:
+                t.join()
+            if i + 1 < len(stages):
+                queues[i + 1].put(_DONE)
+
+    return {stage.name: stage.stats() for stage in stages}
@@ -0,0 +1,126 @@
+from psycopg.rows import dict_row
+
+from src.transform import embed_texts
+from src.load import EMBEDDING_STORAGE, vector_literal
+
+# Colonne exacte pour le re-classement : float32 si stocké, sinon float16
+_EXACT = "COALESCE(embedding, embedding_half::vector)"
+
+# Passe grossière (index ANN sur la forme compacte) -> candidats à re-classer
+_COARSE = {
+    "full": ("embedding IS NOT NULL", "embedding <=> %(q)s::vector"),
+    "half": ("embedding_half IS NOT NULL", "embedding_half <=> %(q)s::vector::halfvec"),
+    "binary": ("embedding_bin IS NOT NULL", "embedding_bin <~> binary_quantize(%(q)s::vector)"),
+}
+
+
+def default_coarse(storage=EMBEDDING_STORAGE) -> str:
+    """
+    Forme la plus compacte disponible pour la passe grossière.
+    """
+    for key in ("binary", "half", "full"):
+        if key in storage:
+            return key
+    return "full"
+
+
+def _set_search_params(cur, ef_search: int | None = None, probes: int | None = None):
+    """
+    Réglages ANN le temps de la transaction : hnsw.ef_search (rappel vs latence)
+    et ivfflat.probes si un index IVFFlat est utilisé.
+    """
+    if ef_search:
+        cur.execute("SELECT set_config('hnsw.ef_search', %s, true)", (str(int(ef_search)),))
+    if probes:
+        cur.execute("SELECT set_config('ivfflat.probes', %s, true)", (str(int(probes)),))
+
+
+def similar_reviews(
+    conn,
+    text_or_id: str | int,
+    k: int = 10,
+    ef_search: int | None = None,
+    probes: int | None = None,
+    tei_url: str | None = None,
+    coarse: str | None = None,
+    rerank: int = 4,
+) -> list[dict]:
+    """
+    Critiques les plus proches (distance cosinus) d'un texte libre (embeddé via TEI)
+    ou d'une critique existante (id de `reviews`, exclue du résultat).
+    `coarse` choisit la forme interrogée par l'index ("full", "half", "binary",
+    par défaut la plus compacte de EMBEDDING_STORAGE) ; les k * rerank meilleurs
+    candidats sont ensuite re-classés sur le vecteur exact.
+    """
+    exclude_id = None
+    if isinstance(text_or_id, int):
+        exclude_id = text_or_id
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT {_EXACT}::text FROM reviews WHERE id = %s", (text_or_id,))
+            row = cur.fetchone()
+        if not row or row[0] is None:
+            return []
+        query_vec = row[0]
+    else:
+        query_vec = vector_literal(embed_texts([text_or_id], tei_url)[0])
+
+    coarse = coarse or default_coarse()
+    where, order = _COARSE[coarse]
+    # En float32, l'index donne directement l'ordre exact : pas de re-classement.
+    limit = k if coarse == "full" else k * max(1, rerank)
+    if not ef_search and limit > 40:
+        # hnsw.ef_search (40 par défaut) borne le nombre de candidats renvoyés par l'index
+        ef_search = limit
+    with conn.transaction(), conn.cursor(row_factory=dict_row) as cur:
+        _set_search_params(cur, ef_search, probes)
+        cur.execute(f"""
+            WITH candidates AS (
+                SELECT id, film_id, url, content, embedding, embedding_half
+                FROM reviews
+                WHERE {where} AND id IS DISTINCT FROM %(exclude)s
+                ORDER BY {order}
+                LIMIT %(limit)s
+            ), ranked AS (
+                SELECT id, film_id, url, content, {_EXACT} <=> %(q)s::vector AS distance
+                FROM candidates
+                ORDER BY distance
+                LIMIT %(k)s
+            )
+            SELECT r.id, f.film, f.url AS film_url, r.url, r.content, r.distance
+            FROM ranked r
+            LEFT JOIN films f ON f.id = r.film_id
+            ORDER BY r.distance
+        """, {"q": query_vec, "exclude": exclude_id, "limit": limit, "k": k})
+        return cur.fetchall()
+
+
+def similar_films(
+    conn,
+    film_url: str,
+    k: int = 10,
+    ef_search: int | None = None,
+    probes: int | None = None,
+) -> list[dict]:
+    """
+    Films les plus proches d'un film, par centroïde de leurs critiques (film_embeddings).
+    """
+    with conn.transaction(), conn.cursor(row_factory=dict_row) as cur:
+        _set_search_params(cur, ef_search, probes)
+        cur.execute("""
+            SELECT f.url AS film_url, f.film, fe.review_count, fe.embedding <=> q.embedding AS distance
+            FROM (
+                SELECT e.film_id, e.embedding
+                FROM film_embeddings e JOIN films src ON src.id = e.film_id
+                WHERE src.url = %(url)s
+            ) q,
+                 LATERAL (
+                     SELECT film_id, review_count, embedding
+                     FROM film_embeddings
+                     WHERE film_id <> q.film_id
+                     ORDER BY embedding <=> q.embedding
+                     LIMIT %(k)s
+                 ) fe
+            JOIN films f ON f.id = fe.film_id
+            ORDER BY distance
+        """, {"url": film_url, "k": k})
+        return cur.fetchall()
@@ -0,0 +1,190 @@
+import asyncio
+import os
+import re
+import threading
+
+from src.cache import get_cache, text_hash
+from src.metrics import inc, timed
+
+try:
+    from huggingface_hub import AsyncInferenceClient  # optional
+except ImportError:
+    AsyncInferenceClient = None
+
+LABELS = ("positif", "negatif", "neutre")
+
+SYSTEM_SINGLE = (
+    "Classifie le sentiment du texte en 'positif', 'negatif' ou 'neutre'. "
+    "Réponds uniquement par l'un de ces trois mots."
+)
+SYSTEM_BATCH = (
+    "Tu reçois une liste numérotée de critiques de films. Classifie le sentiment de chacune "
+    "en 'positif', 'negatif' ou 'neutre'. Réponds avec exactement une ligne par critique, "
+    "au format 'numéro: label', dans le même ordre, sans aucun autre texte."
+)
+
+_LINE = re.compile(r"^\s*(\d+)\s*[\.:\)\-]\s*(.+?)\s*$")
+
+
+def normalize_label(label: str | None) -> str | None:
+    """
+    Ramène une réponse libre du modèle à 'negatif' / 'positif' / 'neutre' (ou None).
+    """
+    label = (label or "").strip().lower()
+    if "neg" in label or "nég" in label:
+        return "negatif"
+    if "pos" in label:
+        return "positif"
+    if "neut" in label:
+        return "neutre"
+    return None
+
+
+def parse_numbered_labels(content: str, n: int) -> list[str | None]:
+    """
+    Lit une réponse 'numéro: label' ; les numéros absents ou invalides restent à None.
+    """
+    labels: list[str | None] = [None] * n
+    for line in (content or "").splitlines():
+        m = _LINE.match(line)
+        if not m:
+            continue
+        i = int(m.group(1)) - 1
+        if 0 <= i < n and labels[i] is None:
+            labels[i] = normalize_label(m.group(2))
+    return labels
+
+
+def _message_content(resp) -> str:
+    m = resp.choices[0].message
+    return (m["content"] if isinstance(m, dict) else m.content) or ""
+
+
+class SentimentEngine:
+    """
+    Classification de sentiment par lots via le LLM HF :
+      - un seul client réutilisé, sur une boucle asyncio dédiée (thread de fond),
+        utilisable depuis n'importe quel thread du pipeline ;
+      - plusieurs critiques par prompt (liste numérotée -> labels numérotés),
+        avec repli au cas par cas pour les lignes manquantes ou illisibles ;
+      - `concurrency` requêtes simultanées au plus.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        token: str,
+        batch_size: int = 20,
+        concurrency: int = 4,
+        max_chars: int = 1500,
+        timeout: float = 120,
+    ):
+        self.model = model
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_chars = max_chars
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="sentiment-loop", daemon=True)
+        self._thread.start()
+        self._client = AsyncInferenceClient(model=model, token=token, timeout=timeout)
+        self._sem = None
+
+    def _clip(self, text: str) -> str:
+        return " ".join((text or "").split())[: self.max_chars]
+
+    async def _chat(self, system: str, user: str, max_tokens: int) -> str:
+        async with self._sem:
+            with timed("hf_call"):
+                resp = await self._client.chat_completion(
+                    messages=[
+                        {"role": "system", "content": system},
+                        {"role": "user", "content": user},
+                    ],
+                    max_tokens=max_tokens,
+                    temperature=0.2,
+                    top_p=0.9,
+                )
+        return _message_content(resp)
+
+    async def _classify_one(self, text: str) -> str | None:
+        try:
+            return normalize_label(await self._chat(SYSTEM_SINGLE, self._clip(text), 16))
+        except Exception:
+            return None
+
+    async def _classify_batch(self, texts: list[str]) -> list[str | None]:
+        if len(texts) == 1:
+            return [await self._classify_one(texts[0])]
+        prompt = "\n".join(f"{i + 1}. {self._clip(t)}" for i, t in enumerate(texts))
+        try:
+            labels = parse_numbered_labels(await self._chat(SYSTEM_BATCH, prompt, 8 * len(texts) + 16), len(texts))
+        except Exception:
+            labels = [None] * len(texts)
+        # Repli individuel pour les critiques que la réponse groupée n'a pas classées
+        missing = [i for i, label in enumerate(labels) if label is None]
+        if missing:
+            inc("sentiment_single_fallbacks_total", len(missing))
+            retried = await asyncio.gather(*(self._classify_one(texts[i]) for i in missing))
+            for i, label in zip(missing, retried):
+                labels[i] = label
+        return labels
+
+    async def _classify_all(self, texts: list[str]) -> list[str | None]:
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.concurrency)
+        chunks = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        results = await asyncio.gather(*(self._classify_batch(c) for c in chunks))
+        return [label for chunk in results for label in chunk]
+
+    def classify_many(self, texts: list[str]) -> list[str | None]:
+        """
+        Labels alignés sur `texts` ; les textes déjà classés sont lus dans le cache d'inférence.
+        """
+        labels: list[str | None] = [None] * len(texts)
+        if not texts:
+            return labels
+        cache = get_cache()
+        hashes = [text_hash(t) for t in texts]
+        if cache:
+            cached = cache.get_many("sentiment", self.model, hashes)
+            labels = [cached.get(h) for h in hashes]
+        todo = [i for i, label in enumerate(labels) if label is None]
+        if todo:
+            fut = asyncio.run_coroutine_threadsafe(self._classify_all([texts[i] for i in todo]), self._loop)
+            for i, label in zip(todo, fut.result()):
+                labels[i] = label
+            if cache:
+                cache.put_many("sentiment", self.model, {hashes[i]: labels[i] for i in todo})
+        return labels
+
+    def close(self):
+        try:
+            asyncio.run_coroutine_threadsafe(self._client.close(), self._loop).result(timeout=10)
+        except Exception:
+            pass
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+_engine: SentimentEngine | None = None
+_engine_lock = threading.Lock()
+
+
+def get_engine(model_id: str | None = None, hf_token: str | None = None) -> SentimentEngine | None:
+    """
+    Moteur partagé ; None si huggingface_hub, HF_TOKEN ou le modèle manquent.
+    Réglages : SENTIMENT_BATCH_SIZE (critiques par prompt), SENTIMENT_CONCURRENCY.
+    """
+    global _engine
+    model = model_id or os.getenv("SENTIMENT_MODEL") or os.getenv("GEN_MODEL")
+    token = hf_token or os.getenv("HF_TOKEN")
+    if not (AsyncInferenceClient and token and model):
+        return None
+    with _engine_lock:
+        if _engine is None or _engine.model != model:
+            _engine = SentimentEngine(
+                model,
+                token,
+                batch_size=int(os.getenv("SENTIMENT_BATCH_SIZE", "20")),
+                concurrency=int(os.getenv("SENTIMENT_CONCURRENCY", "4")),
+            )
+        return _engine
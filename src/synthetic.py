@@ -0,0 +1,268 @@
+"""
+Générateur déterministe de films et de critiques synthétiques (USE_FAKE_EXTRACT).
+
+Remplace l'extraction SensCritique pour les tests de charge : mêmes lignes que
+next_data.parse_reviews (plus genres / équipe / pays remplis), produites page par
+page à la demande, si bien que des millions de critiques peuvent traverser les
+étages transform et load sans jamais être toutes en mémoire.
+
+Chaque film et chaque critique sont tirés d'un générateur aléatoire graine par
+(FAKE_SEED, film, critique) : un même film / une même page donne toujours les
+mêmes lignes, quel que soit l'ordre ou le parallélisme d'extraction.
+"""
+import hashlib
+import math
+import os
+import random
+from collections.abc import Iterator
+from datetime import date, timedelta
+
+from src.next_data import BASE_URL
+
+FAKE_SEED = int(os.getenv("FAKE_SEED", "42"))
+FAKE_FILMS = int(os.getenv("FAKE_FILMS", "100"))
+# Premier index de film : deux plages disjointes simulent deux semaines différentes
+FAKE_FILM_OFFSET = int(os.getenv("FAKE_FILM_OFFSET", "0"))
+# Nombre médian de critiques par film (loi log-normale, longue traîne de gros films)
+FAKE_REVIEWS_MEDIAN = int(os.getenv("FAKE_REVIEWS_MEDIAN", "40"))
+FAKE_REVIEWS_MAX = int(os.getenv("FAKE_REVIEWS_MAX", "20000"))
+FAKE_PAGE_SIZE = int(os.getenv("FAKE_PAGE_SIZE", "10"))
+# Parts de critiques reprises : republiées à l'identique (même auteur + texte),
+# légèrement retouchées (quasi-doublons), copiées depuis un autre film
+FAKE_EXACT_DUP_RATE = float(os.getenv("FAKE_EXACT_DUP_RATE", "0.02"))
+FAKE_NEAR_DUP_RATE = float(os.getenv("FAKE_NEAR_DUP_RATE", "0.03"))
+FAKE_CROSS_DUP_RATE = float(os.getenv("FAKE_CROSS_DUP_RATE", "0.01"))
+
+# Genres et pays avec leurs poids (fréquences observées sur les sorties françaises)
+GENRES = {
+    "Drame": 30, "Comédie": 22, "Thriller": 10, "Documentaire": 9, "Action": 8, "Animation": 6,
+    "Horreur": 6, "Romance": 6, "Science-fiction": 5, "Aventure": 5, "Comédie dramatique": 5,
+    "Policier": 4, "Fantastique": 4, "Biopic": 3, "Historique": 2, "Guerre": 1, "Western": 1, "Musical": 1,
+}
+PAYS = {
+    "France": 40, "États-Unis": 28, "Belgique": 6, "Royaume-Uni": 5, "Italie": 3, "Espagne": 3,
+    "Allemagne": 3, "Japon": 3, "Canada": 3, "Corée du Sud": 2, "Danemark": 1, "Suisse": 1, "Inde": 1, "Brésil": 1,
+}
+_PRENOMS = (
+    "Claire", "Julien", "Sophie", "Thomas", "Camille", "Nicolas", "Léa", "Antoine", "Emma", "Hugo", "Chloé",
+    "Louis", "Inès", "Mathieu", "Sarah", "Pierre", "Manon", "Karim", "Yasmine", "David", "Alice", "Paul",
+    "Jeanne", "Olivier", "Nina", "Bruno", "Agnès", "Céline", "Jacques", "Mia",
+)
+_NOMS = (
+    "Martin", "Bernard", "Dubois", "Durand", "Lefebvre", "Moreau", "Laurent", "Simon", "Michel", "Garcia",
+    "Roux", "Fournier", "Girard", "Bonnet", "Dupont", "Lambert", "Fontaine", "Rousseau", "Vincent", "Muller",
+    "Lemoine", "Faure", "André", "Mercier", "Blanc", "Guerin", "Boyer", "Chevalier", "Perrin", "Nguyen",
+)
+# Tailles des viviers de personnes ; la popularité suit une loi de Zipf (quelques
+# réalisateurs / producteurs reviennent sur beaucoup de films)
+CREW_POOLS = {"realisateurs": 3000, "scenaristes": 5000, "producteurs": 1500}
+AUTHORS = 200_000
+_TITLE_WORDS = (
+    "nuit", "dernier", "été", "mémoire", "retour", "ombre", "silence", "frontière", "royaume", "secret",
+    "voyage", "promesse", "tempête", "enfant", "ville", "rivage", "chute", "lumière", "heure", "lettre",
+)
+_POSITIF = (
+    "magnifique", "bouleversant", "maîtrisé", "superbe", "émouvant", "brillant", "inventif", "captivant",
+    "juste", "lumineux", "drôle", "puissant", "subtil", "réjouissant",
+)
+_NEGATIF = (
+    "ennuyeux", "raté", "creux", "poussif", "prévisible", "interminable", "bâclé", "confus", "lourd",
+    "caricatural", "plat", "décevant", "vain", "maladroit",
+)
+_MOTS = (
+    "le", "la", "les", "un", "une", "des", "film", "scénario", "mise", "en", "scène", "acteurs", "actrice",
+    "réalisateur", "photographie", "musique", "rythme", "histoire", "personnages", "dialogues", "fin", "début",
+    "est", "reste", "devient", "semble", "et", "mais", "avec", "sans", "pour", "dans", "très", "plutôt",
+    "vraiment", "trop", "peu", "assez", "jamais", "toujours", "moment", "plan", "séquence", "salle", "cinéma",
+    "émotion", "tension", "humour", "regard", "image", "son", "montage", "interprétation", "casting", "récit",
+    "intrigue", "twist", "scène", "finale", "durée", "public", "spectateur", "genre", "thème", "propos",
+)
+_OUVERTURES = {
+    "positif": ("Un film {a}.", "Franchement {a}, je recommande.", "Quelle claque, {a} de bout en bout.",
+                "Un {a} moment de cinéma."),
+    "negatif": ("Un film {a}.", "Franchement {a}, à éviter.", "Quelle déception, {a} de bout en bout.",
+                "Un moment {a} de cinéma."),
+    "neutre": ("Un film correct.", "Pas mal, sans plus.", "Quelques bonnes idées, d'autres moins.",
+               "Ni bon ni mauvais."),
+}
+
+
+def _rng(*key) -> random.Random:
+    # Graine textuelle : stable d'une version de Python à l'autre
+    return random.Random(":".join(str(k) for k in key))
+
+
+def _zipf_index(rng: random.Random, n: int, s: float = 0.6) -> int:
+    """
+    Index dans [0, n) tiré selon une loi de Zipf approchée (inversion continue).
+    """
+    u = rng.random()
+    if s == 1:
+        return min(n - 1, int(n ** u) - 1)
+    return min(n - 1, int(((n ** (1 - s) - 1) * u + 1) ** (1 / (1 - s))) - 1)
+
+
+def _person(pool: str, i: int) -> str:
+    rng = _rng("personne", pool, i)
+    return f"{rng.choice(_PRENOMS)} {rng.choice(_NOMS)} {i:04d}"
+
+
+def _weighted_sample(rng: random.Random, weights: dict[str, int], k: int) -> list[str]:
+    names = list(weights)
+    picked: list[str] = []
+    while len(picked) < min(k, len(names)):
+        name = rng.choices(names, weights=[weights[n] for n in names])[0]
+        if name not in picked:
+            picked.append(name)
+    return picked
+
+
+def fake_film(index: int, seed: int = FAKE_SEED) -> dict:
+    """
+    Film synthétique numéro `index` : titre, url, métadonnées, genres / équipe / pays
+    et nombre total de critiques (`review_count`).
+    """
+    rng = _rng(seed, "film", index)
+    words = rng.sample(_TITLE_WORDS, rng.randint(1, 3))
+    titre = " ".join(words).capitalize() + f" ({index})"
+    release = date(2020, 1, 1) + timedelta(days=rng.randint(0, 6 * 365))
+    # Log-normale : médiane FAKE_REVIEWS_MEDIAN, quelques films à plusieurs milliers de critiques
+    count = int(FAKE_REVIEWS_MEDIAN * math.exp(rng.gauss(0, 1.3)))
+    return {
+        "titre": titre,
+        "url": f"{BASE_URL}/film/synthetique-{index}/{900_000_000 + index}",
+        "rate": round(min(9.5, max(1.5, rng.gauss(6.4, 1.1))), 1),
+        "date_sortie": release.isoformat(),
+        "image": f"https://img.synthetique.test/{index}.jpg",
+        "bande_originale": _person("compositeurs", _zipf_index(rng, 800)) if rng.random() < 0.6 else None,
+        "groupe": None,
+        "annee": release.year,
+        "duree": max(60, int(rng.gauss(105, 20))),
+        "genres": _weighted_sample(rng, GENRES, rng.choices((1, 2, 3), weights=(45, 40, 15))[0]),
+        "producteurs": sorted({_person("producteurs", _zipf_index(rng, CREW_POOLS["producteurs"]))
+                               for _ in range(rng.choices((1, 2, 3, 4), weights=(40, 30, 20, 10))[0])}),
+        "realisateurs": sorted({_person("realisateurs", _zipf_index(rng, CREW_POOLS["realisateurs"]))
+                                for _ in range(rng.choices((1, 2), weights=(90, 10))[0])}),
+        "scenaristes": sorted({_person("scenaristes", _zipf_index(rng, CREW_POOLS["scenaristes"]))
+                               for _ in range(rng.choices((1, 2, 3), weights=(50, 35, 15))[0])}),
+        "pays": _weighted_sample(rng, PAYS, rng.choices((1, 2), weights=(75, 25))[0]),
+        "review_count": min(FAKE_REVIEWS_MAX, max(1, count)),
+    }
+
+
+def fake_films(count: int = FAKE_FILMS, offset: int = FAKE_FILM_OFFSET, seed: int = FAKE_SEED) -> Iterator[dict]:
+    """
+    Films synthétiques `offset` .. `offset + count - 1`, générés à la demande.
+    """
+    for index in range(offset, offset + count):
+        yield fake_film(index, seed)
+
+
+def _film_index(film_url: str) -> int:
+    return int(film_url.rstrip("/").rsplit("/", 1)[1]) - 900_000_000
+
+
+def _text(rng: random.Random, note: int) -> str:
+    """
+    Texte de critique : longueur log-normale (médiane ~300 caractères, quelques
+    critiques de plusieurs milliers), vocabulaire orienté selon la note.
+    """
+    label = "positif" if note >= 7 else "negatif" if note <= 4 else "neutre"
+    target = min(6000, max(25, int(300 * math.exp(rng.gauss(0, 0.9)))))
+    adjectifs = _POSITIF if label == "positif" else _NEGATIF if label == "negatif" else _POSITIF + _NEGATIF
+    parts = [rng.choice(_OUVERTURES[label]).format(a=rng.choice(adjectifs))]
+    length = len(parts[0])
+    while length < target:
+        words = rng.choices(_MOTS, k=rng.randint(6, 18))
+        words.insert(rng.randrange(len(words)), rng.choice(adjectifs))
+        sentence = " ".join(words).capitalize() + "."
+        parts.append(sentence)
+        length += len(sentence) + 1
+    return " ".join(parts)
+
+
+def _retouche(rng: random.Random, texte: str) -> str:
+    """
+    Quasi-doublon : quelques mots remplacés et une phrase ajoutée.
+    """
+    words = texte.split()
+    for _ in range(max(1, len(words) // 40)):
+        words[rng.randrange(len(words))] = rng.choice(_MOTS)
+    return " ".join(words) + " " + rng.choice(("Je le reverrai.", "À voir en salle.", "Mitigé au final."))
+
+
+def _review_content(seed: int, film_index: int, film: dict, j: int) -> tuple[str, str, int]:
+    """
+    (auteur, texte, note) de la critique `j` du film, doublons compris.
+    """
+    rng = _rng(seed, "critique", film_index, j)
+    auteur = f"user{_zipf_index(rng, AUTHORS)}"
+    note = min(10, max(1, round(rng.gauss(film["rate"], 1.8))))
+    u = rng.random()
+    if j > 0 and u < FAKE_EXACT_DUP_RATE:
+        # republiée : même auteur + même texte qu'une critique antérieure du film
+        return _review_content(seed, film_index, film, rng.randrange(j))
+    u -= FAKE_EXACT_DUP_RATE
+    if j > 0 and u < FAKE_NEAR_DUP_RATE:
+        _, texte, note = _review_content(seed, film_index, film, rng.randrange(j))
+        return auteur, _retouche(rng, texte), note
+    u -= FAKE_NEAR_DUP_RATE
+    if film_index > 0 and u < FAKE_CROSS_DUP_RATE:
+        # copiée d'un autre film (copier-coller entre fiches)
+        other = rng.randrange(film_index)
+        other_film = fake_film(other, seed)
+        return _review_content(seed, other, other_film, rng.randrange(other_film["review_count"]))
+    return auteur, _text(rng, note), note
+
+
+def _row(seed: int, film_index: int, film: dict, j: int) -> dict:
+    auteur, texte, note = _review_content(seed, film_index, film, j)
+    rng = _rng(seed, "engagement", film_index, j)
+    return {
+        "titre": film["titre"],
+        "film_url": film["url"],
+        "auteur": auteur,
+        "note": note,
+        "texte": texte,
+        "url": f"{BASE_URL}/film/synthetique-{film_index}/critique/{film_index * 100_000 + j}",
+        "hash_critique": hashlib.sha1((auteur + "||" + texte).encode()).hexdigest(),
+        # likes / commentaires : très concentrés sur quelques critiques
+        "likes": int(rng.paretovariate(1.5)) - 1,
+        "comments": int(rng.paretovariate(2.5)) - 1,
+        **{k: film[k] for k in (
+            "rate", "date_sortie", "image", "bande_originale", "groupe", "annee", "duree",
+            "genres", "producteurs", "realisateurs", "scenaristes", "pays",
+        )},
+    }
+
+
+def fake_review_page(
+    film_url: str,
+    film_title: str | None = None,
+    page: int = 1,
+    seed: int = FAKE_SEED,
+    page_size: int = FAKE_PAGE_SIZE,
+) -> tuple[list[dict], dict | None]:
+    """
+    Même contrat que extract.film_review_page : (critiques de la page, pagination
+    {"limit", "offset", "total"}) pour un film de fake_films.
+    """
+    index = _film_index(film_url)
+    film = fake_film(index, seed)
+    offset = (page - 1) * page_size
+    rows = [_row(seed, index, film, j) for j in range(offset, min(offset + page_size, film["review_count"]))]
+    return rows, {"limit": page_size, "offset": offset, "total": film["review_count"]}
+
+
+def fake_reviews(
+    count: int = FAKE_FILMS,
+    offset: int = FAKE_FILM_OFFSET,
+    seed: int = FAKE_SEED,
+) -> Iterator[dict]:
+    """
+    Flux de toutes les critiques de `count` films, film par film, sans rien garder en mémoire.
+    """
+    for film in fake_films(count, offset, seed):
+        index = _film_index(film["url"])
+        for j in range(film["review_count"]):
+            yield _row(seed, index, film, j)
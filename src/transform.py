@@ -1,6 +1,14 @@
 import os
 import re
+import numpy as np
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+from src.cache import get_cache, text_hash
+from src.classifier import get_classifier, parse_vector
+from src.metrics import inc, timed
+from src.sentiment import SYSTEM_SINGLE, get_engine, normalize_label
 
 try:
     from huggingface_hub import InferenceClient  # optional
@@ -8,49 +16,171 @@ except ImportError:
     InferenceClient = None
 
 
-def embed_texts(texts: list[str], tei_url: str | None = None) -> list[list[float]]:
+# Paramètres de batching TEI (surchargeables par variables d'environnement)
+TEI_BATCH_SIZE = int(os.getenv("TEI_BATCH_SIZE", "32"))
+TEI_MAX_BATCH_CHARS = int(os.getenv("TEI_MAX_BATCH_CHARS", "40000"))
+TEI_CONCURRENCY = int(os.getenv("TEI_CONCURRENCY", "4"))
+# Identifiant du modèle servi par TEI (clé du cache d'embeddings)
+EMBED_MODEL_ID = os.getenv("EMBED_MODEL_ID", "sentence-transformers/all-MiniLM-L6-v2")
+
+_session: requests.Session | None = None
+
+
+def get_session() -> requests.Session:
+    """
+    Session HTTP partagée (keep-alive) pour les appels TEI.
+    Le pool est dimensionné pour les requêtes concurrentes de embed_batched.
+    """
+    global _session
+    if _session is None:
+        s = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(TEI_CONCURRENCY, 4))
+        s.mount("http://", adapter)
+        s.mount("https://", adapter)
+        _session = s
+    return _session
+
+
+def embed_texts(texts: list[str], tei_url: str | None = None, session: requests.Session | None = None) -> list[list[float]]:
     """
     Appelle TEI pour obtenir des embeddings.
     """
     tei = tei_url or os.getenv("TEI_URL") or "http://tei:80"
-    r = requests.post(f"{tei}/embed", json={"inputs": texts, "truncate": True}, timeout=60)
+    http = session or get_session()
+    r = http.post(f"{tei}/embed", json={"inputs": texts, "truncate": True}, timeout=60)
     r.raise_for_status()
     data = r.json()
     # TEI peut renvoyer {"embeddings":[...]} ou une liste directe selon la version
     return data["embeddings"] if isinstance(data, dict) else data
 
 
+def make_batches(texts: list[str], batch_size: int | None = None, max_chars: int | None = None) -> list[list[int]]:
+    """
+    Regroupe les indices des textes en batches bornés en nombre et en caractères.
+    Les textes sont triés par longueur pour que chaque batch contienne des textes
+    de taille voisine (moins de padding côté TEI).
+    """
+    batch_size = batch_size or TEI_BATCH_SIZE
+    max_chars = max_chars or TEI_MAX_BATCH_CHARS
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i] or ""))
+    batches: list[list[int]] = []
+    current: list[int] = []
+    chars = 0
+    for i in order:
+        n = len(texts[i] or "")
+        if current and (len(current) >= batch_size or chars + n > max_chars):
+            batches.append(current)
+            current, chars = [], 0
+        current.append(i)
+        chars += n
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _embed_batch(texts: list[str], tei_url: str | None) -> list[list[float] | None]:
+    """
+    Embedde un batch ; en cas d'échec, le batch est coupé en deux et retenté
+    jusqu'à isoler les textes fautifs (qui reçoivent None).
+    """
+    try:
+        with timed("tei_batch"):
+            embs = embed_texts(texts, tei_url)
+        inc("tei_texts_total", len(texts))
+        if len(embs) != len(texts):
+            raise ValueError(f"TEI a renvoyé {len(embs)} embeddings pour {len(texts)} textes")
+        return embs
+    except Exception as e:
+        if len(texts) == 1:
+            print(f"   ❌ Embedding impossible: {e}")
+            return [None]
+        mid = len(texts) // 2
+        return _embed_batch(texts[:mid], tei_url) + _embed_batch(texts[mid:], tei_url)
+
+
+def embed_batched(
+    texts: list[str],
+    tei_url: str | None = None,
+    batch_size: int | None = None,
+    max_chars: int | None = None,
+    concurrency: int | None = None,
+) -> list[list[float] | None]:
+    """
+    Embeddings pour une liste de textes, par batches envoyés en parallèle à TEI.
+    Le résultat est aligné sur `texts` (None pour les textes en échec).
+    Les embeddings déjà présents dans le cache d'inférence ne sont pas recalculés.
+    """
+    results: list[list[float] | None] = [None] * len(texts)
+    if not texts:
+        return results
+    cache = get_cache()
+    hashes = [text_hash(t) for t in texts]
+    if cache:
+        cached = cache.get_many("embedding", EMBED_MODEL_ID, hashes)
+        for i, h in enumerate(hashes):
+            results[i] = cached.get(h)
+    todo = [i for i, emb in enumerate(results) if emb is None]
+    if not todo:
+        return results
+    batches = [[todo[j] for j in idx] for idx in make_batches([texts[i] for i in todo], batch_size, max_chars)]
+    workers = max(1, min(concurrency or TEI_CONCURRENCY, len(batches)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            (idx, pool.submit(_embed_batch, [texts[i] for i in idx], tei_url))
+            for idx in batches
+        ]
+        for idx, fut in futures:
+            for i, emb in zip(idx, fut.result()):
+                results[i] = emb
+    if cache:
+        cache.put_many("embedding", EMBED_MODEL_ID, {hashes[i]: results[i] for i in todo})
+    inc("embeddings_total", len(texts) - len(todo), source="cache")
+    inc("embeddings_total", len(todo), source="tei")
+    return results
+
+
+_clients: dict = {}
+
+
+def _get_client(model: str, token: str):
+    """
+    Client HF réutilisé d'un appel à l'autre (un par modèle).
+    """
+    key = (model, token)
+    if key not in _clients:
+        _clients[key] = InferenceClient(model=model, token=token, timeout=120)
+    return _clients[key]
+
+
 def classify_sentiment_hf(text: str, model_id: str | None = None, hf_token: str | None = None) -> str | None:
     model = model_id or os.getenv("SENTIMENT_MODEL") or os.getenv("GEN_MODEL")
     token = hf_token or os.getenv("HF_TOKEN")
 
     if InferenceClient and token and model:
+        cache = get_cache()
+        h = text_hash(text)
+        if cache:
+            cached = cache.get("sentiment", model, h)
+            if cached:
+                return cached
         try:
-            gen_client = InferenceClient(model=model, token=token, timeout=120)
+            gen_client = _get_client(model, token)
             messages = [
-                {
-                    "role": "system",
-                    "content": (
-                        "Classifie le sentiment du texte en 'positif', 'negatif' ou 'neutre'. "
-                        "Réponds uniquement par l'un de ces trois mots."
-                    ),
-                },
+                {"role": "system", "content": SYSTEM_SINGLE},
                 {"role": "user", "content": text},
             ]
-            resp = gen_client.chat_completion(
-                messages=messages,
-                max_tokens=16,
-                temperature=0.2,
-                top_p=0.9,
-            )
+            with timed("hf_call"):
+                resp = gen_client.chat_completion(
+                    messages=messages,
+                    max_tokens=16,
+                    temperature=0.2,
+                    top_p=0.9,
+                )
             m = resp.choices[0].message
-            label = (m["content"] if isinstance(m, dict) else m.content).strip().lower()
-            if "neg" in label:
-                return "negatif"
-            if "pos" in label:
-                return "positif"
-            if "neut" in label:
-                return "neutre"
+            sentiment = normalize_label(m["content"] if isinstance(m, dict) else m.content)
+            if cache and sentiment:
+                cache.put("sentiment", model, h, sentiment)
+            return sentiment
         except Exception:
             return None
 
@@ -58,11 +188,65 @@ def classify_sentiment_hf(text: str, model_id: str | None = None, hf_token: str
     return None
 
 
+def classify_sentiments(texts: list[str], embeddings: list | None = None) -> list[str | None]:
+    """
+    Sentiment d'une liste de textes (voir classify_sentiments_sourced).
+    """
+    return classify_sentiments_sourced(texts, embeddings)[0]
+
+
+def classify_sentiments_sourced(
+    texts: list[str], embeddings: list | None = None
+) -> tuple[list[str | None], list[str | None]]:
+    """
+    Sentiment d'une liste de textes et origine de chaque label ('local' / 'llm', None sans label).
+    Si un classifieur local est entraîné (src/classifier.py) et que les embeddings
+    sont fournis, il prédit tout le batch d'un coup ; le LLM HF (plusieurs critiques
+    par prompt, requêtes concurrentes, voir src/sentiment.py) n'est appelé que pour
+    les prédictions peu sûres ou sans embedding. Le classifieur local est binaire :
+    'neutre' ne vient que du LLM, qui reçoit toutes les prédictions sous
+    SENTIMENT_MIN_CONFIDENCE (les critiques neutres en font partie). Sans HF_TOKEN,
+    ces prédictions gardent le label binaire du classifieur. Sans classifieur ni HF_TOKEN : None.
+    L'origine est stockée (reviews.sentiment_source) : le classifieur ne s'entraîne
+    pas sur ses propres prédictions.
+    """
+    labels: list[str | None] = [None] * len(texts)
+    sources: list[str | None] = [None] * len(texts)
+    to_llm = list(range(len(texts)))
+    clf = get_classifier()
+    if clf and embeddings:
+        idx = [i for i, e in enumerate(embeddings) if e is not None]
+        if idx:
+            with timed("local_classifier"):
+                preds, confident = clf.predict(np.stack([parse_vector(embeddings[i]) for i in idx]))
+            for j, i in enumerate(idx):
+                labels[i] = preds[j]
+                sources[i] = "local"
+            unsure = {idx[j] for j in range(len(idx)) if not confident[j]}
+            to_llm = [i for i in range(len(texts)) if labels[i] is None or i in unsure]
+
+    inc("sentiments_total", len(texts) - len(to_llm), source="local")
+    engine = get_engine()
+    if engine and to_llm:
+        inc("sentiments_total", len(to_llm), source="llm")
+        for i, label in zip(to_llm, engine.classify_many([texts[i] for i in to_llm])):
+            if label is not None:
+                labels[i] = label
+                sources[i] = "llm"
+    return labels, sources
+
+
 def sentiment_critique(texte: str, tei_url: str | None = None):
-    try:
-        emb = embed_texts([texte], tei_url)[0]
-    except Exception:
-        emb = None
+    emb = embed_batched([texte], tei_url)[0]
     sentiment = classify_sentiment_hf(texte)
-    print (f"Sentiment critique: {sentiment}")
+    inc("sentiments_total", source="llm_single")
     return sentiment, emb
+
+
+def sentiment_critiques(textes: list[str], tei_url: str | None = None) -> list[tuple]:
+    """
+    Variante batch de sentiment_critique : embeddings TEI par batches,
+    puis sentiment par lots. Retourne une liste de (sentiment, emb) alignée sur `textes`.
+    """
+    embs = embed_batched(textes, tei_url)
+    return list(zip(classify_sentiments(textes, embs), embs))